@@ -29,6 +29,10 @@ def create_app():
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=5)
     session.init_app(app)
     
+    # Build the tenants (properties/accounts) this deployment serves
+    from app.analytics.tenants import init_tenants
+    init_tenants(app)
+    
     # Register blueprints
     from app.auth.routes import auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -39,6 +43,13 @@ def create_app():
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
+    from app.admin.routes import admin_bp
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    
+    # Sampling profiler, switched on through the admin API
+    from app.profiler import init_profiler
+    init_profiler(app)
+    
     # Create session directory if it doesn't exist
     os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
     
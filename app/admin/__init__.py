@@ -0,0 +1 @@
+# Admin API (profiling and diagnostics)
@@ -0,0 +1,122 @@
+from flask import Blueprint, jsonify, request, current_app
+import hmac
+import logging
+
+from app.profiler import PROFILE_DEFAULT_MINUTES, PROFILE_SLOW_SECONDS, folded_text, get_profiler, hot_functions
+
+admin_bp = Blueprint('admin', __name__)
+
+# Configure logger
+logger = logging.getLogger('allervie-analytics.admin')
+
+def check_admin_token():
+    """Return an error response unless the request carries ADMIN_TOKEN as a bearer token (None if it does)"""
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token:
+        return jsonify({
+            'success': False,
+            'error': 'Admin API is disabled (ADMIN_TOKEN is not set)'
+        }), 404
+
+    scheme, _, supplied = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8')):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+
+@admin_bp.before_request
+def require_admin_token():
+    """Only let requests carrying ADMIN_TOKEN as a bearer token through"""
+    return check_admin_token()
+
+@admin_bp.route('/profiler', methods=['GET'])
+def profiler_status():
+    """Return the shared profiler settings (null when off) and this worker's state"""
+    profiler = get_profiler()
+    return jsonify({
+        'success': True,
+        'settings': profiler.store.settings(),
+        'worker': profiler.stats()
+    })
+
+@admin_bp.route('/profiler', methods=['POST'])
+def enable_profiler():
+    """Switch the sampling profiler on in every worker
+
+    JSON body (all optional): sample_percent (share of requests profiled
+    from their start, default 0), slow_seconds (requests slower than this are
+    captured, default PROFILE_SLOW_SECONDS) and minutes (when profiling
+    switches itself off, default 30).
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        sample_percent = float(body.get('sample_percent', 0))
+        slow_seconds = float(body.get('slow_seconds', PROFILE_SLOW_SECONDS))
+        minutes = float(body.get('minutes', PROFILE_DEFAULT_MINUTES))
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'sample_percent, slow_seconds and minutes must be numbers'
+        }), 400
+
+    if not 0 <= sample_percent <= 100 or slow_seconds < 0 or minutes <= 0:
+        return jsonify({
+            'success': False,
+            'error': 'sample_percent must be 0-100, slow_seconds >= 0 and minutes > 0'
+        }), 400
+
+    profiler = get_profiler()
+    profiler.store.enable(sample_percent, slow_seconds, minutes)
+    profiler.refresh()
+    logger.info(f"Profiler enabled: {sample_percent}% sampled, slow after {slow_seconds}s, for {minutes} minutes")
+    return jsonify({
+        'success': True,
+        'settings': profiler.store.settings()
+    })
+
+@admin_bp.route('/profiler', methods=['DELETE'])
+def disable_profiler():
+    """Switch the sampling profiler off in every worker (captured profiles are kept)"""
+    profiler = get_profiler()
+    profiler.store.disable()
+    profiler.refresh()
+    logger.info("Profiler disabled")
+    return jsonify({
+        'success': True
+    })
+
+@admin_bp.route('/profiles')
+def list_profiles():
+    """List the captured profiles, newest first"""
+    return jsonify({
+        'success': True,
+        'data': get_profiler().store.list()
+    })
+
+@admin_bp.route('/profiles/<profile_id>')
+def get_profile(profile_id):
+    """Return a captured profile
+
+    ?format=folded returns the stacks as text for flamegraph.pl or
+    speedscope; the JSON default adds the functions with the most samples.
+    """
+    profile = get_profiler().store.get(profile_id)
+    if profile is None:
+        return jsonify({
+            'success': False,
+            'error': 'Profile not found'
+        }), 404
+
+    if request.args.get('format') == 'folded':
+        return current_app.response_class(
+            folded_text(profile['stacks']),
+            mimetype='text/plain',
+            headers={'Content-Disposition': f'attachment; filename="profile-{profile_id}.folded"'}
+        )
+
+    profile['hot_functions'] = hot_functions(profile['stacks'])
+    return jsonify({
+        'success': True,
+        'data': profile
+    })
@@ -1 +1,17 @@
-# Analytics module
\ No newline at end of file
+# Analytics module
+from app.lazy import lazy_attributes
+
+# Google SDK names are loaded on first use, so importing the analytics
+# blueprint (and serving /health) doesn't wait for the GA4/Ads client libraries
+__getattr__ = lazy_attributes(__name__, {
+    'Credentials': 'google.oauth2.credentials',
+    'Request': 'google.auth.transport.requests',
+    'BetaAnalyticsDataClient': 'google.analytics.data_v1beta',
+    'RunReportRequest': 'google.analytics.data_v1beta.types',
+    'DateRange': 'google.analytics.data_v1beta.types',
+    'Dimension': 'google.analytics.data_v1beta.types',
+    'Metric': 'google.analytics.data_v1beta.types',
+    'GoogleAdsException': 'google.ads.googleads.errors',
+    'GA4Analytics': 'app.analytics.ga4',
+    'GoogleAdsAnalytics': 'app.analytics.google_ads'
+})
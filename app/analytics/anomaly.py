@@ -0,0 +1,168 @@
+"""Anomaly detection and short-horizon forecasts for daily metric series.
+
+Every (series, metric) pair is a column of one daily DataFrame, so baselines,
+z-scores and forecasts are computed for all campaigns and metrics at once.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# Trailing days used for the rolling baseline
+ANOMALY_WINDOW = 14
+ANOMALY_MIN_PERIODS = 7
+
+# Same-weekday values compared for the seasonal check
+SEASONAL_WEEKS = 4
+
+# Extra history fetched before the requested range so baselines are warm
+ANALYSIS_WARMUP_DAYS = ANOMALY_WINDOW + 7 * SEASONAL_WEEKS
+
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 3.0))
+FORECAST_DAYS = 7
+
+
+def to_frame(rows, metrics, series_field=None, start_date=None, end_date=None):
+    """Pivot long rows (one per date and series) into a daily frame
+
+    Columns are a (series, metric) MultiIndex; dates with no row are filled
+    with zeros, since the APIs omit days without activity. Dates may be
+    YYYYMMDD (GA4) or YYYY-MM-DD (Google Ads).
+    """
+    frame = pd.DataFrame(rows)
+    if frame.empty:
+        return pd.DataFrame()
+
+    frame['date'] = pd.to_datetime(frame['date'].astype(str).str.replace('-', ''), format='%Y%m%d')
+    frame['series'] = frame[series_field].astype(str) if series_field else 'total'
+
+    wide = frame.pivot_table(index='date', columns='series', values=metrics, aggfunc='sum')
+    wide = wide.swaplevel(axis=1).sort_index(axis=1)
+
+    index = pd.date_range(
+        start_date or wide.index.min(),
+        end_date or wide.index.max(),
+        freq='D'
+    )
+    # Days some series have no row for are NaN after the pivot
+    return wide.reindex(index).fillna(0.0).astype(float)
+
+
+def detect(frame, window=ANOMALY_WINDOW, threshold=ANOMALY_Z_THRESHOLD):
+    """Return (baseline, spread, z, flags) arrays shaped like frame
+
+    A point is flagged when it is `threshold` deviations away from its
+    trailing rolling baseline and also from the same weekday in previous
+    weeks (when there is enough history to tell), so regular weekend dips
+    aren't reported. The deviation has a Poisson floor of sqrt(baseline) so
+    low-volume series don't flag every single click.
+    """
+    values = frame.to_numpy(dtype=float)
+
+    rolling = frame.rolling(window, min_periods=ANOMALY_MIN_PERIODS)
+    baseline = rolling.mean().shift(1).to_numpy()
+    spread = np.fmax(rolling.std().shift(1).to_numpy(), np.sqrt(np.abs(baseline)))
+
+    lagged = np.stack([frame.shift(7 * week).to_numpy(dtype=float) for week in range(1, SEASONAL_WEEKS + 1)])
+
+    # Mean and sample deviation over the weeks with data; written out rather
+    # than nanmean/nanstd, whose warnings for short history would need
+    # catch_warnings, which isn't thread-safe. errstate is thread-local.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        present = ~np.isnan(lagged)
+        count = present.sum(axis=0)
+        seasonal = np.where(present, lagged, 0).sum(axis=0) / count
+        squares = np.where(present, (lagged - seasonal) ** 2, 0).sum(axis=0)
+        seasonal_spread = np.fmax(np.sqrt(np.where(count > 1, squares / (count - 1), np.nan)), np.sqrt(np.abs(seasonal)))
+
+        z = np.where(spread > 0, (values - baseline) / spread, np.nan)
+        seasonal_z = np.where(seasonal_spread > 0, (values - seasonal) / seasonal_spread, np.nan)
+
+        flags = (np.abs(z) >= threshold) & (np.isnan(seasonal_z) | (np.abs(seasonal_z) >= threshold))
+
+    return baseline, spread, z, flags
+
+
+def forecast(frame, horizon=FORECAST_DAYS, window=ANOMALY_WINDOW):
+    """Forecast the next `horizon` days for every column
+
+    Uses the last week's level scaled by a weekday factor learned from the
+    last four weeks, with a band of +/- two recent standard deviations.
+    Returns (dates, predicted, lower, upper).
+    """
+    recent = frame.tail(7 * SEASONAL_WEEKS)
+    level = frame.tail(7).mean().to_numpy()
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        factors = recent.groupby(recent.index.dayofweek).mean() / recent.mean()
+    factors = factors.replace([np.inf, -np.inf], np.nan)
+
+    dates = pd.date_range(frame.index[-1] + pd.Timedelta(days=1), periods=horizon, freq='D')
+    weekday_factors = factors.reindex(dates.dayofweek).fillna(1.0).to_numpy()
+    predicted = weekday_factors * level
+
+    band = 2 * np.nan_to_num(frame.tail(window).std().to_numpy())
+    return dates, predicted, np.maximum(predicted - band, 0.0), predicted + band
+
+
+def analyze(frame, since=None, detail=None, labels=None):
+    """Run detection and forecasting over a daily frame and build a JSON-ready result
+
+    Only anomalies on or after `since` are reported. `detail` lists series
+    whose full baseline and forecast are included (for chart overlays);
+    `labels` maps series keys to display names.
+    """
+    if frame.empty:
+        return {'anomalies': [], 'series': {}}
+
+    baseline, spread, z, flags = detect(frame)
+    forecast_dates, predicted, lower, upper = forecast(frame)
+
+    dates = frame.index
+    visible = np.ones(len(dates), dtype=bool) if since is None else dates >= pd.Timestamp(since)
+    values = frame.to_numpy(dtype=float)
+    labels = labels or {}
+
+    anomalies = []
+    rows, columns = np.nonzero(flags & visible[:, None])
+    for row, column in zip(rows, columns):
+        series, metric = frame.columns[column]
+        anomalies.append({
+            'series': series,
+            'label': labels.get(series, series),
+            'metric': metric,
+            'date': dates[row].strftime('%Y-%m-%d'),
+            'value': float(values[row, column]),
+            'baseline': round(float(baseline[row, column]), 2),
+            'z': round(float(z[row, column]), 2),
+            'direction': 'spike' if z[row, column] > 0 else 'drop'
+        })
+    anomalies.sort(key=lambda item: abs(item['z']), reverse=True)
+
+    series_detail = {}
+    for column, (series, metric) in enumerate(frame.columns):
+        if detail is None or series not in detail:
+            continue
+        series_detail.setdefault(series, {})[metric] = {
+            'dates': [date.strftime('%Y-%m-%d') for date in dates[visible]],
+            'values': _json_floats(values[visible, column]),
+            'baseline': _json_floats(baseline[visible, column]),
+            'lower': _json_floats(baseline[visible, column] - ANOMALY_Z_THRESHOLD * spread[visible, column]),
+            'upper': _json_floats(baseline[visible, column] + ANOMALY_Z_THRESHOLD * spread[visible, column]),
+            'forecast': [
+                {
+                    'date': date.strftime('%Y-%m-%d'),
+                    'value': round(float(predicted[index, column]), 2),
+                    'lower': round(float(lower[index, column]), 2),
+                    'upper': round(float(upper[index, column]), 2)
+                }
+                for index, date in enumerate(forecast_dates)
+            ]
+        }
+
+    return {'anomalies': anomalies, 'series': series_detail}
+
+
+def _json_floats(array):
+    """Round to 2 places and turn NaN into None for JSON"""
+    return [None if np.isnan(value) else round(float(value), 2) for value in array]
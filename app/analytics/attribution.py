@@ -0,0 +1,116 @@
+"""Join GA4 sessions to Google Ads campaigns per day.
+
+Both sides are aggregated into frames indexed by (date, campaign_id), so the
+join is a single hash join whatever the number of campaigns and days.
+"""
+import numpy as np
+import pandas as pd
+
+# GA4 dimensions/metrics pulled for attribution
+GA4_DIMENSIONS = ['date', 'sessionGoogleAdsCampaignId', 'sessionGoogleAdsCampaignName']
+GA4_METRICS = ['sessions', 'conversions', 'totalRevenue']
+
+# Google Ads campaign columns pulled for attribution
+ADS_FIELDS = ['campaign_name', 'cost', 'clicks', 'conversions', 'conversion_value']
+
+# GA4 placeholder values for sessions that didn't come from an Ads campaign
+NOT_SET = ('', '(not set)', '(not provided)', '(organic)', '(direct)')
+
+RATIO_COLUMNS = ['cost_per_session', 'roas', 'blended_roas']
+
+SUM_COLUMNS = ['cost', 'clicks', 'ads_conversions', 'ads_conversions_value', 'sessions', 'ga4_conversions', 'ga4_revenue']
+
+
+def ads_frame(rows):
+    """Index Google Ads rows by (date, campaign_id)"""
+    frame = pd.DataFrame(rows, columns=['date', 'campaign_id'] + ADS_FIELDS)
+    frame['campaign_id'] = frame['campaign_id'].astype(str)
+    frame = frame.rename(columns={'conversions': 'ads_conversions', 'conversion_value': 'ads_conversions_value'})
+
+    # Date-segmented rows of one account are already unique per campaign and day
+    indexed = frame.set_index(['date', 'campaign_id'])
+    if indexed.index.is_unique:
+        return indexed
+    return frame.groupby(['date', 'campaign_id'], sort=False).agg({
+        'campaign_name': 'last',
+        'cost': 'sum',
+        'clicks': 'sum',
+        'ads_conversions': 'sum',
+        'ads_conversions_value': 'sum'
+    })
+
+
+def ga4_frame(rows, campaign_ids_by_name):
+    """Index GA4 rows by (date, campaign_id)
+
+    Rows whose Ads campaign ID isn't set are matched on campaign name through
+    campaign_ids_by_name (lower-cased names); the rest are not Ads traffic
+    and are dropped.
+    """
+    frame = pd.DataFrame(rows, columns=GA4_DIMENSIONS + GA4_METRICS)
+
+    # GA4 reports dates as YYYYMMDD, Google Ads as YYYY-MM-DD; convert each
+    # distinct value once rather than every row
+    frame['date'] = frame['date'].map({date: f"{date[:4]}-{date[4:6]}-{date[6:8]}" for date in frame['date'].unique()})
+
+    campaign_ids = frame['sessionGoogleAdsCampaignId'].astype(str)
+    missing = campaign_ids.isin(NOT_SET)
+    names = frame.loc[missing, 'sessionGoogleAdsCampaignName'].astype(str)
+    campaign_ids[missing] = names.map({name: campaign_ids_by_name.get(name.lower()) for name in names.unique()})
+    frame['campaign_id'] = campaign_ids
+    frame = frame.dropna(subset=['campaign_id'])
+
+    frame = frame.rename(columns={'conversions': 'ga4_conversions', 'totalRevenue': 'ga4_revenue'})
+    return frame.groupby(['date', 'campaign_id'], sort=False)[['sessions', 'ga4_conversions', 'ga4_revenue']].sum()
+
+
+def join(ads_rows, ga4_rows):
+    """Full outer join of Ads spend and GA4 sessions per (date, campaign_id)"""
+    ads = ads_frame(ads_rows)
+    names = ads['campaign_name'].groupby(level='campaign_id').last()
+    campaign_ids_by_name = {str(name).lower(): campaign_id for campaign_id, name in names.items()}
+
+    ga4 = ga4_frame(ga4_rows, campaign_ids_by_name)
+    joined = ads.join(ga4, how='outer')
+    joined[SUM_COLUMNS] = joined[SUM_COLUMNS].fillna(0.0).astype(float)
+
+    # Days with sessions but no spend still get the campaign's name
+    campaign_ids = pd.Series(joined.index.get_level_values('campaign_id'), index=joined.index)
+    joined['campaign_name'] = joined['campaign_name'].fillna(campaign_ids.map(names))
+    return joined
+
+
+def with_ratios(frame):
+    """Add cost per session, Ads ROAS and blended (GA4 revenue) ROAS"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        frame['cost_per_session'] = frame['cost'] / frame['sessions']
+        frame['roas'] = frame['ads_conversions_value'] / frame['cost']
+        frame['blended_roas'] = frame['ga4_revenue'] / frame['cost']
+    return frame.replace([np.inf, -np.inf], np.nan)
+
+
+def attribute(ads_rows, ga4_rows, group='campaign', campaign_ids=None):
+    """Return attribution rows per campaign ('campaign') or per campaign and day ('day')
+
+    campaign_ids optionally limits the result to those campaigns.
+    """
+    if group not in ('campaign', 'day'):
+        raise ValueError(f"Unsupported attribution grouping: {group}")
+
+    joined = join(ads_rows, ga4_rows)
+    if campaign_ids:
+        joined = joined[joined.index.get_level_values('campaign_id').isin(campaign_ids)]
+    if group == 'campaign':
+        joined = joined.groupby(level='campaign_id').agg(
+            {'campaign_name': 'last', **{column: 'sum' for column in SUM_COLUMNS}}
+        )
+        sort_by = ['cost']
+    else:
+        sort_by = ['date', 'cost']
+
+    result = with_ratios(joined).reset_index().sort_values(sort_by, ascending=group == 'day').round(4)
+
+    # Only the ratios and names can be missing; send those as null
+    for column in RATIO_COLUMNS + ['campaign_name']:
+        result[column] = result[column].astype(object).where(result[column].notna(), None)
+    return result.to_dict('records')
@@ -0,0 +1,506 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from app.analytics.cachefile import CacheFile, CacheFileError, write_cache_file
+
+from app.analytics.memory import MEMORY_SPILL_BYTES, estimate_size, get_memory_accountant
+
+# Directory for the cross-worker cache database (local disk, one per container)
+RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', os.path.join(os.getcwd(), 'analytics_cache'))
+RESULT_CACHE_TTL = int(os.getenv('RESULT_CACHE_TTL', 900))
+
+# Cache file the shared cache is saved to every CACHE_SAVE_INTERVAL seconds
+# (0 disables) and on shutdown, and restored from on misses after a restart.
+# Entries with less than CACHE_FILE_MIN_TTL seconds left aren't saved.
+CACHE_FILE_PATH = os.getenv('CACHE_FILE_PATH', os.path.join(RESULT_CACHE_DIR, 'results.cache'))
+CACHE_SAVE_INTERVAL = int(os.getenv('CACHE_SAVE_INTERVAL', 300))
+CACHE_FILE_MIN_TTL = 60
+
+# Bump when the shape of cached payloads or the queries behind cache keys
+# change (e.g. a new Google Ads API version), so older cache files are ignored
+CACHE_SCHEMA_VERSION = 1
+
+logger = logging.getLogger('allervie-analytics.cache')
+
+
+class ResultCache:
+    """Thread-safe in-process TTL cache with LRU eviction for report results
+
+    An optional SharedResultCache acts as a second tier: misses are looked up
+    there and writes go to both, so other workers see the same results.
+    With a pool name, entries count against the process memory budget; values
+    over MEMORY_SPILL_BYTES are then only kept in the shared tier.
+    """
+
+    def __init__(self, ttl=900, max_entries=256, shared=None, pool=None):
+        """Initialize with a default time-to-live (seconds) and an entry limit"""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.shared = shared
+        self.pool = pool
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.accountant = get_memory_accountant() if pool else None
+        if self.accountant is not None:
+            self.accountant.register(pool, self.discard)
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= time.time():
+                    # Mark as most recently used
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    if self.accountant is not None:
+                        self.accountant.touch(self.pool, key)
+                    return value
+                del self._entries[key]
+                self._release([key])
+            self.misses += 1
+
+        if self.shared is None:
+            return None
+
+        # Fall back to the shared tier and keep a local copy
+        found = self.shared.get_with_expiry(key)
+        if found is None:
+            return None
+        value, expires_at = found
+        self._store(key, value, expires_at)
+        return value
+
+    def set(self, key, value, ttl=None, cost=None):
+        """Store value under key, evicting the least recently used entries if full
+
+        cost is how long the value took to produce (seconds); entries that
+        were expensive to fetch are the last evicted for the memory budget.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+        if not self._store(key, value, time.time() + ttl, cost) and self.accountant is not None:
+            self.accountant.spilled()
+
+    def _store(self, key, value, expires_at, cost=None):
+        """Keep a local copy; returns False when the value is left to the shared tier"""
+        size = estimate_size(value) if self.accountant is not None else 0
+        if self.accountant is not None and 0 < MEMORY_SPILL_BYTES <= size and self.shared is not None:
+            # Served from the shared tier on disk instead of the heap
+            self.discard(key)
+            return False
+
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            self._release(evicted)
+            if self.accountant is not None:
+                self.accountant.admit(self.pool, key, size, cost)
+
+        if self.accountant is not None:
+            self.accountant.enforce()
+        return True
+
+    def discard(self, key):
+        """Drop an entry from this process only (the shared tier keeps it)"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._release([key])
+
+    def _release(self, keys):
+        if self.accountant is not None:
+            for key in keys:
+                self.accountant.release(self.pool, key)
+
+    def invalidate(self, prefix=''):
+        """Drop every entry whose key starts with prefix (all entries by default)"""
+        with self._lock:
+            stale = [key for key in self._entries if key.startswith(prefix)]
+            for key in stale:
+                del self._entries[key]
+            self._release(stale)
+        if self.shared is not None:
+            self.shared.invalidate(prefix)
+        return len(stale)
+
+    def stats(self):
+        """Return counters suitable for a metrics endpoint"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+class SQLiteStore:
+    """Base for stores kept in a local SQLite (WAL) database shared by all workers
+
+    Subclasses define SCHEMA, the statements run when a connection is opened.
+    """
+
+    SCHEMA = []
+
+    def __init__(self, path):
+        """Initialize with the database path; the file is opened on first use"""
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self):
+        """Return this thread's connection, reopening it after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA mmap_size=268435456')
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+
+class SharedResultCache(SQLiteStore):
+    """Cross-process cache of serialized payloads in a local SQLite (WAL) database
+
+    All gunicorn workers in a container open the same file, so a result fetched
+    by one worker is warm for the others. Values are stored as serialized JSON
+    bytes that can be written straight into a response without re-encoding;
+    reads go through SQLite's memory map rather than the Python heap.
+
+    The live entries are also saved to a cache file (see cachefile), and
+    misses are looked up there, so a restarted container comes back warm.
+    Prefixes invalidated after the file was written are never restored.
+    """
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS results ('
+        'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS invalidations (prefix TEXT PRIMARY KEY, invalidated_at REAL NOT NULL)'
+    ]
+
+    def __init__(self, path, ttl=900, cache_file=None):
+        """Initialize with the database path, a default time-to-live (seconds) and the cache file path"""
+        super().__init__(path)
+        self.ttl = ttl
+        self.cache_file_path = cache_file
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+        self._cache_file = None
+        self._cache_file_pid = None
+        self._saver_pid = None
+        self._file_lock = threading.Lock()
+
+    def get_bytes(self, key):
+        """Return the serialized payload for key, or None if missing or expired"""
+        found = self._get_row(key)
+        return found[0] if found else None
+
+    def _get_row(self, key):
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM results WHERE key = ? AND expires_at >= ?',
+            (key, time.time())
+        ).fetchone()
+        if row is None:
+            row = self._restore(key)
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row
+
+    def _open_cache_file(self):
+        """Return the cache file as it was when this process started, or None"""
+        with self._file_lock:
+            if self._cache_file_pid != os.getpid():
+                self._cache_file_pid = os.getpid()
+                self._cache_file = None
+                if self.cache_file_path and os.path.exists(self.cache_file_path):
+                    try:
+                        self._cache_file = CacheFile(self.cache_file_path, CACHE_SCHEMA_VERSION)
+                        logger.info(f"Opened cache file {self.cache_file_path} with {len(self._cache_file)} entries")
+                    except CacheFileError as e:
+                        logger.warning(str(e))
+            return self._cache_file
+
+    def _restore(self, key):
+        """Copy a live entry from the cache file into the database; returns (value, expires_at) or None"""
+        cache_file = self._open_cache_file()
+        found = cache_file.get(key) if cache_file is not None else None
+        if found is None:
+            return None
+
+        conn = self._connect()
+        if conn.execute(
+            'SELECT 1 FROM invalidations WHERE substr(?, 1, length(prefix)) = prefix AND invalidated_at >= ?',
+            (key, cache_file.created_at)
+        ).fetchone():
+            return None
+
+        conn.execute('INSERT OR IGNORE INTO results (key, value, expires_at) VALUES (?, ?, ?)', (key, *found))
+        self.restored += 1
+        return found
+
+    def save(self, path=None):
+        """Write the live entries to the cache file; returns the number saved"""
+        path = path or self.cache_file_path
+        rows = self._connect().execute(
+            "SELECT key, value, expires_at FROM results WHERE expires_at >= ? AND key NOT LIKE '%:lease'",
+            (time.time() + CACHE_FILE_MIN_TTL,)
+        )
+        started = time.monotonic()
+        count = write_cache_file(path, rows, CACHE_SCHEMA_VERSION)
+        logger.info(f"Saved {count} cache entries to {path} in {time.monotonic() - started:.2f}s")
+        return count
+
+    def _ensure_saver(self):
+        """Start this worker's periodic save thread (once per process)"""
+        if self._saver_pid == os.getpid() or not self.cache_file_path or CACHE_SAVE_INTERVAL <= 0:
+            return
+        with self._file_lock:
+            if self._saver_pid != os.getpid():
+                self._saver_pid = os.getpid()
+                threading.Thread(target=self._save_loop, daemon=True).start()
+
+    def _save_loop(self):
+        """Save the cache every CACHE_SAVE_INTERVAL seconds, in whichever worker wins the lease"""
+        pid = os.getpid()
+        while pid == os.getpid():
+            time.sleep(CACHE_SAVE_INTERVAL)
+            try:
+                if self.add('cache-file:lease', pid, ttl=CACHE_SAVE_INTERVAL * 0.9):
+                    self.save()
+            except Exception as e:
+                logger.warning(f"Could not save the result cache: {str(e)}")
+
+    def set_bytes(self, key, data, ttl=None):
+        """Store a serialized payload under key"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self._connect().execute(
+            'INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, data, expires_at)
+        )
+        self._ensure_saver()
+
+    def add(self, key, value, ttl=None):
+        """Store value only if key has no live entry; returns True if it was stored
+
+        Works as a cross-worker lease: exactly one caller wins until ttl expires.
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM results WHERE key = ? AND expires_at < ?', (key, time.time()))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO results (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value).encode('utf-8'), expires_at)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def snapshot(self, key, interval, fetch):
+        """Return a {'fetched_at', 'data'} snapshot no older than interval, if one exists
+
+        When the stored snapshot is stale, the worker that wins a lease calls
+        fetch() and stores the result; the others keep the stale snapshot (or
+        None) until it lands. Upstream is called at most once per interval
+        however many workers poll.
+        """
+        found = self.get(key)
+        if found is None or time.time() - found['fetched_at'] >= interval:
+            if self.add(f"{key}:lease", os.getpid(), ttl=interval):
+                found = {'fetched_at': time.time(), 'data': fetch()}
+                self.set(key, found, ttl=interval * 3)
+        return found
+
+    def get(self, key):
+        """Return the decoded value for key, or None"""
+        data = self.get_bytes(key)
+        return json.loads(data) if data is not None else None
+
+    def get_with_expiry(self, key):
+        """Return (decoded value, expires_at) for key, or None"""
+        found = self._get_row(key)
+        return (json.loads(found[0]), found[1]) if found else None
+
+    def set(self, key, value, ttl=None):
+        """Serialize value as JSON and store it under key"""
+        self.set_bytes(key, json.dumps(value).encode('utf-8'), ttl)
+
+    def invalidate(self, prefix=''):
+        """Drop every entry whose key starts with prefix (here and in the cache file)"""
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO invalidations (prefix, invalidated_at) VALUES (?, ?)',
+            (prefix, time.time())
+        )
+        cursor = conn.execute("DELETE FROM results WHERE key LIKE ? ESCAPE '\\'", (_like_prefix(prefix),))
+        return cursor.rowcount
+
+    def trim(self, prefix, max_bytes):
+        """Keep the entries under prefix within max_bytes, dropping those expiring soonest
+
+        Leases are never dropped (they are tiny, and dropping one would let a
+        second worker start the same refresh). Returns the number of entries
+        removed.
+        """
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT key, LENGTH(value) FROM results WHERE key LIKE ? ESCAPE '\\' AND key NOT LIKE '%:lease' "
+            "ORDER BY expires_at DESC",
+            (_like_prefix(prefix),)
+        ).fetchall()
+
+        total = 0
+        evict = []
+        for key, size in rows:
+            total += size
+            if total > max_bytes:
+                evict.append((key,))
+        if evict:
+            conn.executemany('DELETE FROM results WHERE key = ?', evict)
+        return len(evict)
+
+    def usage(self, prefix):
+        """Return (entries, bytes) stored under prefix"""
+        return self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM results WHERE key LIKE ? ESCAPE '\\'",
+            (_like_prefix(prefix),)
+        ).fetchone()
+
+    def purge_expired(self):
+        """Delete expired entries and return how many were removed"""
+        cursor = self._connect().execute('DELETE FROM results WHERE expires_at < ?', (time.time(),))
+        return cursor.rowcount
+
+    def stats(self):
+        """Return counters suitable for a metrics endpoint"""
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM results'
+        ).fetchone()
+        cache_file = self._cache_file if self._cache_file_pid == os.getpid() else None
+        return {
+            'path': self.path,
+            'entries': entries,
+            'bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'restored': self.restored,
+            'cache_file': {
+                'path': cache_file.path,
+                'entries': len(cache_file),
+                'created_at': cache_file.created_at
+            } if cache_file is not None else None
+        }
+
+
+def _like_prefix(prefix):
+    """LIKE pattern matching keys that start with prefix, wildcards escaped"""
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+class NamespacedCache:
+    """View of a SharedResultCache confined to one key prefix and byte budget
+
+    Keys are stored as '<namespace>:<key>'. Once writes since the last check
+    add up to a sixteenth of the budget, the namespace is trimmed back under
+    max_bytes, so one namespace can't evict another's entries.
+    """
+
+    def __init__(self, shared, namespace, max_bytes):
+        """Initialize with the shared cache, the key namespace and its size budget"""
+        self.shared = shared
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get_bytes(self, key):
+        """Return the serialized payload for key, or None"""
+        return self.shared.get_bytes(self._key(key))
+
+    def set_bytes(self, key, data, ttl=None):
+        """Store a serialized payload under key, trimming the namespace if it grew"""
+        self.shared.set_bytes(self._key(key), data, ttl)
+        with self._lock:
+            self._written += len(data)
+            over_budget = self._written >= self.max_bytes / 16
+            if over_budget:
+                self._written = 0
+        if over_budget:
+            self.shared.trim(f"{self.namespace}:", self.max_bytes)
+
+    def add(self, key, value, ttl=None):
+        """Store value only if key has no live entry; returns True if it was stored"""
+        return self.shared.add(self._key(key), value, ttl)
+
+    def get(self, key):
+        """Return the decoded value for key, or None"""
+        return self.shared.get(self._key(key))
+
+    def get_with_expiry(self, key):
+        """Return (decoded value, expires_at) for key, or None"""
+        return self.shared.get_with_expiry(self._key(key))
+
+    def set(self, key, value, ttl=None):
+        """Serialize value as JSON and store it under key"""
+        self.set_bytes(key, json.dumps(value).encode('utf-8'), ttl)
+
+    # Same lease-and-refresh logic, built on this view's get/add/set
+    snapshot = SharedResultCache.snapshot
+
+    def invalidate(self, prefix=''):
+        """Drop every entry in this namespace whose key starts with prefix"""
+        return self.shared.invalidate(self._key(prefix))
+
+    def stats(self):
+        """Return usage of this namespace for a metrics endpoint"""
+        entries, size = self.shared.usage(f"{self.namespace}:")
+        return {
+            'namespace': self.namespace,
+            'entries': entries,
+            'bytes': size,
+            'max_bytes': self.max_bytes
+        }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache():
+    """Return the process-wide handle on the shared result cache"""
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = SharedResultCache(
+                os.path.join(RESULT_CACHE_DIR, 'results.sqlite3'),
+                ttl=RESULT_CACHE_TTL,
+                cache_file=CACHE_FILE_PATH
+            )
+        return _shared_cache
@@ -0,0 +1,121 @@
+"""Compact on-disk images of the shared result cache.
+
+A cache file holds the live entries of the shared result cache so a new
+container (or a wiped cache directory) starts warm. It is written to a
+temporary file and renamed into place, so it can sit on storage that
+SQLite's WAL mode can't (network volumes), and it is read through a
+read-only memory map: opening it only indexes the keys, and values are
+decompressed when they are first asked for.
+
+Layout (little-endian):
+
+    b'AVRC', format version (u16), header length (u32), header (JSON)
+    records: key length (u32), value length (u32), expires_at (f64),
+             crc32 of the stored value (u32), key (UTF-8), value (zlib)
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+
+logger = logging.getLogger('allervie-analytics.cachefile')
+
+MAGIC = b'AVRC'
+FORMAT_VERSION = 1
+
+_PREAMBLE = struct.Struct('<4sHI')
+_RECORD = struct.Struct('<IIdI')
+
+
+class CacheFileError(Exception):
+    """Raised for cache files that are unreadable or of another format or schema"""
+
+
+def write_cache_file(path, rows, schema):
+    """Write (key, value bytes, expires_at) rows to a cache file atomically; returns the row count"""
+    header = json.dumps({'schema': schema, 'created_at': time.time()}).encode('utf-8')
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    count = 0
+    try:
+        with open(temp_path, 'wb') as file:
+            file.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            file.write(header)
+            for key, value, expires_at in rows:
+                key = key.encode('utf-8')
+                value = zlib.compress(bytes(value), 3)
+                file.write(_RECORD.pack(len(key), len(value), expires_at, zlib.crc32(value)))
+                file.write(key)
+                file.write(value)
+                count += 1
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return count
+
+
+class CacheFile:
+    """Read-only, memory-mapped view of a cache file written by write_cache_file"""
+
+    def __init__(self, path, schema):
+        """Map the file and index its keys; raises CacheFileError if it can't be used"""
+        try:
+            with open(path, 'rb') as file:
+                self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise CacheFileError(f"Cannot open cache file {path}: {str(e)}")
+
+        if len(self._map) < _PREAMBLE.size:
+            raise CacheFileError(f"Cache file {path} is truncated")
+        magic, version, header_length = _PREAMBLE.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise CacheFileError(f"Cache file {path} has an unknown format")
+
+        offset = _PREAMBLE.size + header_length
+        try:
+            self.header = json.loads(self._map[_PREAMBLE.size:offset])
+        except ValueError:
+            raise CacheFileError(f"Cache file {path} has a corrupt header")
+        if self.header.get('schema') != schema:
+            raise CacheFileError(f"Cache file {path} is for cache schema {self.header.get('schema')}, not {schema}")
+
+        self.path = path
+        self.created_at = self.header['created_at']
+        self._index = {}
+
+        # A file cut short (e.g. a full disk) still serves its complete records
+        size = len(self._map)
+        while offset + _RECORD.size <= size:
+            key_length, value_length, expires_at, checksum = _RECORD.unpack_from(self._map, offset)
+            start = offset + _RECORD.size + key_length
+            if start + value_length > size:
+                break
+            key = self._map[offset + _RECORD.size:start].decode('utf-8')
+            self._index[key] = (start, value_length, expires_at, checksum)
+            offset = start + value_length
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, key):
+        """Return (value bytes, expires_at) for a live entry, or None"""
+        found = self._index.get(key)
+        if found is None:
+            return None
+
+        start, length, expires_at, checksum = found
+        if expires_at < time.time():
+            return None
+        value = self._map[start:start + length]
+        if zlib.crc32(value) != checksum:
+            logger.warning(f"Skipping corrupt entry {key} in cache file {self.path}")
+            return None
+        return zlib.decompress(value), expires_at
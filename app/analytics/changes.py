@@ -0,0 +1,246 @@
+"""Change-driven freshness for cached Google Ads data.
+
+A ChangeTracker polls the account's change_status resource and records, per
+campaign and ad group, when a change was last seen. Those times are the
+version of the cached data: cache keys include them, so an edit invalidates
+exactly the affected entries in every worker, and data that can't change
+otherwise (settled date ranges) can be cached for hours instead of minutes.
+The state lives in the tenant's shared cache; one worker polls per interval.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+logger = logging.getLogger('allervie-analytics.changes')
+
+# Seconds between change_status polls; versions older than a few intervals
+# are not trusted, and caching falls back to the normal TTL
+ADS_CHANGE_POLL_INTERVAL = int(os.getenv('ADS_CHANGE_POLL_INTERVAL', 120))
+STALE_INTERVALS = 3
+
+# Metrics of days at least this old are treated as final (late conversions
+# are still attributed to recent days), so their rows only change on edits
+ADS_SETTLED_AFTER_DAYS = int(os.getenv('ADS_SETTLED_AFTER_DAYS', 3))
+ADS_SETTLED_CACHE_TTL = int(os.getenv('ADS_SETTLED_CACHE_TTL', 24 * 3600))
+
+# A tracker nobody has used for this long stops polling
+CHANGE_IDLE_SECONDS = 900
+
+# change_status returns at most this many rows per query; a full page means
+# changes may be missing, so every version is bumped
+CHANGE_STATUS_LIMIT = 10000
+
+_DATE_RANGE = re.compile(r"segments\.date BETWEEN '(\d{4}-\d{2}-\d{2})' AND '(\d{4}-\d{2}-\d{2})'")
+_CAMPAIGN_FILTER = re.compile(r"\bcampaign\.id = (\d+)")
+_AD_GROUP_FILTER = re.compile(r"\bad_group\.id = (\d+)")
+
+
+def settled_before():
+    """First day whose metrics may still change"""
+    return date.today() - timedelta(days=ADS_SETTLED_AFTER_DAYS - 1)
+
+
+def is_settled(query_text):
+    """Whether a GAQL query only covers settled days"""
+    match = _DATE_RANGE.search(query_text)
+    return bool(match) and match.group(2) < settled_before().isoformat()
+
+
+def _resource_id(resource_name):
+    """'customers/1/campaigns/2' -> '2'"""
+    return resource_name.rsplit('/', 1)[-1] if resource_name else None
+
+
+class ChangeTracker:
+    """Polls change_status for one tenant's Google Ads account
+
+    versions hold the poll time at which a change was first seen, for the
+    account as a whole and per campaign and ad group. Entries older than
+    ADS_SETTLED_CACHE_TTL are pruned (no cache entry can be older than
+    that); a resource without an entry has the version 'started', when
+    tracking (re)started.
+    """
+
+    def __init__(self, tenant, interval=ADS_CHANGE_POLL_INTERVAL):
+        """Initialize with the tenant and poll interval (seconds)"""
+        self.tenant = tenant
+        self.interval = interval
+        self.credentials = None
+        self.polls = 0
+        self.changes = 0
+        self.errors = 0
+        self._state = None
+        self._last_used = 0.0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def state_key(self):
+        return f"ads-changes:{self.tenant.ads_customer_id}"
+
+    def watch(self, credentials):
+        """Record a user's credentials for polling and start the poller if it isn't running"""
+        with self._lock:
+            self.credentials = credentials
+            self._last_used = time.monotonic()
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+                self._thread.start()
+
+    def state(self):
+        """Return the current version state, or None when it isn't fresh enough to rely on"""
+        with self._lock:
+            state = self._state
+        if state is None or time.time() - state['checked_at'] > self.interval * STALE_INTERVALS:
+            return None
+        return state
+
+    def version(self, campaign_id=None, ad_group_id=None):
+        """Return a cache key label for data of the account, a campaign or an ad group
+
+        Empty when tracking isn't active, so keys fall back to TTL-only caching.
+        """
+        state = self.state()
+        if state is None:
+            return ''
+        if ad_group_id is not None:
+            return f"v{state['ad_groups'].get(str(ad_group_id), state['started'])}"
+        if campaign_id is not None:
+            return f"v{state['campaigns'].get(str(campaign_id), state['started'])}"
+        return f"v{state['account']}"
+
+    def query_version(self, query_text):
+        """Return (version label, ttl or None) for caching the result of a GAQL query
+
+        Queries filtered on one ad group or campaign follow that resource's
+        version; settled date ranges get the long TTL.
+        """
+        ad_group = _AD_GROUP_FILTER.search(query_text)
+        campaign = _CAMPAIGN_FILTER.search(query_text)
+        label = self.version(
+            campaign_id=campaign.group(1) if campaign and not ad_group else None,
+            ad_group_id=ad_group.group(1) if ad_group else None
+        )
+        if not label:
+            return '', None
+        return label, ADS_SETTLED_CACHE_TTL if is_settled(query_text) else None
+
+    def changed_campaigns(self, since):
+        """Return the IDs of campaigns changed after version `since`, or None if unknown"""
+        state = self.state()
+        if state is None or since < state['started']:
+            return None
+        return {campaign_id for campaign_id, version in state['campaigns'].items() if version > since}
+
+    def _poll_loop(self):
+        pid = os.getpid()
+        while pid == os.getpid():
+            if time.monotonic() - self._last_used > CHANGE_IDLE_SECONDS:
+                logger.info(f"Stopping idle change tracker for customer {self.tenant.ads_customer_id}")
+                return
+
+            try:
+                state = self._refresh()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"change_status poll for customer {self.tenant.ads_customer_id} failed: {str(e)}")
+                state = None
+
+            if state is not None:
+                with self._lock:
+                    self._state = state
+
+            time.sleep(self.interval / 2)
+
+    def _refresh(self):
+        """Return the shared state, polling change_status if it's due and this worker wins the lease"""
+        cache = self.tenant.cache
+        state = cache.get(self.state_key)
+        if state is not None and time.time() - state['checked_at'] < self.interval:
+            return state
+        if not cache.add(f"{self.state_key}:lease", os.getpid(), ttl=self.interval):
+            return state
+
+        state = self._poll(state)
+        cache.set(self.state_key, state, ttl=ADS_SETTLED_CACHE_TTL)
+        return state
+
+    def _poll(self, state):
+        """Fetch changes since the last poll and return the updated state"""
+        from app.analytics.google_ads import GaqlQuery
+
+        now = time.time()
+        if state is None:
+            # Start over: every version is new, so no older cache entry matches
+            since = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+            state = {'started': now, 'account': now, 'campaigns': {}, 'ad_groups': {}, 'since': since, 'seen': []}
+            fresh_start = True
+        else:
+            fresh_start = False
+
+        # last_change_date_time is in the account's time zone; the upper bound
+        # only has to be in the future
+        until = (date.today() + timedelta(days=2)).strftime('%Y-%m-%d')
+        query = GaqlQuery('change_status')
+        query.where('change_status.last_change_date_time', '>=', state['since'])
+        query.where('change_status.last_change_date_time', '<=', until)
+        query.order_by('change_status.last_change_date_time', descending=False)
+        query.limit(CHANGE_STATUS_LIMIT)
+
+        google_ads = self.tenant.google_ads(self.credentials, watch=False)
+        rows = [row for batch in google_ads.iter_search(query) for row in batch]
+        self.polls += 1
+
+        # Records at the previous high-water mark were already applied
+        seen = {tuple(item) for item in state['seen']}
+        changed = [
+            row for row in rows
+            if row['change_status_last_change_date_time']
+            and (row['change_status_resource_name'], row['change_status_last_change_date_time']) not in seen
+        ]
+
+        if changed:
+            state['since'] = max(row['change_status_last_change_date_time'] for row in changed)
+            state['seen'] = [
+                [row['change_status_resource_name'], row['change_status_last_change_date_time']]
+                for row in rows if row['change_status_last_change_date_time'] == state['since']
+            ]
+
+        if changed and not fresh_start:
+            self.changes += len(changed)
+            state['account'] = now
+            if len(rows) >= CHANGE_STATUS_LIMIT or any(not row['change_status_campaign'] for row in changed):
+                # Changes may be missing, or aren't tied to a campaign (e.g. shared budgets)
+                state.update(started=now, campaigns={}, ad_groups={})
+            else:
+                for row in changed:
+                    state['campaigns'][_resource_id(row['change_status_campaign'])] = now
+                    if row['change_status_ad_group']:
+                        state['ad_groups'][_resource_id(row['change_status_ad_group'])] = now
+            logger.info(f"{len(changed)} Google Ads changes for customer {self.tenant.ads_customer_id}")
+
+        # Versions older than any cache entry can go
+        cutoff = now - ADS_SETTLED_CACHE_TTL
+        for kind in ('campaigns', 'ad_groups'):
+            state[kind] = {key: version for key, version in state[kind].items() if version > cutoff}
+
+        state['checked_at'] = now
+        return state
+
+    def stats(self):
+        """Return tracker state for a metrics endpoint"""
+        state = self.state()
+        return {
+            'running': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+            'active': state is not None,
+            'polls': self.polls,
+            'changes': self.changes,
+            'errors': self.errors,
+            'tracked_campaigns': len(state['campaigns']) if state else 0,
+            'checked_at': state['checked_at'] if state else None
+        }
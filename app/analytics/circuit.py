@@ -0,0 +1,121 @@
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """Process-wide circuit breaker tracking error rate and latency for one backend
+
+    closed    - requests flow normally while the recent error rate stays low
+    open      - requests are refused until open_seconds have passed
+    half_open - a single probe request is let through; its outcome closes or
+                re-opens the circuit
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, window=20, min_calls=3, error_threshold=0.5, open_seconds=60):
+        """Initialize with the size of the outcome window and trip thresholds"""
+        self.name = name
+        self.min_calls = min_calls
+        self.error_threshold = error_threshold
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes = deque(maxlen=window)
+        self._latency = None
+        self._opened_at = 0.0
+        self._probe_started = None
+        self._lock = threading.Lock()
+        self.total_calls = 0
+        self.total_failures = 0
+        self.times_opened = 0
+
+    def allow_request(self):
+        """Return True if a request may be sent to this backend now"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_started = None
+
+            if self.state == self.HALF_OPEN:
+                # Only one probe at a time; a probe that never reported back is
+                # considered lost after open_seconds
+                if self._probe_started is not None and now - self._probe_started < self.open_seconds:
+                    return False
+                self._probe_started = now
+
+            return True
+
+    def is_open(self):
+        """Return True while the circuit is open and still cooling down"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def record_success(self, latency):
+        """Record a request that the backend answered"""
+        with self._lock:
+            self._record(True, latency)
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+                self._outcomes.append(True)
+
+    def record_failure(self, latency):
+        """Record a request that failed at the transport level"""
+        with self._lock:
+            self._record(False, latency)
+            self.total_failures += 1
+
+            if self.state == self.HALF_OPEN or (
+                len(self._outcomes) >= self.min_calls and self._error_rate() >= self.error_threshold
+            ):
+                self._open()
+
+    def _record(self, ok, latency):
+        """Update the outcome window and the latency moving average"""
+        self.total_calls += 1
+        self._outcomes.append(ok)
+        self._probe_started = None
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency = 0.8 * self._latency + 0.2 * latency
+
+    def _open(self):
+        """Trip the circuit"""
+        if self.state != self.OPEN:
+            self.times_opened += 1
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def _error_rate(self):
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def score(self):
+        """Sort key for backend selection: healthy, reliable, fast backends first"""
+        with self._lock:
+            return (self.state != self.CLOSED, round(self._error_rate(), 1), self._latency or 0.0)
+
+    def stats(self):
+        """Return the breaker state for a metrics endpoint"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'error_rate': round(self._error_rate(), 3),
+                'latency_ms': round(self._latency * 1000, 1) if self._latency is not None else None,
+                'calls': self.total_calls,
+                'failures': self.total_failures,
+                'times_opened': self.times_opened
+            }
+
+
+def order_backends(breakers, names):
+    """Order backend names by breaker health and latency, keeping preference order on ties"""
+    return sorted(names, key=lambda name: breakers[name].score())
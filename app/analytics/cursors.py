@@ -0,0 +1,40 @@
+"""Opaque, signed pagination cursors.
+
+A cursor carries a position (e.g. a Google Ads page token and an offset into
+that page) together with an HMAC over the position and the query it belongs
+to, so clients can't forge positions or replay a cursor against a different
+query, account or tenant.
+"""
+import base64
+import hashlib
+import hmac
+import json
+
+
+class InvalidCursorError(ValueError):
+    """Raised for cursors that are malformed, tampered with or for another query"""
+
+
+def _signature(secret, scope, payload):
+    key = secret.encode('utf-8') if isinstance(secret, str) else secret
+    return hmac.new(key, scope.encode('utf-8') + b'\0' + payload, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(secret, scope, position):
+    """Return an opaque cursor for a JSON-serializable position within scope"""
+    payload = json.dumps(position, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    token = _signature(secret, scope, payload) + payload
+    return base64.urlsafe_b64encode(token).decode('ascii').rstrip('=')
+
+
+def decode_cursor(secret, scope, cursor):
+    """Return the position of a cursor issued by encode_cursor for the same scope"""
+    try:
+        token = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    except (ValueError, TypeError):
+        raise InvalidCursorError("Malformed cursor")
+
+    signature, payload = token[:16], token[16:]
+    if len(signature) < 16 or not hmac.compare_digest(signature, _signature(secret, scope, payload)):
+        raise InvalidCursorError("Invalid cursor for this request")
+    return json.loads(payload)
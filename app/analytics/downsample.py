@@ -0,0 +1,116 @@
+"""Reduce report rows to what a chart can show.
+
+Category reports keep their top N rows and sum the rest into one 'Other' row;
+time series are downsampled with Largest-Triangle-Three-Buckets (LTTB), which
+keeps the peaks and dips a line chart needs. Either way the client gets a
+bounded number of rows however large the account is.
+"""
+import numpy as np
+
+# Key of the bucket holding everything outside the top N (GA4 style placeholder)
+OTHER_KEY = '(other)'
+
+# Ratio columns can't be summed; they are recomputed for the 'Other' bucket
+# as numerator / denominator * scale, or left empty if the inputs are missing
+RATIO_COLUMNS = {
+    'ctr': ('clicks', 'impressions', 100.0),
+    'average_cpc': ('cost', 'clicks', 1.0),
+    'average_cpm': ('cost', 'impressions', 1000.0),
+    'average_cost': (None, None, 1.0),
+    'cost_per_conversion': ('cost', 'conversions', 1.0)
+}
+
+
+def top_n(rows, metric, n, key_field, label_field=None):
+    """Keep the n rows with the largest metric, followed by one 'Other' row
+
+    Numeric columns of the remaining rows are summed; ratio columns are
+    recomputed from the sums. Rows are returned sorted by metric, descending.
+    """
+    values = np.array([_number(row.get(metric)) for row in rows], dtype=float)
+    order = np.argsort(-values, kind='stable')
+    ranked = [rows[index] for index in order]
+
+    # A single leftover row is shown as itself rather than as 'Other'
+    if n <= 0 or len(rows) <= n + 1:
+        return ranked
+
+    rest = ranked[n:]
+    other = {key_field: OTHER_KEY}
+    if label_field and label_field != key_field:
+        other[label_field] = f"Other ({len(rest)})"
+
+    columns = [
+        column for column, value in rest[0].items()
+        if column not in other and column not in RATIO_COLUMNS and _is_number(value)
+    ]
+    sums = np.array([[_number(row.get(column)) for column in columns] for row in rest], dtype=float).sum(axis=0)
+    other.update({column: float(total) for column, total in zip(columns, sums)})
+
+    for column, (numerator, denominator, scale) in RATIO_COLUMNS.items():
+        if column in rest[0]:
+            if other.get(numerator) is not None and other.get(denominator):
+                other[column] = round(other[numerator] / other[denominator] * scale, 2)
+            else:
+                other[column] = None
+
+    return ranked[:n] + [other]
+
+
+def lttb(values, threshold):
+    """Return the indices LTTB keeps to draw values with `threshold` points
+
+    values is a (points, series) array of equally spaced samples; the triangle
+    areas of all series are added up, so a spike in any series is kept.
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    # Points between the first and last are split into threshold - 2 buckets
+    edges = np.linspace(1, count - 1, threshold - 1).astype(int)
+    x = np.arange(count, dtype=float)
+    values = np.nan_to_num(values)
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, count - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # The next bucket's centroid (the last point for the final bucket)
+        if bucket + 2 < len(edges):
+            next_x = x[end:edges[bucket + 2]].mean()
+            next_y = values[end:edges[bucket + 2]].mean(axis=0)
+        else:
+            next_x, next_y = x[-1], values[-1]
+
+        areas = np.abs(
+            (x[previous] - next_x) * (values[start:end] - values[previous])
+            - (x[previous] - x[start:end, None]) * (next_y - values[previous])
+        ).sum(axis=1)
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+
+    return kept
+
+
+def downsample(rows, x_field, metrics, points):
+    """Sort rows by x_field and keep at most `points` of them with LTTB"""
+    rows = sorted(rows, key=lambda row: row[x_field])
+    if points is None or len(rows) <= points:
+        return rows
+
+    values = [[_number(row.get(metric)) for metric in metrics] for row in rows]
+    return [rows[index] for index in lttb(values, points)]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _number(value):
+    return float(value) if _is_number(value) else 0.0
@@ -0,0 +1,127 @@
+import csv
+import io
+import re
+
+# Rows per Parquet row group / CSV chunk
+EXPORT_CHUNK_ROWS = 50000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+_GA4_NAME_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9_:]*$')
+
+
+def validate_ga4_names(names, kind):
+    """Reject GA4 dimension/metric names that can't be valid API names"""
+    if not names:
+        raise ValueError(f"At least one {kind} is required")
+    for name in names:
+        if not _GA4_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid GA4 {kind}: {name}")
+    return names
+
+
+def rebatch(batches, size=EXPORT_CHUNK_ROWS):
+    """Regroup an iterable of row lists into lists of about size rows
+
+    At most one output chunk (plus one input batch) is held at a time.
+    """
+    chunk = []
+    for batch in batches:
+        chunk.extend(batch)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_csv(batches, columns):
+    """Yield UTF-8 encoded CSV text, one chunk per batch, header first"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+
+    writer.writeheader()
+    yield buffer.getvalue().encode('utf-8')
+
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def write_csv(batches, columns, sink):
+    """Write batches as CSV to a binary file object, returning the row count"""
+    rows = 0
+
+    def counted():
+        nonlocal rows
+        for batch in batches:
+            rows += len(batch)
+            yield batch
+
+    for chunk in iter_csv(counted(), columns):
+        sink.write(chunk)
+    return rows
+
+
+def write_parquet(batches, columns, numeric_columns, sink):
+    """Write batches to Parquet, one row group per batch, returning the row count
+
+    numeric_columns are stored as float64 and everything else as strings, so
+    every row group shares one schema. sink is a path or binary file object.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise Exception("Parquet export requires the pyarrow package")
+
+    schema = pa.schema([
+        (column, pa.float64() if column in numeric_columns else pa.string())
+        for column in columns
+    ])
+
+    rows = 0
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        for batch in batches:
+            arrays = [
+                pa.array(
+                    [row.get(column) if column in numeric_columns else _as_text(row.get(column)) for row in batch],
+                    type=schema.field(column).type
+                )
+                for column in columns
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def _as_text(value):
+    return None if value is None else str(value)
+
+
+def ga4_export(ga4, dimensions, metrics, start_date, end_date):
+    """Return (batches, columns, numeric columns) for a paginated GA4 report export"""
+    validate_ga4_names(dimensions, 'dimension')
+    validate_ga4_names(metrics, 'metric')
+
+    batches = ga4.iter_report(dimensions, metrics, start_date, end_date)
+    return batches, dimensions + metrics, set(metrics)
+
+
+def ads_export(google_ads, resource, fields, segments, start_date, end_date):
+    """Return (batches, columns, numeric columns) for a streamed Google Ads export"""
+    from app.analytics.google_ads import GaqlQuery, column_name, resolve_fields
+
+    query = GaqlQuery(resource, resolve_fields(resource, fields) if fields else None)
+    if segments:
+        query.segment(*segments)
+    query.during(start_date, end_date)
+
+    columns = [column_name(field) for field in query.fields]
+    numeric_columns = {column_name(field) for field in query.fields if field.startswith('metrics.')}
+    return google_ads.iter_search(query), columns, numeric_columns
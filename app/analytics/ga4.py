@@ -1,15 +1,44 @@
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import RunReportRequest, DateRange
+from google.analytics.data_v1beta.types import RunRealtimeReportRequest, MinuteRange
 from google.analytics.data_v1beta.types import Dimension, Metric
+from google.api_core.exceptions import NotFound, PermissionDenied
 from datetime import datetime, timedelta
 
 class GA4Analytics:
     """Google Analytics 4 (GA4) API integration"""
     
-    def __init__(self, credentials, property_id):
-        """Initialize with OAuth credentials and GA4 property ID"""
+    def __init__(self, credentials, property_id, quota=None):
+        """Initialize with OAuth credentials and GA4 property ID
+        
+        quota, if given, is called before every API request (it raises when
+        the budget is spent).
+        """
         self.client = BetaAnalyticsDataClient(credentials=credentials)
         self.property_id = property_id
+        self.quota = quota
+    
+    def run_report(self, request):
+        """Run a RunReportRequest, charging the quota"""
+        if self.quota is not None:
+            self.quota()
+        return self.client.run_report(request)
+    
+    def check_access(self):
+        """Return whether the credentials can read this property, using a one-row report"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        request = RunReportRequest(
+            property=f'properties/{self.property_id}',
+            metrics=[Metric(name="sessions")],
+            date_ranges=[DateRange(start_date=today, end_date=today)],
+            limit=1
+        )
+        
+        try:
+            self.run_report(request)
+        except (PermissionDenied, NotFound):
+            return False
+        return True
     
     def get_active_users(self, days=30):
         """Get active users data for the specified number of days"""
@@ -39,7 +68,7 @@ class GA4Analytics:
             date_ranges=date_ranges
         )
         
-        response = self.client.run_report(request)
+        response = self.run_report(request)
         
         # Format the response data
         return self._format_response(response)
@@ -72,11 +101,71 @@ class GA4Analytics:
             date_ranges=date_ranges
         )
         
-        response = self.client.run_report(request)
+        response = self.run_report(request)
         
         # Format the response data
         return self._format_response(response)
     
+    def get_realtime(self, dimensions=None, metrics=None, minutes=30):
+        """Get realtime data for the last `minutes` minutes (at most 30)
+        
+        With no dimensions this returns a single row of totals, e.g. the users
+        active right now.
+        """
+        # Build and run the request
+        request = RunRealtimeReportRequest(
+            property=f'properties/{self.property_id}',
+            dimensions=[Dimension(name=name) for name in dimensions or []],
+            metrics=[Metric(name=name) for name in metrics or ['activeUsers']],
+            minute_ranges=[
+                MinuteRange(
+                    start_minutes_ago=min(max(minutes, 1), 30) - 1,
+                    end_minutes_ago=0
+                )
+            ]
+        )
+        
+        if self.quota is not None:
+            self.quota()
+        response = self.client.run_realtime_report(request)
+        
+        # Format the response data
+        return self._format_response(response)
+    
+    def iter_report(self, dimensions, metrics, start_date, end_date, page_size=100000):
+        """Yield a report page by page as lists of formatted rows
+        
+        Pages are requested with limit/offset, so only one page is held in
+        memory at a time however large the report is.
+        """
+        offset = 0
+        
+        while True:
+            request = RunReportRequest(
+                property=f'properties/{self.property_id}',
+                dimensions=[Dimension(name=name) for name in dimensions],
+                metrics=[Metric(name=name) for name in metrics],
+                date_ranges=[
+                    DateRange(
+                        start_date=start_date,
+                        end_date=end_date
+                    )
+                ],
+                limit=page_size,
+                offset=offset
+            )
+            
+            response = self.run_report(request)
+            rows = self._format_response(response)
+            if not rows:
+                return
+            
+            yield rows
+            
+            offset += len(rows)
+            if offset >= response.row_count:
+                return
+    
     def _format_response(self, response):
         """Format the API response into a JSON-friendly structure"""
         formatted_data = []
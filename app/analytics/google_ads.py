@@ -1,27 +1,374 @@
 from google.ads.googleads.client import GoogleAdsClient
 from google.ads.googleads.errors import GoogleAdsException
 from datetime import datetime, timedelta
+import copy
 import os
+import re
+import time
 import logging
 import json
 import requests
-from google.auth.transport.requests import Request
+from app.analytics.cache import ResultCache, get_shared_cache
+from app.analytics.changes import settled_before
+from app.analytics.circuit import CircuitBreaker, order_backends
+from app.auth.vault import CredentialRefreshError, refresh_credentials
+
+# Google Ads REST API version used for the fallback backend
+API_VERSION = "v19"
+
+# Query results are cached per customer by normalized GAQL text, so repeated
+# dashboard loads don't hit the Google Ads API again. The shared tier makes a
+# result fetched by one gunicorn worker available to the others.
+QUERY_CACHE_TTL = int(os.getenv('ADS_QUERY_CACHE_TTL', 900))
+_query_cache = ResultCache(ttl=QUERY_CACHE_TTL, max_entries=512, shared=get_shared_cache(), pool='ads-queries')
+
+# Seconds before a GRPC call is abandoned, so an outage can't stall requests
+GRPC_TIMEOUT = float(os.getenv('ADS_GRPC_TIMEOUT', 30))
+# Deadline for a whole search_stream, which carries exports and large reports
+GRPC_STREAM_TIMEOUT = float(os.getenv('ADS_GRPC_STREAM_TIMEOUT', 600))
+REST_TIMEOUT = float(os.getenv('ADS_REST_TIMEOUT', 60))
+
+# Process-wide circuit breakers, in order of preference. They outlive the
+# per-request GoogleAdsAnalytics instances so failures are remembered.
+BREAKER_OPEN_SECONDS = int(os.getenv('ADS_BREAKER_OPEN_SECONDS', 60))
+_breakers = {
+    'grpc': CircuitBreaker('grpc', open_seconds=BREAKER_OPEN_SECONDS),
+    'rest': CircuitBreaker('rest', open_seconds=BREAKER_OPEN_SECONDS)
+}
+
+# Metric fields used by every resource's default projection
+DEFAULT_METRICS = [
+    'metrics.impressions',
+    'metrics.clicks',
+    'metrics.cost_micros',
+    'metrics.conversions',
+    'metrics.conversions_value',
+    'metrics.ctr',
+    'metrics.average_cpc'
+]
+
+# Resources supported by the GAQL builder. 'key' fields are always selected so
+# decoded rows can be identified; 'fields' is the default projection.
+GAQL_RESOURCES = {
+    'campaign': {
+        'key': ['campaign.id'],
+        'fields': ['campaign.name', 'campaign.status'] + DEFAULT_METRICS
+    },
+    'ad_group': {
+        'key': ['campaign.id', 'ad_group.id'],
+        'fields': ['ad_group.name', 'ad_group.status'] + DEFAULT_METRICS
+    },
+    'keyword_view': {
+        'key': ['campaign.id', 'ad_group.id', 'ad_group_criterion.criterion_id'],
+        'fields': [
+            'ad_group_criterion.keyword.text',
+            'ad_group_criterion.keyword.match_type',
+            'ad_group_criterion.status'
+        ] + DEFAULT_METRICS
+    },
+    'search_term_view': {
+        'key': ['campaign.id', 'ad_group.id', 'search_term_view.search_term'],
+        'fields': ['search_term_view.status'] + DEFAULT_METRICS
+    },
+    'customer': {
+        'key': ['customer.id'],
+        'fields': DEFAULT_METRICS
+    },
+    'customer_client': {
+        'key': ['customer_client.id'],
+        'fields': ['customer_client.descriptive_name', 'customer_client.manager', 'customer_client.level']
+    },
+    'change_status': {
+        'key': ['change_status.resource_name'],
+        'fields': [
+            'change_status.last_change_date_time',
+            'change_status.resource_type',
+            'change_status.resource_status',
+            'change_status.campaign',
+            'change_status.ad_group'
+        ]
+    }
+}
+
+# Drill-down levels below a campaign: (resource, field identifying the parent)
+DRILLDOWN_LEVELS = {
+    'ad_groups': ('ad_group', 'campaign.id'),
+    'keywords': ('keyword_view', 'ad_group.id')
+}
+
+# Cached settled results are patched by refetching the changed campaigns
+# when at most this many changed; beyond that the whole query is refetched
+PATCH_MAX_CAMPAIGNS = 50
+
+# Metrics summed per search term; any of them can rank the top terms
+SEARCH_TERM_METRICS = ['metrics.impressions', 'metrics.clicks', 'metrics.cost_micros', 'metrics.conversions']
+
+# Output column names that don't follow the default naming rule
+FIELD_COLUMNS = {
+    'metrics.conversions_value': 'conversion_value',
+    'ad_group_criterion.criterion_id': 'keyword_id',
+    'ad_group_criterion.keyword.text': 'keyword_text',
+    'ad_group_criterion.keyword.match_type': 'keyword_match_type',
+    'ad_group_criterion.status': 'keyword_status',
+    'search_term_view.search_term': 'search_term',
+    'search_term_view.status': 'search_term_status'
+}
+
+# Money fields reported in micros that don't carry a _micros suffix
+MICROS_FIELDS = {
+    'metrics.average_cpc',
+    'metrics.average_cpm',
+    'metrics.average_cost',
+    'metrics.cost_per_conversion'
+}
+
+# Ratio fields reported as fractions and returned as percentages
+PERCENT_FIELDS = {'metrics.ctr'}
+
+GAQL_OPERATORS = {'=', '!=', '>', '>=', '<', '<=', 'IN', 'NOT IN', 'LIKE', 'NOT LIKE'}
+
+_FIELD_PATTERN = re.compile(r'^[a-z_]+(\.[a-z0-9_]+)+$')
+
+
+class AdsRequestError(Exception):
+    """Error reported by the Google Ads API for a request it received
+
+    Unlike transport failures, these don't count against a backend's circuit breaker.
+    """
+
+
+def backend_stats():
+    """Return circuit breaker state for each Google Ads backend"""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+
+def query_cache_stats():
+    """Return Google Ads query cache counters"""
+    return _query_cache.stats()
+
+
+def _validate_field(field):
+    """Reject anything that isn't a plain dotted GAQL field name"""
+    if not _FIELD_PATTERN.match(field):
+        raise ValueError(f"Invalid GAQL field: {field}")
+    return field
+
+
+def _format_value(value):
+    """Format a Python value as a GAQL literal"""
+    if isinstance(value, (list, tuple, set)):
+        return '(' + ', '.join(_format_value(item) for item in value) + ')'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float)):
+        return str(value)
+    escaped = str(value).replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def column_name(field):
+    """Map a GAQL field to the column name used in decoded rows"""
+    if field in FIELD_COLUMNS:
+        return FIELD_COLUMNS[field]
+
+    prefix, _, rest = field.partition('.')
+    if prefix in ('metrics', 'segments'):
+        # metrics.cost_micros -> cost, segments.date -> date
+        return rest[:-len('_micros')] if rest.endswith('_micros') else rest
+    return field.replace('.', '_')
+
+
+def resolve_fields(resource, names):
+    """Resolve requested column names or GAQL fields to GAQL fields for a resource"""
+    if resource not in GAQL_RESOURCES:
+        raise ValueError(f"Unsupported GAQL resource: {resource}")
+
+    spec = GAQL_RESOURCES[resource]
+    known = {column_name(field): field for field in spec['key'] + spec['fields']}
+
+    fields = []
+    for name in names:
+        name = name.strip()
+        if not name:
+            continue
+        if '.' in name:
+            fields.append(_validate_field(name))
+        elif name in known:
+            fields.append(known[name])
+        else:
+            raise ValueError(f"Unknown field '{name}' for {resource}")
+    return fields
+
+
+def normalize_query(query):
+    """Collapse whitespace so equivalent GAQL strings share a cache key"""
+    return ' '.join(query.split())
+
+
+def parse_select_fields(query):
+    """Extract the selected field list from GAQL text"""
+    match = re.search(r'SELECT\s+(.*?)\s+FROM\s', query, re.IGNORECASE | re.DOTALL)
+    if not match:
+        raise ValueError("GAQL query has no SELECT ... FROM clause")
+    return [field.strip() for field in match.group(1).split(',') if field.strip()]
+
+
+class GaqlQuery:
+    """Small builder for Google Ads Query Language (GAQL) statements"""
+
+    def __init__(self, resource, fields=None):
+        """Start a query against a supported resource, optionally with a field projection"""
+        if resource not in GAQL_RESOURCES:
+            raise ValueError(f"Unsupported GAQL resource: {resource}")
+
+        self.resource = resource
+        spec = GAQL_RESOURCES[resource]
+        self.fields = list(spec['key'])
+        self.conditions = []
+        self.ordering = []
+        self.row_limit = None
+        self.select(*(fields if fields else spec['fields']))
+
+    def select(self, *fields):
+        """Add fields to the projection (duplicates are ignored)"""
+        for field in fields:
+            _validate_field(field)
+            if field not in self.fields:
+                self.fields.append(field)
+        return self
+
+    def segment(self, *segments):
+        """Segment rows by the given segments.* fields, e.g. 'date' or 'device'"""
+        return self.select(*(s if s.startswith('segments.') else f'segments.{s}' for s in segments))
+
+    def where(self, field, operator, value):
+        """Add a filter condition; conditions are combined with AND"""
+        operator = operator.upper()
+        if operator not in GAQL_OPERATORS:
+            raise ValueError(f"Unsupported GAQL operator: {operator}")
+        self.conditions.append(f"{_validate_field(field)} {operator} {_format_value(value)}")
+        return self
+
+    def during(self, start_date, end_date):
+        """Restrict the query to a date range (inclusive)"""
+        self.conditions.append(
+            f"segments.date BETWEEN '{start_date.strftime('%Y-%m-%d')}' AND '{end_date.strftime('%Y-%m-%d')}'"
+        )
+        return self
+
+    def order_by(self, field, descending=True):
+        """Order by a selected field"""
+        if field not in self.fields:
+            raise ValueError(f"Cannot order by unselected field: {field}")
+        self.ordering.append(f"{field} {'DESC' if descending else 'ASC'}")
+        return self
+
+    def limit(self, count):
+        """Limit the number of returned rows"""
+        self.row_limit = int(count)
+        return self
+
+    def build(self):
+        """Return normalized GAQL text (sorted fields and conditions)"""
+        query = f"SELECT {', '.join(sorted(self.fields))} FROM {self.resource}"
+        if self.conditions:
+            query += ' WHERE ' + ' AND '.join(sorted(self.conditions))
+        if self.ordering:
+            query += ' ORDER BY ' + ', '.join(self.ordering)
+        if self.row_limit is not None:
+            query += f' LIMIT {self.row_limit}'
+        return query
+
+    def __str__(self):
+        return self.build()
+
+
+def _camel_case(name):
+    """Convert a snake_case proto field name to the REST API's camelCase"""
+    head, *tail = name.split('_')
+    return head + ''.join(part.capitalize() for part in tail)
+
+
+def _read_field(row, field):
+    """Read a dotted field from a gRPC row object or a REST JSON result"""
+    value = row
+    for part in field.split('.'):
+        if value is None:
+            return None
+        if isinstance(value, dict):
+            value = value.get(_camel_case(part))
+        else:
+            value = getattr(value, part, None)
+    return value
+
+
+def decode_row(row, fields):
+    """Decode a gRPC or REST result row into a flat dict of output columns"""
+    decoded = {}
+    for field in fields:
+        value = _read_field(row, field)
+
+        if field.startswith('metrics.'):
+            # REST returns int64 metrics as strings; normalize both backends to floats
+            value = float(value or 0)
+            if field.endswith('_micros') or field in MICROS_FIELDS:
+                value = value / 1000000  # Convert micros to standard currency
+            elif field in PERCENT_FIELDS:
+                value = value * 100  # Convert to percentage
+        elif field.endswith('.id') or field.endswith('_id'):
+            # gRPC returns int64 IDs as ints and REST as strings
+            value = str(value) if value is not None else None
+        elif isinstance(value, int) and hasattr(value, 'name'):
+            # gRPC enums; REST already returns enum names
+            value = value.name
+
+        decoded[column_name(field)] = value
+    return decoded
+
+
+def drilldown_query(level, parent_id, start_date, end_date, fields=None):
+    """Build the query listing a campaign's ad groups or an ad group's keywords
+
+    Rows are ordered by impressions so the first page holds the biggest ones.
+    """
+    if level not in DRILLDOWN_LEVELS:
+        raise ValueError(f"Unknown drill-down level: {level}")
+    resource, parent_field = DRILLDOWN_LEVELS[level]
+
+    query = GaqlQuery(resource, resolve_fields(resource, fields) if fields else None)
+    query.where(parent_field, '=', int(parent_id))
+    query.during(start_date, end_date)
+    if 'metrics.impressions' in query.fields:
+        query.order_by('metrics.impressions')
+    return query
+
 
 class GoogleAdsAnalytics:
     """Google Ads API integration with REST API fallback"""
     
-    def __init__(self, credentials, customer_id, developer_token):
-        """Initialize with OAuth credentials and Google Ads account info"""
-        # Check if customer_id matches the MCC ID format
-        # If it matches the old incorrect ID, use the MCC ID instead
-        if str(customer_id).strip() == "8437927403":
-            customer_id = "5686645688"  # AllerVie MCC ID
-            logging.warning(f"Replaced incorrect customer ID with MCC ID: {customer_id}")
-            
+    def __init__(self, credentials, customer_id, developer_token, login_customer_id=None,
+                 query_cache=None, quota=None, changes=None):
+        """Initialize with OAuth credentials and Google Ads account info
+
+        login_customer_id is the manager (MCC) account used to access a client
+        account; it defaults to customer_id. query_cache replaces the
+        process-wide query cache and quota, if given, is called before every
+        upstream request (it raises when the budget is spent). changes is the
+        account's ChangeTracker; with it, cached results are versioned by the
+        account's edits and settled date ranges are cached for long.
+        """
+        self.query_cache = query_cache or _query_cache
+        self.quota = quota
+        self.changes = changes
+        
         # Ensure customer_id is properly formatted (no dashes or other formatting)
         self.customer_id = str(customer_id).replace('-', '').strip().replace('"', '').replace("'", "")
         logging.info(f"Using Google Ads customer_id: {self.customer_id}")
         
+        self.login_customer_id = (
+            str(login_customer_id).replace('-', '').strip() if login_customer_id else self.customer_id
+        )
+        
         self.developer_token = developer_token
         self.credentials = credentials
         
@@ -29,11 +376,11 @@ class GoogleAdsAnalytics:
         if self.credentials.expired and self.credentials.refresh_token:
             logging.info("Refreshing expired OAuth credentials")
             try:
-                self.credentials.refresh(Request())
+                refresh_credentials(self.credentials)
                 logging.info("Successfully refreshed OAuth credentials")
-            except Exception as e:
+            except CredentialRefreshError as e:
                 logging.error(f"Failed to refresh OAuth credentials: {str(e)}")
-                raise Exception(f"OAuth token refresh failed: {str(e)}")
+                raise
         
         # Verify token is valid
         if not self.credentials.token:
@@ -50,25 +397,34 @@ class GoogleAdsAnalytics:
             raise Exception("Missing required Google Ads API permissions. Please log out and log in again.")
             
         # Path to the YAML configuration file
-        yaml_path = os.path.join(os.getcwd(), "google-ads.yaml")
-        logging.info(f"YAML configuration path: {yaml_path}")
+        self._yaml_path = os.path.join(os.getcwd(), "google-ads.yaml")
+        logging.info(f"YAML configuration path: {self._yaml_path}")
         
         # Set configuration file path
-        os.environ["GOOGLE_ADS_CONFIGURATION_FILE_PATH"] = yaml_path
+        os.environ["GOOGLE_ADS_CONFIGURATION_FILE_PATH"] = self._yaml_path
         
         # Create or update the YAML configuration
-        self._update_yaml_config(yaml_path)
+        self._update_yaml_config(self._yaml_path)
         
-        # Try to create Google Ads Client
+        # Skip building a GRPC client while its circuit is open; it is built
+        # once the circuit lets requests through again (see _available_backends)
+        self.client = None
+        if _breakers['grpc'].is_open():
+            logging.info("GRPC circuit is open, using REST API for Google Ads")
+            return
+        self._build_grpc_client()
+    
+    def _build_grpc_client(self):
+        """Try to create the Google Ads GRPC client, recording a failure on its circuit"""
         try:
             # Create Google Ads Client from the YAML file
-            self.client = GoogleAdsClient.load_from_storage(yaml_path)
-            self.use_rest_fallback = False
+            self._update_yaml_config(self._yaml_path)
+            self.client = GoogleAdsClient.load_from_storage(self._yaml_path)
             logging.info("Successfully initialized Google Ads GRPC client")
         except Exception as e:
             logging.error(f"Failed to create Google Ads GRPC client: {str(e)}")
             logging.info("Will use REST API fallback for Google Ads")
-            self.use_rest_fallback = True
+            _breakers['grpc'].record_failure(0.0)
     
     def _update_yaml_config(self, yaml_path):
         """Create or update the YAML configuration file with the latest credentials"""
@@ -78,7 +434,7 @@ class GoogleAdsAnalytics:
 developer_token: {self.developer_token}
 
 # Required for manager accounts only: Specify the login customer ID used to authenticate API calls.
-login_customer_id: {self.customer_id}
+login_customer_id: {self.login_customer_id}
 
 # Required for manager accounts only: Specify the linked customer ID.
 linked_customer_id: {self.customer_id}
@@ -101,243 +457,463 @@ refresh_token: {self.credentials.refresh_token}
         
         logging.info(f"Updated YAML configuration file at {yaml_path}")
     
-    def get_campaign_performance(self, days=30):
-        """Get campaign performance data for the specified number of days"""
-        try:
-            # First try using the GRPC client
-            if not self.use_rest_fallback:
-                return self._get_campaign_performance_grpc(days)
-        except Exception as e:
-            logging.warning(f"GRPC client failed, falling back to REST API: {str(e)}")
-            self.use_rest_fallback = True
-        
-        # If GRPC fails or is disabled, use REST API fallback
-        return self._get_campaign_performance_rest(days)
-    
-    def _get_campaign_performance_grpc(self, days=30):
-        """Get campaign performance data using GRPC client"""
-        ga_service = self.client.get_service("GoogleAdsService")
-        
+    def get_campaign_performance(self, days=30, fields=None, refresh=False):
+        """Get campaign performance data for the specified number of days
+
+        fields optionally limits the returned columns (column names such as
+        'clicks' or GAQL fields such as 'metrics.clicks'). refresh bypasses
+        the query cache and stores the fresh result.
+        """
         # Calculate date range for query
         end_date = datetime.now().date()
         start_date = end_date - timedelta(days=days)
-        
-        # Format dates for GAQL query
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
-        
-        # Build GAQL query
-        query = f"""
-            SELECT
-                campaign.id,
-                campaign.name,
-                campaign.status,
-                metrics.impressions,
-                metrics.clicks,
-                metrics.cost_micros,
-                metrics.conversions,
-                metrics.conversions_value,
-                metrics.ctr,
-                metrics.average_cpc
-            FROM campaign
-            WHERE segments.date BETWEEN '{start_date_str}' AND '{end_date_str}'
-            ORDER BY metrics.impressions DESC
+
+        query = GaqlQuery('campaign', resolve_fields('campaign', fields) if fields else None)
+        query.during(start_date, end_date)
+        if 'metrics.impressions' in query.fields:
+            query.order_by('metrics.impressions')
+
+        return self.search(query, refresh=refresh)
+
+    def get_campaign_daily(self, start_date, end_date, fields=None):
+        """Get campaign metrics segmented by day (one row per campaign and date)
+
+        While changes are tracked, settled days are queried separately from
+        recent ones, so they stay cached and only recent days are refetched.
         """
-        
+        settled_end = settled_before() - timedelta(days=1)
+        if self.changes is not None and self.changes.state() is not None and start_date <= settled_end < end_date:
+            return (
+                self.get_campaign_daily(start_date, settled_end, fields)
+                + self.get_campaign_daily(settled_end + timedelta(days=1), end_date, fields)
+            )
+
+        query = GaqlQuery('campaign', resolve_fields('campaign', fields) if fields else None)
+        query.segment('date')
+        query.during(start_date, end_date)
+
+        return self.search(query)
+
+    def get_top_search_terms(self, days=30, metric='cost', k=25):
+        """Get the k search terms with the largest metric, plus an 'Other' remainder
+
+        Rows are streamed through a bounded top-K summary (see topk.TopK), so
+        memory depends on k, not on the number of search terms. Returns
+        (rows, summary stats).
+        """
+        from app.analytics.topk import TopK, capacity_for
+
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=days)
+
+        query = GaqlQuery('search_term_view', SEARCH_TERM_METRICS)
+        query.during(start_date, end_date)
+
+        summary = TopK(metric, [column_name(field) for field in SEARCH_TERM_METRICS], capacity_for(k))
+        for batch in self.iter_search(query):
+            summary.update(batch, 'search_term')
+
+        return summary.top(k, 'search_term'), summary.stats()
+
+    def get_child_accounts(self):
+        """List the enabled client accounts directly under this manager (MCC) account"""
+        query = GaqlQuery('customer_client')
+        query.where('customer_client.level', '=', 1)
+        query.where('customer_client.status', '=', 'ENABLED')
+
+        return [
+            row for row in self.search(query)
+            if not row['customer_client_manager'] and row['customer_client_id'] != self.customer_id
+        ]
+
+    def for_customer(self, customer_id):
+        """Return an instance for a client account accessed through this account as manager"""
+        child = GoogleAdsAnalytics.__new__(GoogleAdsAnalytics)
+        child.__dict__.update(self.__dict__)
+        child.customer_id = str(customer_id).replace('-', '').strip()
+        # Changes are tracked for this account only
+        child.changes = None
+        return child
+
+    def search(self, query, refresh=False):
+        """Run a GAQL query and return decoded rows, cached by normalized query text
+
+        query may be a GaqlQuery or raw GAQL text. The returned rows are shared
+        with the cache and must not be modified. refresh skips the cache lookup.
+        With change tracking, the cache key carries the version of the data the
+        query covers, and settled date ranges are kept for ADS_SETTLED_CACHE_TTL.
+        """
+        query_text, fields = self._prepare_query(query)
+
+        version, ttl = self.changes.query_version(query_text) if self.changes is not None else ('', None)
+        if ttl and isinstance(query, GaqlQuery) and query.resource == 'campaign' and not query.ordering and query.row_limit is None:
+            return self._search_settled(query, query_text, fields, ttl, refresh)
+
+        cache_key = f"ads:{self.customer_id}:{version}:{query_text}" if version else f"ads:{self.customer_id}:{query_text}"
+        results = None if refresh else self.query_cache.get(cache_key)
+        if results is not None:
+            logging.info(f"Google Ads query cache hit for customer_id: {self.customer_id}")
+            return results
+
+        started = time.monotonic()
+        results = self._fetch(query_text, fields)
+
+        self.query_cache.set(cache_key, results, ttl, cost=time.monotonic() - started)
+        return results
+
+    def _search_settled(self, query, query_text, fields, ttl, refresh):
+        """Serve a settled campaign query, refetching only the campaigns changed since it was cached
+
+        Metrics of settled days don't change, so rows of unchanged campaigns
+        are reused as they are; changed campaigns are fetched again with a
+        campaign.id IN (...) filter and replace their old rows.
+        """
+        cache_key = f"ads:{self.customer_id}:settled:{query_text}"
+        entry = None if refresh else self.query_cache.get(cache_key)
+        changed = self.changes.changed_campaigns(entry['version']) if entry is not None else None
+        if changed is not None and not changed:
+            logging.info(f"Google Ads settled cache hit for customer_id: {self.customer_id}")
+            return entry['rows']
+
+        version = time.time()
+        started = time.monotonic()
+        if changed is not None and len(changed) <= PATCH_MAX_CAMPAIGNS:
+            logging.info(f"Refetching {len(changed)} changed campaigns for customer_id: {self.customer_id}")
+            patch = copy.deepcopy(query).where('campaign.id', 'IN', sorted(int(campaign_id) for campaign_id in changed))
+            patch_text, patch_fields = self._prepare_query(patch)
+            rows = [row for row in entry['rows'] if row['campaign_id'] not in changed] + self._fetch(patch_text, patch_fields)
+        else:
+            rows = self._fetch(query_text, fields)
+
+        self.query_cache.set(cache_key, {'version': version, 'rows': rows}, ttl, cost=time.monotonic() - started)
+        return rows
+
+    def _fetch(self, query_text, fields):
+        """Run a GAQL query upstream (charging the quota), on the healthiest backend"""
+        if self.quota is not None:
+            self.quota()
+
+        return self._run_with_breakers(
+            lambda backend: self._search_grpc(query_text, fields) if backend == 'grpc'
+            else self._search_rest(query_text, fields)
+        )
+
+    def check_access(self):
+        """Return whether the credentials can read this account, using an uncached one-row query"""
+        query = GaqlQuery('customer', ['customer.id']).limit(1)
+        try:
+            self._fetch(query.build(), query.fields)
+        except AdsRequestError:
+            return False
+        return True
+
+    def search_page(self, query, page_token=None, refresh=False):
+        """Run a GAQL query and return one page as (decoded rows, next page token or None)
+
+        Pages are cached individually by normalized query text and page token,
+        so only the pages a client actually opens are fetched. Google Ads page
+        tokens work with either backend. Page tokens expire, so pages keep the
+        normal TTL even for settled ranges.
+        """
+        query_text, fields = self._prepare_query(query)
+
+        version = self.changes.query_version(query_text)[0] if self.changes is not None else ''
+        cache_key = f"ads:{self.customer_id}:page:{version}:{page_token or ''}:{query_text}"
+        page = None if refresh else self.query_cache.get(cache_key)
+        if page is None:
+            if self.quota is not None:
+                self.quota()
+
+            rows, next_page_token = self._run_with_breakers(
+                lambda backend: self._page_grpc(query_text, fields, page_token) if backend == 'grpc'
+                else self._rest_page(query_text, fields, page_token)
+            )
+            page = {'rows': rows, 'next_page_token': next_page_token}
+            self.query_cache.set(cache_key, page)
+
+        return page['rows'], page['next_page_token']
+
+    def iter_search(self, query):
+        """Yield decoded rows of a GAQL query in batches, without caching or materializing them
+
+        Uses search_stream over GRPC or paged search over REST. The backend is
+        chosen by the circuit breakers; falling back to another backend is only
+        possible for transport failures before the first batch has been yielded.
+        """
+        query_text, fields = self._prepare_query(query)
+        last_error = None
+
+        if self.quota is not None:
+            self.quota()
+
+        for backend in order_backends(_breakers, self._available_backends()):
+            breaker = _breakers[backend]
+            if not breaker.allow_request():
+                continue
+
+            started = time.monotonic()
+            first_batch_latency = None
+            stream = self._stream_grpc(query_text, fields) if backend == 'grpc' else self._stream_rest(query_text, fields)
+            try:
+                for batch in stream:
+                    if first_batch_latency is None:
+                        first_batch_latency = time.monotonic() - started
+                    yield batch
+            except AdsRequestError:
+                # The backend answered; another one would reject the query too
+                breaker.record_success(time.monotonic() - started)
+                raise
+            except Exception as e:
+                breaker.record_failure(time.monotonic() - started)
+                if first_batch_latency is not None:
+                    raise
+                logging.warning(f"Google Ads {backend} stream failed: {str(e)}")
+                last_error = e
+                continue
+
+            # Judge backend speed by time to first batch, not by export size
+            breaker.record_success(first_batch_latency if first_batch_latency is not None else time.monotonic() - started)
+            return
+
+        if last_error is not None:
+            raise last_error
+        raise Exception("Google Ads API is temporarily unavailable (all backends failing). Please retry shortly.")
+
+    def _prepare_query(self, query):
+        """Return (normalized GAQL text, selected fields) for a GaqlQuery or GAQL text"""
+        if isinstance(query, GaqlQuery):
+            return query.build(), query.fields
+        query_text = normalize_query(query)
+        return query_text, parse_select_fields(query_text)
+
+    def _available_backends(self):
+        """Return the backends this instance can use, in order of preference
+
+        Pooled instances outlive an open GRPC circuit, so a client skipped at
+        construction is built here once the circuit is ready to be probed.
+        """
+        if self.client is None and not _breakers['grpc'].is_open():
+            self._build_grpc_client()
+        return ['grpc', 'rest'] if self.client is not None else ['rest']
+
+    def _run_with_breakers(self, call):
+        """Run call(backend) on the healthiest backend, falling back to the others
+
+        Transport failures and latency are recorded on the process-wide circuit
+        breakers; a backend with an open circuit is skipped until it is probed.
+        Requests Google rejects (AdsRequestError) are raised without fallback.
+        """
+        last_error = None
+
+        for backend in order_backends(_breakers, self._available_backends()):
+            breaker = _breakers[backend]
+            if not breaker.allow_request():
+                logging.info(f"Skipping Google Ads {backend} backend, circuit is {breaker.state}")
+                continue
+
+            started = time.monotonic()
+            try:
+                result = call(backend)
+            except AdsRequestError as e:
+                # The backend answered; the request itself was rejected, and
+                # would be by the other backends too
+                breaker.record_success(time.monotonic() - started)
+                logging.warning(f"Google Ads {backend} backend rejected the request: {str(e)}")
+                raise
+            except Exception as e:
+                breaker.record_failure(time.monotonic() - started)
+                logging.warning(f"Google Ads {backend} backend failed: {str(e)}")
+                last_error = e
+                continue
+
+            breaker.record_success(time.monotonic() - started)
+            return result
+
+        if last_error is not None:
+            raise last_error
+        raise Exception("Google Ads API is temporarily unavailable (all backends failing). Please retry shortly.")
+
+    def _search_grpc(self, query, fields):
+        """Run a GAQL query using the GRPC client"""
+        ga_service = self.client.get_service("GoogleAdsService")
+
         try:
             # Log the customer ID being used
             logging.info(f"Executing GRPC query for customer_id: {self.customer_id}")
-            
-            # Execute the query
+
+            # Execute the query (the client pages through results automatically)
             response = ga_service.search(
                 customer_id=self.customer_id,
-                query=query
+                query=query,
+                timeout=GRPC_TIMEOUT
             )
-            
-            # Process the results
-            results = []
-            for row in response:
-                campaign = row.campaign
-                metrics = row.metrics
-                
-                # Format the data
-                results.append({
-                    'campaign_id': campaign.id,
-                    'campaign_name': campaign.name,
-                    'campaign_status': campaign.status.name,
-                    'impressions': metrics.impressions,
-                    'clicks': metrics.clicks,
-                    'cost': metrics.cost_micros / 1000000,  # Convert micros to standard currency
-                    'conversions': metrics.conversions,
-                    'conversion_value': metrics.conversions_value,
-                    'ctr': metrics.ctr * 100,  # Convert to percentage
-                    'average_cpc': metrics.average_cpc / 1000000  # Convert micros to standard currency
-                })
-                
-            return results
-            
+
+            return [decode_row(row, fields) for row in response]
+
         except GoogleAdsException as ex:
-            # Handle Google Ads API errors
-            error_message = []
-            
-            for error in ex.failure.errors:
-                error_message.append(f"Error: {error.message}")
-                if error.location:
-                    for field_path_element in error.location.field_path_elements:
-                        error_message.append(f"\tOn field: {field_path_element.field_name}")
-                
-            raise Exception('\n'.join(error_message))
-    
-    def _get_campaign_performance_rest(self, days=30):
+            raise self._request_error(ex)
+
+    def _page_grpc(self, query, fields, page_token=None):
+        """Fetch one page of results using the GRPC client"""
+        ga_service = self.client.get_service("GoogleAdsService")
+
+        request = self.client.get_type("SearchGoogleAdsRequest")
+        request.customer_id = self.customer_id
+        request.query = query
+        if page_token:
+            request.page_token = page_token
+
+        try:
+            # The pager would follow page tokens; only take the first response
+            page = next(iter(ga_service.search(request=request, timeout=GRPC_TIMEOUT).pages))
+        except GoogleAdsException as ex:
+            raise self._request_error(ex)
+
+        return [decode_row(row, fields) for row in page.results], page.next_page_token or None
+
+    def _stream_grpc(self, query, fields):
+        """Yield decoded row batches from the GRPC search_stream method"""
+        ga_service = self.client.get_service("GoogleAdsService")
+
+        try:
+            logging.info(f"Executing GRPC search_stream for customer_id: {self.customer_id}")
+            stream = ga_service.search_stream(customer_id=self.customer_id, query=query, timeout=GRPC_STREAM_TIMEOUT)
+
+            for batch in stream:
+                yield [decode_row(row, fields) for row in batch.results]
+
+        except GoogleAdsException as ex:
+            raise self._request_error(ex)
+
+    def _request_error(self, ex):
+        """Convert a GoogleAdsException into an AdsRequestError with readable details"""
+        error_message = []
+
+        for error in ex.failure.errors:
+            error_message.append(f"Error: {error.message}")
+            if error.location:
+                for field_path_element in error.location.field_path_elements:
+                    error_message.append(f"\tOn field: {field_path_element.field_name}")
+
+        return AdsRequestError('\n'.join(error_message))
+
+    def _search_rest(self, query, fields):
         """Fallback implementation using Google Ads REST API"""
         logging.info("Using REST API for Google Ads")
-        
-        # Calculate date range
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days)
-        
-        # Format dates for query
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
-        
+
+        results = []
+        for page in self._stream_rest(query, fields):
+            results.extend(page)
+
+        # Log the success
+        logging.info("Successfully received response from Google Ads REST API")
+
+        if not results:
+            logging.warning("No data returned from Google Ads REST API")
+
+        return results
+
+    def _stream_rest(self, query, fields):
+        """Yield decoded row pages from the REST API, following page tokens"""
+        headers = self._rest_headers()
+        page_token = None
+
+        while True:
+            rows, page_token = self._rest_page(query, fields, page_token, headers)
+            yield rows
+            if not page_token:
+                return
+
+    def _rest_headers(self):
+        """Refresh the OAuth token if needed and build REST API request headers"""
         # Make sure the credentials are fresh
         if self.credentials.expired and self.credentials.refresh_token:
             logging.info("Refreshing expired OAuth credentials for REST API")
             try:
-                self.credentials.refresh(Request())
+                refresh_credentials(self.credentials)
                 logging.info("Successfully refreshed OAuth credentials for REST API")
-            except Exception as e:
+            except CredentialRefreshError as e:
                 logging.error(f"Failed to refresh OAuth credentials: {str(e)}")
-                raise Exception(f"OAuth token refresh failed for REST API: {str(e)}")
-        
+                raise
+
         # Double-check token validity
         if not self.credentials.token:
             logging.error("OAuth token is missing or empty for REST API call")
             raise Exception("OAuth token is missing for REST API call")
-        
-        # Prepare the Google Ads REST API request
-        api_version = "v19"  # Current version as of March 2025
-        
-        # Use correct endpoint format:
-        # https://googleads.googleapis.com/{version}/customers/{customer_id}/googleAds:search
-        base_url = f"https://googleads.googleapis.com/{api_version}/customers/{self.customer_id}/googleAds:search"
-        
-        # Log the URL being used
-        logging.info(f"Google Ads REST API URL: {base_url}")
-        
-        # Build the GAQL query
-        query = f"""
-            SELECT
-                campaign.id,
-                campaign.name,
-                campaign.status,
-                metrics.impressions,
-                metrics.clicks,
-                metrics.cost_micros,
-                metrics.conversions,
-                metrics.conversions_value,
-                metrics.ctr,
-                metrics.average_cpc
-            FROM campaign
-            WHERE segments.date BETWEEN '{start_date_str}' AND '{end_date_str}'
-            ORDER BY metrics.impressions DESC
-        """
-        
-        # Prepare the request data
-        request_data = {
-            "query": query
-        }
-        
+
         # Prepare the authorization header with token trimming to avoid malformation
         # This is critical for avoiding OAUTH_TOKEN_HEADER_INVALID errors
         token = self.credentials.token.strip()
-        
+
         headers = {
             "Authorization": f"Bearer {token}",
             "developer-token": self.developer_token.strip(),
             "Content-Type": "application/json"
         }
-        
+
         # Add login-customer-id header for manager accounts
-        headers["login-customer-id"] = self.customer_id
-        
+        headers["login-customer-id"] = self.login_customer_id
+
         # Log headers (without sensitive information)
         safe_headers = headers.copy()
         safe_headers["Authorization"] = f"Bearer {token[:3]}..." if len(token) > 3 else "Bearer [REDACTED]"
         safe_headers["developer-token"] = "[REDACTED]"
         logging.info(f"Request headers: {safe_headers}")
-        
+
+        return headers
+
+    def _rest_page(self, query, fields, page_token=None, headers=None):
+        """Fetch one page of results from the REST API
+
+        Returns (decoded rows, next page token or None).
+        """
+        headers = headers or self._rest_headers()
+
+        # Use correct endpoint format:
+        # https://googleads.googleapis.com/{version}/customers/{customer_id}/googleAds:search
+        base_url = f"https://googleads.googleapis.com/{API_VERSION}/customers/{self.customer_id}/googleAds:search"
+
+        # Log the URL being used
+        logging.info(f"Google Ads REST API URL: {base_url}")
+
+        request_data = {"query": query}
+        if page_token:
+            request_data["pageToken"] = page_token
+
         # Make the request
-        logging.info(f"Making REST API request to Google Ads")
         try:
-            response = requests.post(base_url, headers=headers, json=request_data)
-            
-            # Log the response status
-            logging.info(f"REST API response status: {response.status_code}")
-            
-            # Check if the request was successful
-            if response.status_code != 200:
-                # Log the response text for debugging
-                try:
-                    error_msg = f"Google Ads REST API request failed with status {response.status_code}: {response.text}"
-                    logging.error(error_msg)
-                    
-                    # Parse JSON response if possible
-                    error_data = json.loads(response.text)
-                    logging.error(f"Error details: {json.dumps(error_data, indent=2)}")
-                    
-                    if response.status_code == 401:
-                        error_msg = "Authentication error with Google Ads API. Please log out and log in again."
-                    
-                except json.JSONDecodeError:
-                    logging.error(f"Could not parse error response as JSON: {response.text}")
-                
-                raise Exception(error_msg)
-            
-            # Parse the response
-            response_data = response.json()
-            
-            # Log the success
-            logging.info("Successfully received response from Google Ads REST API")
-            
-            # Process the results
-            results = []
-            
-            if "results" in response_data:
-                for result in response_data["results"]:
-                    # Extract the data from the result
-                    campaign_id = result.get("campaign", {}).get("id")
-                    campaign_name = result.get("campaign", {}).get("name")
-                    campaign_status = result.get("campaign", {}).get("status")
-                    
-                    metrics = result.get("metrics", {})
-                    impressions = float(metrics.get("impressions", 0))
-                    clicks = float(metrics.get("clicks", 0))
-                    cost_micros = float(metrics.get("costMicros", 0))
-                    conversions = float(metrics.get("conversions", 0))
-                    conversions_value = float(metrics.get("conversionsValue", 0))
-                    ctr = float(metrics.get("ctr", 0)) * 100  # Convert to percentage
-                    average_cpc = float(metrics.get("averageCpc", 0)) / 1000000  # Convert micros to standard currency
-                    
-                    # Format the data
-                    results.append({
-                        'campaign_id': campaign_id,
-                        'campaign_name': campaign_name,
-                        'campaign_status': campaign_status,
-                        'impressions': impressions,
-                        'clicks': clicks,
-                        'cost': cost_micros / 1000000,  # Convert micros to standard currency
-                        'conversions': conversions,
-                        'conversion_value': conversions_value,
-                        'ctr': ctr,
-                        'average_cpc': average_cpc
-                    })
-            
-            if not results:
-                logging.warning("No campaign data returned from Google Ads REST API")
-                
-            return results
-            
+            response = requests.post(base_url, headers=headers, json=request_data, timeout=REST_TIMEOUT)
         except requests.exceptions.RequestException as e:
             logging.error(f"Request error: {str(e)}")
-            raise Exception(f"Network error connecting to Google Ads API: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Network error connecting to Google Ads API: {str(e)}")
+
+        # Log the response status
+        logging.info(f"REST API response status: {response.status_code}")
+
+        # Check if the request was successful
+        if response.status_code != 200:
+            # Log the response text for debugging
+            try:
+                error_msg = f"Google Ads REST API request failed with status {response.status_code}: {response.text}"
+                logging.error(error_msg)
+
+                # Parse JSON response if possible
+                error_data = json.loads(response.text)
+                logging.error(f"Error details: {json.dumps(error_data, indent=2)}")
+
+                if response.status_code == 401:
+                    error_msg = "Authentication error with Google Ads API. Please log out and log in again."
+
+            except json.JSONDecodeError:
+                logging.error(f"Could not parse error response as JSON: {response.text}")
+
+            # Client errors mean the API is up; rate limits and server errors don't
+            if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                raise AdsRequestError(error_msg)
+            raise Exception(error_msg)
+
+        # Parse the response
+        response_data = response.json()
+        rows = [decode_row(result, fields) for result in response_data.get("results", [])]
+
+        return rows, response_data.get("nextPageToken")
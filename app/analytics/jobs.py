@@ -0,0 +1,317 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.analytics.cache import RESULT_CACHE_DIR, SQLiteStore
+from app.analytics.memory import get_memory_accountant
+
+logger = logging.getLogger('allervie-analytics.jobs')
+
+# Report jobs run on a small thread pool in the worker that accepted them
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', 86400))
+
+# A running job whose worker hasn't reported for this long is considered lost
+HEARTBEAT_INTERVAL = 10
+HEARTBEAT_TIMEOUT = 60
+
+FINAL_STATUSES = ('succeeded', 'failed')
+
+# Rows kept in a running job's partial result; the full rows are only stored
+# once, as the result, so saving progress per page stays cheap
+JOB_PARTIAL_ROWS = int(os.getenv('JOB_PARTIAL_ROWS', 100))
+
+
+class JobStore(SQLiteStore):
+    """Job state, progress and (partial) results in a local SQLite database
+
+    Any gunicorn worker can answer a status poll for a job another worker runs.
+    """
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        'id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, owner TEXT, '
+        'status TEXT NOT NULL, progress REAL NOT NULL DEFAULT 0, message TEXT, '
+        'partial TEXT, result TEXT, error TEXT, pid INTEGER, '
+        'created_at REAL NOT NULL, updated_at REAL NOT NULL, heartbeat_at REAL)'
+    ]
+
+    def create(self, kind, params, owner):
+        """Insert a queued job and return its ID"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            'INSERT INTO jobs (id, kind, params, owner, status, pid, created_at, updated_at, heartbeat_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, json.dumps(params), owner, 'queued', os.getpid(), now, now, now)
+        )
+        return job_id
+
+    def update(self, job_id, **values):
+        """Update job columns; partial and result values are stored as JSON"""
+        for name in ('partial', 'result'):
+            if name in values:
+                values[name] = json.dumps(values[name])
+        values['updated_at'] = values['heartbeat_at'] = time.time()
+
+        assignments = ', '.join(f'{name} = ?' for name in values)
+        self._connect().execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*values.values(), job_id))
+
+    def heartbeat(self, job_ids):
+        """Mark jobs as still being worked on by this process"""
+        if job_ids:
+            placeholders = ', '.join('?' for _ in job_ids)
+            self._connect().execute(
+                f'UPDATE jobs SET heartbeat_at = ? WHERE id IN ({placeholders})',
+                (time.time(), *job_ids)
+            )
+
+    def get(self, job_id):
+        """Return a job as a dict, or None"""
+        cursor = self._connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        job = dict(zip([column[0] for column in cursor.description], row))
+        for name in ('params', 'partial', 'result'):
+            job[name] = json.loads(job[name]) if job[name] else None
+
+        # Jobs whose worker died (recycled, OOM-killed) never finish
+        if job['status'] not in FINAL_STATUSES and time.time() - job['heartbeat_at'] > HEARTBEAT_TIMEOUT:
+            self.update(job_id, status='failed', error='Job was interrupted by a worker restart. Please resubmit.')
+            return self.get(job_id)
+
+        return job
+
+    def purge(self, older_than):
+        """Delete jobs last updated more than older_than seconds ago"""
+        cursor = self._connect().execute('DELETE FROM jobs WHERE updated_at < ?', (time.time() - older_than,))
+        return cursor.rowcount
+
+
+class JobContext:
+    """Handed to job handlers to report progress and partial results"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+
+    def progress(self, fraction, message=None, partial=None):
+        """Record progress (0..1), a status message and optionally partial results"""
+        values = {'progress': min(max(fraction, 0.0), 1.0)}
+        if message is not None:
+            values['message'] = message
+        if partial is not None:
+            values['partial'] = partial
+        self.store.update(self.job_id, **values)
+
+
+class JobRunner:
+    """Process-local worker pool that runs report jobs outside request workers"""
+
+    def __init__(self, store, handlers, max_workers=JOB_WORKERS):
+        self.store = store
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self._executor = None
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        """Start the pool and heartbeat thread lazily (and again after a fork)"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._active = set()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='report-job')
+                threading.Thread(target=self._heartbeat_loop, daemon=True).start()
+
+    def submit(self, kind, params, owner, context):
+        """Queue a job and return its ID
+
+        context holds in-memory only values the handler needs (the tenant and
+        credentials); it is never written to the job store.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+
+        self._ensure_started()
+        self.store.purge(JOB_RETENTION)
+        job_id = self.store.create(kind, params, owner)
+
+        # Queued jobs get heartbeats too, so a busy pool doesn't look like a dead worker
+        with self._lock:
+            self._active.add(job_id)
+        self._executor.submit(self._run, job_id, kind, params, context)
+        logger.info(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def _run(self, job_id, kind, params, context):
+        self.store.update(job_id, status='running', pid=os.getpid())
+
+        try:
+            result = self.handlers[kind](JobContext(self.store, job_id), params, context)
+            with get_memory_accountant().in_flight(result):
+                self.store.update(job_id, status='succeeded', progress=1.0, result=result)
+            logger.info(f"Job {job_id} succeeded")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def _heartbeat_loop(self):
+        pid = os.getpid()
+        while pid == os.getpid():
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                active = list(self._active)
+            try:
+                self.store.heartbeat(active)
+            except Exception as e:
+                logger.warning(f"Job heartbeat failed: {str(e)}")
+
+    def wait(self, job_id, timeout, since=None):
+        """Long-poll: return the job once it changes after `since` or finishes, or at timeout"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job['status'] in FINAL_STATUSES:
+                return job
+            if since is not None and job['updated_at'] > since:
+                return job
+            if time.monotonic() >= deadline:
+                return job
+            time.sleep(0.5)
+
+
+def _date_range(params):
+    try:
+        days = int(params.get('days', 30))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid days: {params.get('days')}")
+    if days < 1:
+        raise ValueError("days must be at least 1")
+    end_date = datetime.now().date()
+    return end_date - timedelta(days=days), end_date
+
+
+def ga4_report_request(params):
+    """Return (dimensions, metrics, start date, end date) of a ga4_report job; ValueError if invalid"""
+    from app.analytics.export import validate_ga4_names
+
+    dimensions = validate_ga4_names(params.get('dimensions') or ['date'], 'dimension')
+    metrics = validate_ga4_names(params.get('metrics') or ['activeUsers'], 'metric')
+    return (dimensions, metrics, *_date_range(params))
+
+
+def ads_query_request(params):
+    """Return the GaqlQuery of an ads_query job; ValueError if invalid"""
+    from app.analytics.google_ads import GaqlQuery, resolve_fields
+
+    resource = params.get('resource', 'campaign')
+    fields = params.get('fields')
+    query = GaqlQuery(resource, resolve_fields(resource, fields) if fields else None)
+    if params.get('segments'):
+        query.segment(*params['segments'])
+    return query.during(*_date_range(params))
+
+
+def validate_job(kind, params):
+    """Raise ValueError for a job that could never run, so it's rejected before it is queued"""
+    if not isinstance(params, dict):
+        raise ValueError("Job params must be an object")
+    if kind in JOB_REQUESTS:
+        JOB_REQUESTS[kind](params)
+
+
+def partial_rows(rows):
+    """Partial result for rows fetched so far: their count and the first JOB_PARTIAL_ROWS"""
+    return {
+        'rows': len(rows),
+        'data': rows[:JOB_PARTIAL_ROWS]
+    }
+
+
+def run_ga4_report(job, params, context):
+    """Job handler: page through a GA4 report, reporting the row count and a preview as they arrive"""
+    dimensions, metrics, start_date, end_date = ga4_report_request(params)
+
+    ga4 = context['tenant'].ga4(context['credentials'])
+    rows = []
+    for page in ga4.iter_report(dimensions, metrics, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')):
+        rows.extend(page)
+        # Total row count isn't known up front, so progress stays indeterminate
+        job.progress(0.5, f"Fetched {len(rows)} rows", partial=partial_rows(rows))
+
+    return {'data': rows}
+
+
+def run_ads_query(job, params, context):
+    """Job handler: run a Google Ads report, optionally across every MCC client account
+
+    The accounts queried so far, the row count and a preview of the rows are
+    saved as a partial result after each client account.
+    """
+    query = ads_query_request(params)
+
+    google_ads = context['tenant'].google_ads(context['credentials'])
+
+    if not params.get('include_children'):
+        job.progress(0.1, f"Querying account {google_ads.customer_id}")
+        return {'data': list(google_ads.search(query))}
+
+    children = google_ads.get_child_accounts()
+    job.progress(0.05, f"Found {len(children)} client accounts")
+
+    rows = []
+    completed = []
+    for index, child in enumerate(children, start=1):
+        customer_id = child['customer_client_id']
+        for row in google_ads.for_customer(customer_id).search(query):
+            rows.append(dict(row, customer_id=customer_id))
+        completed.append(customer_id)
+        job.progress(
+            index / len(children),
+            f"Queried {index} of {len(children)} client accounts",
+            partial=dict(partial_rows(rows), customers=completed)
+        )
+
+    return {'data': rows, 'customers': completed}
+
+
+JOB_HANDLERS = {
+    'ga4_report': run_ga4_report,
+    'ads_query': run_ads_query
+}
+
+# Builds each job kind's request from its params, raising ValueError when invalid
+JOB_REQUESTS = {
+    'ga4_report': ga4_report_request,
+    'ads_query': ads_query_request
+}
+
+# Google product each job kind reads (see Tenant.authorize)
+JOB_PRODUCTS = {
+    'ga4_report': 'ga4',
+    'ads_query': 'ads'
+}
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """Return the process-wide job runner"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(JobStore(os.path.join(RESULT_CACHE_DIR, 'jobs.sqlite3')), JOB_HANDLERS)
+        return _runner
@@ -0,0 +1,277 @@
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('allervie-analytics.live')
+
+# How often open dashboards are refreshed from the upstream APIs
+LIVE_REFRESH_INTERVAL = int(os.getenv('LIVE_REFRESH_INTERVAL', 60))
+
+# Events queued for a slow client before it is disconnected
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Request threads per worker that streams and job long-polls may hold at once;
+# the rest stay free for short requests and health checks (see gunicorn.conf.py)
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 8))
+LONG_REQUEST_SLOTS = int(os.getenv('LONG_REQUEST_SLOTS', max(GUNICORN_THREADS // 2, 1)))
+
+# Row key per live report, used to diff consecutive snapshots
+TOPIC_KEYS = {
+    'active-users': 'date',
+    'traffic-sources': 'sessionSource',
+    'campaigns': 'campaign_id'
+}
+
+# Google product each topic's data comes from (see Tenant.authorize)
+TOPIC_PRODUCTS = {
+    'active-users': 'ga4',
+    'traffic-sources': 'ga4',
+    'campaigns': 'ads'
+}
+
+CAMPAIGN_FIELDS = ['campaign_name', 'impressions', 'clicks', 'conversions']
+
+# Rows pushed per topic, matching the dashboard charts: the top N by a metric
+# plus an 'Other' row, or at most TOPIC_POINTS points of a daily series
+TOPIC_TOP = {
+    'traffic-sources': ('sessions', 8),
+    'campaigns': ('impressions', 10)
+}
+TOPIC_POINTS = 120
+
+
+def fetch_topic(kind, days, context):
+    """Fetch the current rows of a live report from the upstream API, shaped for its chart"""
+    from app.analytics.downsample import downsample, top_n
+
+    tenant = context['tenant']
+    if kind == 'campaigns':
+        google_ads = tenant.google_ads(context['credentials'])
+        rows = list(google_ads.get_campaign_performance(days, CAMPAIGN_FIELDS, refresh=True))
+        return top_n(rows, *TOPIC_TOP[kind], 'campaign_id', 'campaign_name')
+
+    ga4 = tenant.ga4(context['credentials'])
+    if kind == 'active-users':
+        return downsample(ga4.get_active_users(days), 'date', ['activeUsers', 'newUsers'], TOPIC_POINTS)
+    return top_n(ga4.get_traffic_sources(days), *TOPIC_TOP[kind], 'sessionSource')
+
+
+def diff_rows(old, new):
+    """Return (changed or added rows, removed keys) between two {key: row} snapshots"""
+    upsert = [row for key, row in new.items() if old.get(key) != row]
+    remove = [key for key in old if key not in new]
+    return upsert, remove
+
+
+class Subscription:
+    """One connected client: the topics it follows and its pending events"""
+
+    def __init__(self, topics):
+        self.topics = topics
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.closed = False
+
+    def push(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # The client stopped reading; it reconnects and starts from a snapshot
+            self.closed = True
+
+    def get(self, timeout):
+        """Return the next event, or None after timeout seconds"""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class RequestSlots:
+    """Per-worker cap on requests that hold a thread for long (streams, long-polls)"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a slot; returns False when all of them are in use"""
+        with self._lock:
+            if self.in_use >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_use += 1
+            return True
+
+    def release(self):
+        """Give back a slot taken with acquire()"""
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        """Return slot usage for a metrics endpoint"""
+        with self._lock:
+            return {
+                'in_use': self.in_use,
+                'limit': self.limit,
+                'rejected': self.rejected
+            }
+
+
+class LiveTopic:
+    """A live report (tenant, kind, days) with its latest snapshot and subscribers"""
+
+    def __init__(self, tenant, kind, days):
+        self.tenant = tenant
+        self.kind = kind
+        self.days = days
+        self.key_field = TOPIC_KEYS[kind]
+        self.subscribers = set()
+        self.context = None
+        self.rows = None
+        self.version = None
+
+    @property
+    def name(self):
+        return f"{self.tenant.name}:{self.kind}:{self.days}"
+
+    def snapshot_event(self):
+        return {'topic': self.kind, 'days': self.days, 'snapshot': list(self.rows.values())}
+
+
+class LiveHub:
+    """Process-wide fan-out of live report updates to SSE clients
+
+    One background thread per worker refreshes every topic that has
+    subscribers. Across workers, a lease in the shared cache lets only one of
+    them call the upstream API per interval; the others pick its snapshot up
+    from the shared cache. Each worker diffs the snapshot against the last one
+    it saw and pushes only the changed rows to its clients.
+    """
+
+    def __init__(self, interval=LIVE_REFRESH_INTERVAL):
+        self.interval = interval
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._wakeup = threading.Event()
+
+    def _ensure_started(self):
+        """Start the refresh thread lazily (and again after a fork)"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._topics = {}
+            threading.Thread(target=self._refresh_loop, daemon=True).start()
+
+    def subscribe(self, kinds, days, context):
+        """Register a client for the given report kinds and return its Subscription
+
+        context holds the tenant and credentials used to refresh the topics;
+        the most recent subscriber's context is used.
+        """
+        tenant = context['tenant']
+        subscription = Subscription([])
+        with self._lock:
+            self._ensure_started()
+            for kind in kinds:
+                key = (tenant.name, kind, days)
+                topic = self._topics.get(key)
+                if topic is None:
+                    topic = self._topics[key] = LiveTopic(tenant, kind, days)
+                topic.subscribers.add(subscription)
+                topic.context = context
+                subscription.topics.append(topic)
+
+                # Bring the client up to date with what this worker already knows
+                if topic.rows is not None:
+                    subscription.push(topic.snapshot_event())
+
+        self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a client, dropping topics nobody follows any more"""
+        with self._lock:
+            for topic in subscription.topics:
+                topic.subscribers.discard(subscription)
+                if not topic.subscribers:
+                    self._topics.pop((topic.tenant.name, topic.kind, topic.days), None)
+
+    def stats(self):
+        """Return topic and subscriber counts for a metrics endpoint"""
+        with self._lock:
+            return {
+                'topics': sorted(topic.name for topic in self._topics.values()),
+                'subscribers': len({id(sub) for topic in self._topics.values() for sub in topic.subscribers})
+            }
+
+    def _refresh_loop(self):
+        pid = os.getpid()
+        while pid == os.getpid():
+            with self._lock:
+                topics = [topic for topic in self._topics.values() if topic.subscribers]
+            for topic in topics:
+                try:
+                    self.refresh(topic)
+                except Exception as e:
+                    logger.warning(f"Live refresh of {topic.name} failed: {str(e)}")
+
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def refresh(self, topic):
+        """Bring a topic up to date and push the changes to its subscribers"""
+        def fetch():
+            rows = fetch_topic(topic.kind, topic.days, topic.context)
+            logger.info(f"Refreshed live {topic.name} ({len(rows)} rows)")
+            return rows
+
+        # Only one worker per interval calls the upstream API
+        snapshot_key = f"live:{topic.kind}:{topic.days}:{datetime.now().strftime('%Y-%m-%d')}"
+        snapshot = topic.tenant.cache.snapshot(snapshot_key, self.interval, fetch)
+
+        if snapshot is None or snapshot['fetched_at'] == topic.version:
+            return
+
+        rows = {str(row.get(topic.key_field)): row for row in snapshot['data']}
+        with self._lock:
+            if topic.rows is None:
+                topic.rows = rows
+                event = topic.snapshot_event()
+            else:
+                upsert, remove = diff_rows(topic.rows, rows)
+                topic.rows = rows
+                event = None
+                if upsert or remove:
+                    event = {'topic': topic.kind, 'days': topic.days, 'upsert': upsert, 'remove': remove}
+            topic.version = snapshot['fetched_at']
+
+            if event is not None:
+                for subscription in list(topic.subscribers):
+                    subscription.push(event)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+_slots = None
+
+
+def get_live_hub():
+    """Return the process-wide live update hub"""
+    global _hub
+    with _hub_lock:
+        if _hub is None:
+            _hub = LiveHub()
+        return _hub
+
+
+def get_request_slots():
+    """Return this worker's slots for long-lived requests"""
+    global _slots
+    with _hub_lock:
+        if _slots is None:
+            _slots = RequestSlots(LONG_REQUEST_SLOTS)
+        return _slots
@@ -0,0 +1,204 @@
+"""Per-process memory accounting for cached and in-flight report data.
+
+Report rows are lists of small dicts, several times larger in memory than
+as JSON, and every gunicorn worker holds its own. The accountant estimates
+the size of what the in-process caches hold and of report payloads being
+built, against this worker's share of MEMORY_BUDGET_BYTES. Past the budget,
+cached entries are evicted in order of least benefit per byte: how long
+they took to fetch, how often they were hit and how recently, over their
+size. Evicted and oversized entries remain in the shared SQLite tier on
+local disk, so they are spilled rather than lost.
+"""
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('allervie-analytics.memory')
+
+# Bytes of report data all workers of a container may hold, split evenly
+# between the WEB_CONCURRENCY workers
+MEMORY_BUDGET_BYTES = int(os.getenv('MEMORY_BUDGET_BYTES', 512 * 1024 * 1024))
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 4))
+
+# Cached values at least this large are only kept in the shared tier on disk
+# (0 keeps every value in memory)
+MEMORY_SPILL_BYTES = int(os.getenv('MEMORY_SPILL_BYTES', 8 * 1024 * 1024))
+
+# Items measured per container when estimating sizes; the rest is extrapolated
+SIZE_SAMPLE = 32
+MAX_SIZE_DEPTH = 6
+
+
+def estimate_size(value, _depth=0):
+    """Estimate the memory a JSON-like value holds, in bytes
+
+    Containers are measured from a sample of their items, so the cost is
+    bounded however many rows a report has.
+    """
+    size = sys.getsizeof(value)
+    if _depth >= MAX_SIZE_DEPTH:
+        return size
+
+    if isinstance(value, dict):
+        # Row keys are column names shared by every row, so only values count
+        items = list(itertools.islice(value.values(), SIZE_SAMPLE))
+        sampled = sum(estimate_size(item, _depth + 1) for item in items)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(itertools.islice(value, SIZE_SAMPLE))
+        sampled = sum(estimate_size(item, _depth + 1) for item in items)
+    else:
+        return size
+
+    return size + (sampled * len(value) // len(items) if items else 0)
+
+
+class MemoryAccountant:
+    """Tracks cached entries and in-flight payloads against a byte budget
+
+    Caches register a pool with a callback that drops an entry; the
+    accountant picks the victims and calls back outside its own lock, so
+    pools must not hold their lock while calling enforce().
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.evictions = 0
+        self.spills = 0
+        self.over_budget = 0
+        self._pools = {}
+        self._entries = {}
+        self._in_flight = {}
+        self._cached_bytes = 0
+        self._in_flight_bytes = 0
+        self._tokens = itertools.count()
+        self._lock = threading.Lock()
+
+    def register(self, pool, discard):
+        """Register a cache pool; discard(key) must drop the entry and call release()"""
+        self._pools[pool] = discard
+
+    def admit(self, pool, key, size, cost=None):
+        """Account a cached entry of size bytes that took cost seconds to produce
+
+        Call enforce() afterwards, without holding the pool's lock.
+        """
+        with self._lock:
+            previous = self._entries.pop((pool, key), None)
+            if previous is not None:
+                self._cached_bytes -= previous['size']
+            self._entries[(pool, key)] = {'size': size, 'cost': cost or 1.0, 'hits': 0, 'used_at': time.monotonic()}
+            self._cached_bytes += size
+
+    def touch(self, pool, key):
+        """Record a hit on a cached entry"""
+        with self._lock:
+            entry = self._entries.get((pool, key))
+            if entry is not None:
+                entry['hits'] += 1
+                entry['used_at'] = time.monotonic()
+
+    def release(self, pool, key):
+        """Forget a cached entry the pool dropped"""
+        with self._lock:
+            entry = self._entries.pop((pool, key), None)
+            if entry is not None:
+                self._cached_bytes -= entry['size']
+
+    def spilled(self):
+        """Count a value kept on disk only"""
+        with self._lock:
+            self.spills += 1
+
+    @contextmanager
+    def in_flight(self, value):
+        """Account a payload being built or serialized for as long as the block runs"""
+        size = estimate_size(value)
+        token = next(self._tokens)
+        with self._lock:
+            self._in_flight[token] = size
+            self._in_flight_bytes += size
+        self.enforce()
+        try:
+            yield size
+        finally:
+            with self._lock:
+                self._in_flight_bytes -= self._in_flight.pop(token)
+
+    def _victims(self):
+        """Pick cached entries to drop until usage fits the budget, least benefit per byte first"""
+        now = time.monotonic()
+        with self._lock:
+            excess = self._cached_bytes + self._in_flight_bytes - self.budget
+            if excess <= 0:
+                return []
+
+            def benefit(item):
+                entry = item[1]
+                return entry['cost'] * (entry['hits'] + 1) / (entry['size'] * (now - entry['used_at'] + 1.0))
+
+            victims = []
+            for (pool, key), entry in sorted(self._entries.items(), key=benefit):
+                if excess <= 0:
+                    break
+                victims.append((pool, key))
+                excess -= entry['size']
+
+            if excess > 0:
+                # In-flight payloads alone exceed the budget; nothing more to evict
+                self.over_budget += 1
+            return victims
+
+    def enforce(self):
+        """Evict cached entries until usage fits the budget again"""
+        victims = self._victims()
+        for pool, key in victims:
+            self._pools[pool](key)
+        if victims:
+            with self._lock:
+                self.evictions += len(victims)
+            logger.info(f"Evicted {len(victims)} cached results to stay within the memory budget")
+
+    def stats(self):
+        """Return usage for a metrics endpoint"""
+        with self._lock:
+            pools = {}
+            for (pool, _), entry in self._entries.items():
+                pools[pool] = pools.get(pool, 0) + entry['size']
+            return {
+                'budget_bytes': self.budget,
+                'cached_bytes': self._cached_bytes,
+                'in_flight_bytes': self._in_flight_bytes,
+                'cached_entries': len(self._entries),
+                'in_flight': len(self._in_flight),
+                'pools': pools,
+                'evictions': self.evictions,
+                'spills': self.spills,
+                'over_budget': self.over_budget,
+                'rss_bytes': _rss_bytes()
+            }
+
+
+def _rss_bytes():
+    """Resident memory of this process, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_accountant = None
+_accountant_lock = threading.Lock()
+
+
+def get_memory_accountant():
+    """Return this process's accountant, with its share of the container budget"""
+    global _accountant
+    with _accountant_lock:
+        if _accountant is None:
+            _accountant = MemoryAccountant(MEMORY_BUDGET_BYTES // max(WEB_CONCURRENCY, 1))
+        return _accountant
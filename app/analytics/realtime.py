@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger('allervie-analytics.realtime')
+
+# Seconds between realtime polls, and how many snapshots each poller keeps
+REALTIME_POLL_INTERVAL = int(os.getenv('REALTIME_POLL_INTERVAL', 10))
+REALTIME_HISTORY = int(os.getenv('REALTIME_HISTORY', 360))
+
+# A poller nobody has read from for this long stops calling GA4
+REALTIME_IDLE_SECONDS = 120
+
+
+class RealtimePoller:
+    """Shared GA4 realtime poller for one tenant's property
+
+    Every client reads the latest snapshot from memory; the upstream call rate
+    is fixed by the poll interval however many clients watch. Across workers,
+    the shared cache makes sure only one of them calls GA4 per interval. The
+    poller stops after REALTIME_IDLE_SECONDS without readers and restarts on
+    the next read.
+    """
+
+    def __init__(self, tenant, interval=REALTIME_POLL_INTERVAL, history=REALTIME_HISTORY):
+        """Initialize with the tenant, poll interval (seconds) and ring buffer size"""
+        self.tenant = tenant
+        self.property_id = tenant.ga4_property_id
+        self.interval = interval
+        self.snapshots = deque(maxlen=history)
+        self.credentials = None
+        self.polls = 0
+        self.errors = 0
+        self._last_read = 0.0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+
+    def read(self, credentials, wait=None):
+        """Return the latest snapshot, starting the poller if it isn't running
+
+        The first read after a (re)start waits up to `wait` seconds (default:
+        one interval) for the first snapshot; it returns None if none arrives.
+        """
+        with self._lock:
+            self.credentials = credentials
+            self._last_read = time.monotonic()
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._poll_loop, daemon=True)
+                self._thread.start()
+
+            if not self.snapshots:
+                self._updated.wait(self.interval if wait is None else wait)
+            return self.snapshots[-1] if self.snapshots else None
+
+    def history(self, since=None):
+        """Return buffered snapshots, oldest first, optionally only those after `since`"""
+        with self._lock:
+            return [snapshot for snapshot in self.snapshots if since is None or snapshot['fetched_at'] > since]
+
+    def _fetch(self):
+        self.polls += 1
+        return self.tenant.ga4(self.credentials).get_realtime()
+
+    def _poll_loop(self):
+        pid = os.getpid()
+        while pid == os.getpid():
+            if time.monotonic() - self._last_read > REALTIME_IDLE_SECONDS:
+                logger.info(f"Stopping idle realtime poller for property {self.property_id}")
+                return
+
+            try:
+                snapshot = self.tenant.cache.snapshot(f"realtime:{self.property_id}", self.interval, self._fetch)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Realtime poll for property {self.property_id} failed: {str(e)}")
+                snapshot = None
+
+            with self._lock:
+                if snapshot is not None and (not self.snapshots or snapshot['fetched_at'] > self.snapshots[-1]['fetched_at']):
+                    self.snapshots.append(snapshot)
+                    self._updated.notify_all()
+
+            time.sleep(self.interval / 2)
+
+    def stats(self):
+        """Return poller state for a metrics endpoint"""
+        with self._lock:
+            return {
+                'running': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+                'snapshots': len(self.snapshots),
+                'polls': self.polls,
+                'errors': self.errors,
+                'last_fetched_at': self.snapshots[-1]['fetched_at'] if self.snapshots else None
+            }
+
+
+_pollers = {}
+_pollers_lock = threading.Lock()
+
+
+def get_realtime_poller(tenant):
+    """Return the process-wide realtime poller for a tenant's GA4 property"""
+    with _pollers_lock:
+        if tenant.name not in _pollers:
+            _pollers[tenant.name] = RealtimePoller(tenant)
+        return _pollers[tenant.name]
+
+
+def realtime_stats():
+    """Return stats for every realtime poller in this worker"""
+    with _pollers_lock:
+        return {name: poller.stats() for name, poller in _pollers.items()}
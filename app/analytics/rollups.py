@@ -0,0 +1,359 @@
+"""Hourly GA4 and Google Ads series kept in tiered rollups.
+
+Series are stored per hour for recent days, per day for the last year or so
+and per week beyond that: as days age out of a tier, their rows are summed
+into the next coarser one. A query reads from the tier that fits its window
+and only fetches the days that tier is missing, so long hourly-capable
+charts cost a few daily requests instead of dateHour reports over months.
+
+Only additive metrics are stored (activeUsers isn't: users active in two
+hours would be counted twice in the day).
+"""
+import itertools
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from app.analytics.cache import RESULT_CACHE_DIR, RESULT_CACHE_TTL, SQLiteStore
+
+logger = logging.getLogger('allervie-analytics.rollups')
+
+# Days kept per hour and per day; older data is kept per week
+ROLLUP_HOURLY_DAYS = int(os.getenv('ROLLUP_HOURLY_DAYS', 14))
+ROLLUP_DAILY_DAYS = int(os.getenv('ROLLUP_DAILY_DAYS', 400))
+
+# The most recent days are still being processed upstream and are fetched
+# again once their stored copy is older than the result cache TTL
+ROLLUP_OPEN_DAYS = 3
+
+# Points the automatic granularity aims to stay under
+SERIES_MAX_POINTS = 240
+
+TIERS = ['hour', 'day', 'week']
+
+# Series: source and the (additive) metrics stored
+SERIES = {
+    'ga4-traffic': ('ga4', ['sessions', 'newUsers', 'screenPageViews']),
+    'ads-traffic': ('ads', ['impressions', 'clicks', 'cost', 'conversions'])
+}
+
+
+def week_start(day):
+    """Monday of the week containing day"""
+    return day - timedelta(days=day.weekday())
+
+
+def hourly_since():
+    """First day kept per hour"""
+    return date.today() - timedelta(days=ROLLUP_HOURLY_DAYS - 1)
+
+
+def daily_since():
+    """First day kept per day (always a Monday, so weeks are rolled up whole)"""
+    return week_start(date.today() - timedelta(days=ROLLUP_DAILY_DAYS - 1))
+
+
+def choose_tier(start_date, granularity='auto', max_points=SERIES_MAX_POINTS):
+    """Pick the tier to read a window starting at start_date from
+
+    'auto' picks the finest tier that stays within max_points; an explicit
+    granularity is coarsened when its tier no longer holds the start of
+    the window.
+    """
+    days = (date.today() - start_date).days + 1
+    available = ['week']
+    if start_date >= daily_since():
+        available.insert(0, 'day')
+    if start_date >= hourly_since():
+        available.insert(0, 'hour')
+
+    if granularity == 'auto':
+        points = {'hour': days * 24, 'day': days, 'week': days / 7}
+        return next((tier for tier in available if points[tier] <= max_points), 'week')
+
+    if granularity not in TIERS:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    return next(tier for tier in TIERS[TIERS.index(granularity):] if tier in available)
+
+
+class RollupStore(SQLiteStore):
+    """Series rows per (tier, bucket, metric) and which days each tier holds
+
+    Buckets are 'YYYY-MM-DD HH' (hour), 'YYYY-MM-DD' (day) or the Monday of
+    the week (week). A day is stored in exactly one tier; coverage rows are
+    per day for the hour and day tiers and per week for the week tier.
+    """
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS rollups ('
+        'series TEXT NOT NULL, tier TEXT NOT NULL, bucket TEXT NOT NULL, metric TEXT NOT NULL, value REAL NOT NULL, '
+        'PRIMARY KEY (series, tier, bucket, metric)) WITHOUT ROWID',
+        'CREATE TABLE IF NOT EXISTS rollup_coverage ('
+        'series TEXT NOT NULL, tier TEXT NOT NULL, day TEXT NOT NULL, fetched_at REAL NOT NULL, '
+        'PRIMARY KEY (series, tier, day)) WITHOUT ROWID'
+    ]
+
+    def coverage(self, series, start_date, end_date):
+        """Return {day: (tier, fetched_at)} for the days (or week Mondays) stored in the window"""
+        rows = self._connect().execute(
+            'SELECT day, tier, fetched_at FROM rollup_coverage WHERE series = ? AND day BETWEEN ? AND ?',
+            (series, week_start(start_date).isoformat(), end_date.isoformat())
+        ).fetchall()
+        return {day: (tier, fetched_at) for day, tier, fetched_at in rows}
+
+    def store(self, series, tier, days, rows):
+        """Replace what is stored for days (week Mondays for the week tier) with rows
+
+        rows is {bucket: {metric: value}}; days without rows are recorded as
+        empty, so they aren't fetched again.
+        """
+        if tier == 'week':
+            covered = [(monday + timedelta(days=offset)).isoformat() for monday in days for offset in range(7)]
+        else:
+            covered = [day.isoformat() for day in days]
+        now = time.time()
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # A day moves between tiers as a whole, so no day is counted twice
+            conn.executemany(
+                "DELETE FROM rollups WHERE series = ? AND tier IN ('hour', 'day') AND bucket >= ? AND bucket < ?",
+                [(series, day, f"{day}~") for day in covered]
+            )
+            conn.executemany(
+                "DELETE FROM rollup_coverage WHERE series = ? AND tier IN ('hour', 'day') AND day = ?",
+                [(series, day) for day in covered]
+            )
+            if tier == 'week':
+                conn.executemany(
+                    "DELETE FROM rollups WHERE series = ? AND tier = 'week' AND bucket = ?",
+                    [(series, monday.isoformat()) for monday in days]
+                )
+
+            conn.executemany(
+                'INSERT OR REPLACE INTO rollups (series, tier, bucket, metric, value) VALUES (?, ?, ?, ?, ?)',
+                [
+                    (series, tier, bucket, metric, value)
+                    for bucket, values in rows.items() for metric, value in values.items()
+                ]
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO rollup_coverage (series, tier, day, fetched_at) VALUES (?, ?, ?, ?)',
+                [(series, tier, day.isoformat(), now) for day in days]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def read(self, series, tier, start_date, end_date):
+        """Return {bucket: {metric: value}} at a tier's granularity, summing finer tiers"""
+        if tier == 'hour':
+            select, tiers = 'bucket', "('hour')"
+        elif tier == 'day':
+            select, tiers = 'substr(bucket, 1, 10)', "('hour', 'day')"
+        else:
+            select, tiers = "date(substr(bucket, 1, 10), 'weekday 0', '-6 days')", "('hour', 'day', 'week')"
+
+        rows = self._connect().execute(
+            f'SELECT {select} AS period, metric, SUM(value) FROM rollups '
+            f'WHERE series = ? AND tier IN {tiers} AND bucket >= ? AND bucket < ? GROUP BY period, metric',
+            (series, start_date.isoformat(), f"{end_date.isoformat()}~")
+        ).fetchall()
+
+        result = {}
+        for bucket, metric, value in rows:
+            result.setdefault(bucket, {})[metric] = value
+        return result
+
+    def compact(self, series):
+        """Roll hours older than the hourly tier into days, and days older than the daily tier into weeks"""
+        conn = self._connect()
+        hour_cutoff = hourly_since().isoformat()
+        day_cutoff = daily_since().isoformat()
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO rollups (series, tier, bucket, metric, value) "
+                "SELECT series, 'day', substr(bucket, 1, 10), metric, SUM(value) FROM rollups "
+                "WHERE series = ? AND tier = 'hour' AND bucket < ? GROUP BY substr(bucket, 1, 10), metric",
+                (series, hour_cutoff)
+            )
+            conn.execute("DELETE FROM rollups WHERE series = ? AND tier = 'hour' AND bucket < ?", (series, hour_cutoff))
+            conn.execute(
+                "UPDATE OR REPLACE rollup_coverage SET tier = 'day' WHERE series = ? AND tier = 'hour' AND day < ?",
+                (series, hour_cutoff)
+            )
+
+            # Only weeks with all seven days stored are rolled up; the days of
+            # other weeks are dropped and fetched as whole weeks when needed
+            weeks = [row[0] for row in conn.execute(
+                "SELECT date(day, 'weekday 0', '-6 days') AS week FROM rollup_coverage "
+                "WHERE series = ? AND tier = 'day' AND day < ? GROUP BY week HAVING COUNT(*) = 7",
+                (series, day_cutoff)
+            )]
+            for week in weeks:
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollups (series, tier, bucket, metric, value) "
+                    "SELECT series, 'week', ?, metric, SUM(value) FROM rollups "
+                    "WHERE series = ? AND tier = 'day' AND bucket >= ? AND bucket < date(?, '+7 days') GROUP BY metric",
+                    (week, series, week, week)
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO rollup_coverage (series, tier, day, fetched_at) "
+                    "SELECT series, 'week', ?, MIN(fetched_at) FROM rollup_coverage "
+                    "WHERE series = ? AND tier = 'day' AND day >= ? AND day < date(?, '+7 days')",
+                    (week, series, week, week)
+                )
+            conn.execute("DELETE FROM rollups WHERE series = ? AND tier = 'day' AND bucket < ?", (series, day_cutoff))
+            conn.execute("DELETE FROM rollup_coverage WHERE series = ? AND tier = 'day' AND day < ?", (series, day_cutoff))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def stats(self):
+        """Return stored rows per tier"""
+        return dict(self._connect().execute('SELECT tier, COUNT(*) FROM rollups GROUP BY tier').fetchall())
+
+
+_rollup_store = None
+_rollup_store_lock = threading.Lock()
+
+
+def get_rollup_store():
+    """Return the process-wide handle on the rollup database"""
+    global _rollup_store
+    with _rollup_store_lock:
+        if _rollup_store is None:
+            _rollup_store = RollupStore(os.path.join(RESULT_CACHE_DIR, 'rollups.sqlite3'))
+        return _rollup_store
+
+
+def series_key(tenant, name):
+    """Store key of a series for a tenant's GA4 property or Google Ads account"""
+    source = SERIES[name][0]
+    return f"ga4:{tenant.ga4_property_id}:{name}" if source == 'ga4' else f"ads:{tenant.ads_customer_id}:{name}"
+
+
+def load_series(tenant, credentials, name, start_date, tier):
+    """Return the series from start_date to today at a tier, as rows with a 'bucket' column
+
+    Days the tier is missing (or recent days gone stale) are fetched first:
+    per hour for the hour tier, per day otherwise. Empty buckets are zeros.
+    """
+    source, metrics = SERIES[name]
+    series = series_key(tenant, name)
+    store = get_rollup_store()
+    end_date = date.today()
+    if tier == 'week':
+        start_date = week_start(start_date)
+
+    store.compact(series)
+    coverage = store.coverage(series, start_date, end_date)
+
+    # Days fetched per day or hour, and (for the week tier) whole weeks before the daily tier
+    grain = 'hour' if tier == 'hour' else 'day'
+    first_daily = max(start_date, daily_since()) if tier == 'week' else start_date
+    missing_days = [
+        day for day in _days(first_daily, end_date)
+        if _needs_fetch(coverage.get(day.isoformat()), day, ('hour',) if grain == 'hour' else ('hour', 'day'))
+    ]
+    missing_weeks = [
+        monday for monday in _days(start_date, first_daily - timedelta(days=1))[::7]
+        if coverage.get(monday.isoformat(), (None,))[0] != 'week'
+    ] if tier == 'week' else []
+
+    for days in _runs(missing_days):
+        rows = fetch_rows(tenant, credentials, source, metrics, grain, days[0], days[-1])
+        store.store(series, grain, days, rows)
+    for weeks in _runs(missing_weeks, step=7):
+        rows = fetch_rows(tenant, credentials, source, metrics, 'day', weeks[0], weeks[-1] + timedelta(days=6))
+        store.store(series, 'week', weeks, _sum_by(rows, lambda bucket: week_start(_parse_day(bucket)).isoformat()))
+
+    stored = store.read(series, tier, start_date, end_date)
+    return [
+        {'bucket': bucket, **{metric: stored.get(bucket, {}).get(metric, 0.0) for metric in metrics}}
+        for bucket in _buckets(tier, start_date, end_date)
+    ]
+
+
+def fetch_rows(tenant, credentials, source, metrics, grain, start_date, end_date):
+    """Fetch a series from upstream as {bucket: {metric: value}} per hour or day
+
+    Results aren't cached elsewhere: the rollup store is their cache.
+    """
+    if source == 'ga4':
+        dimension = 'dateHour' if grain == 'hour' else 'date'
+        ga4 = tenant.ga4(credentials)
+        rows = itertools.chain.from_iterable(ga4.iter_report(
+            [dimension], metrics, start_date.isoformat(), end_date.isoformat()
+        ))
+        # GA4 formats these as YYYYMMDD and YYYYMMDDHH
+        return {
+            f"{row[dimension][:4]}-{row[dimension][4:6]}-{row[dimension][6:8]}"
+            + (f" {row[dimension][8:10]}" if grain == 'hour' else ''): {metric: row[metric] for metric in metrics}
+            for row in rows
+        }
+
+    from app.analytics.google_ads import GaqlQuery, resolve_fields
+
+    query = GaqlQuery('customer', resolve_fields('customer', metrics))
+    query.segment(*(['date', 'hour'] if grain == 'hour' else ['date']))
+    query.during(start_date, end_date)
+    rows = itertools.chain.from_iterable(tenant.google_ads(credentials).iter_search(query))
+    return _sum_by(
+        ({'bucket': row['date'] + (f" {int(row['hour']):02d}" if grain == 'hour' else ''), **row} for row in rows),
+        None, metrics
+    )
+
+
+def _sum_by(rows, key, metrics=None):
+    """Sum metric values of rows grouped by key(bucket); rows are {bucket: values} or dicts with 'bucket'"""
+    result = {}
+    items = rows.items() if isinstance(rows, dict) else ((row['bucket'], row) for row in rows)
+    for bucket, values in items:
+        target = result.setdefault(key(bucket) if key else bucket, {})
+        for metric in metrics or values:
+            target[metric] = target.get(metric, 0.0) + (values.get(metric) or 0.0)
+    return result
+
+
+def _needs_fetch(covered, day, tiers):
+    """Whether a day's stored copy is missing, in an unusable tier or stale"""
+    if covered is None or covered[0] not in tiers:
+        return True
+    is_open = day > date.today() - timedelta(days=ROLLUP_OPEN_DAYS)
+    return is_open and time.time() - covered[1] > RESULT_CACHE_TTL
+
+
+def _days(start_date, end_date):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def _runs(days, step=1):
+    """Split sorted days into runs of consecutive ones (step days apart)"""
+    runs = []
+    for day in days:
+        if runs and (day - runs[-1][-1]).days == step:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _parse_day(bucket):
+    return datetime.strptime(bucket[:10], '%Y-%m-%d').date()
+
+
+def _buckets(tier, start_date, end_date):
+    """Every bucket of a tier in the window, so gaps show as zeros"""
+    if tier == 'hour':
+        return [f"{day.isoformat()} {hour:02d}" for day in _days(start_date, end_date) for hour in range(24)]
+    if tier == 'day':
+        return [day.isoformat() for day in _days(start_date, end_date)]
+    return [day.isoformat() for day in _days(week_start(start_date), end_date)[::7]]
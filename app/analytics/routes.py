@@ -1,19 +1,45 @@
-from flask import Blueprint, jsonify, request, current_app, session, redirect, url_for
-from google.oauth2.credentials import Credentials
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
-from google.analytics.data_v1beta.types import RunReportRequest, DateRange, Dimension, Metric
+from flask import Blueprint, jsonify, request, current_app, session, redirect, url_for, g
 from datetime import datetime, timedelta
-from google.ads.googleads.client import GoogleAdsClient
-from google.ads.googleads.errors import GoogleAdsException
+from app import analytics as sdk
+from app.analytics.cache import get_shared_cache
+from app.analytics.memory import get_memory_accountant
+from app.analytics.tenants import QuotaExceededError, TenantAccessError, UnknownTenantError, get_tenant
+from app.analytics import export
+from app.analytics.cursors import InvalidCursorError, decode_cursor, encode_cursor
+from app.auth.vault import CredentialRefreshError, get_credential_vault
 import os
 import logging
 import traceback
 import sys
 import json
-from google.auth.transport.requests import Request
+import tempfile
+import itertools
+import time
 
 analytics_bp = Blueprint('analytics', __name__)
 
+# Server-Sent Events connection limits
+STREAM_MAX_SECONDS = int(os.getenv('STREAM_MAX_SECONDS', 600))
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_RETRY_MS = 5000
+
+# Seconds a client turned away for lack of stream slots should wait (Retry-After)
+STREAM_BUSY_RETRY_SECONDS = 30
+
+# Rows per drill-down page (?limit= may ask for up to the maximum)
+DRILLDOWN_PAGE_SIZE = int(os.getenv('ADS_DRILLDOWN_PAGE_SIZE', 50))
+DRILLDOWN_MAX_PAGE_SIZE = 500
+
+# Search terms returned by default and at most, and the metrics they can rank by
+SEARCH_TERMS_TOP = 25
+SEARCH_TERMS_MAX_TOP = 500
+SEARCH_TERM_SORTS = ('cost', 'clicks', 'conversions', 'impressions')
+
+# Campaign columns analysed by /anomalies?source=ads
+ANOMALY_ADS_FIELDS = ['campaign_name', 'cost', 'clicks', 'conversions']
+# Longest range /anomalies analyses (its history window adds warm-up days)
+ANOMALY_MAX_DAYS = 365
+
 # Configure logger for debugging
 logging.basicConfig(
     level=logging.DEBUG,  # Set to DEBUG for maximum info
@@ -22,64 +48,172 @@ logging.basicConfig(
 )
 logger = logging.getLogger('allervie-analytics')
 
-@analytics_bp.route('/active-users')
-def active_users():
-    """API endpoint to get active users data"""
+def get_session_credentials():
+    """Return the logged-in user's OAuth credentials from the vault, refreshing an expired token
+    
+    The session only holds the vault reference. Returns None when the user
+    isn't logged in (or their vault entry is gone). A token that can't be
+    refreshed raises CredentialRefreshError, which the blueprint answers
+    with 401, so call this outside of catch-all try blocks.
+    """
+    if 'credential_id' not in session:
+        return None
+    
+    return get_credential_vault(current_app).get(session['credential_id'])
+
+@analytics_bp.errorhandler(CredentialRefreshError)
+def credential_refresh_error(e):
+    """Answer requests whose expired token can't be refreshed with 401, so the dashboard asks for a new login"""
+    logger.warning(f"Error refreshing OAuth token: {str(e)}")
+    return jsonify({
+        'success': False,
+        'error': f"{str(e)}. Please log out and log in again.",
+        'login_url': url_for('auth.logout')
+    }), 401
+
+@analytics_bp.before_request
+def select_tenant():
+    """Resolve the tenant for this request from ?tenant= (the default tenant if absent)"""
     try:
-        # Check if user is authenticated
-        if 'credentials' not in session:
+        g.tenant = get_tenant(current_app, request.args.get('tenant'))
+    except UnknownTenantError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+
+
+def tenant_access_error(credentials, *products):
+    """Verify the user can read the tenant's data in products, returning an error response if not
+    
+    Must run before anything is served from the tenant's shared caches, which
+    are filled with other users' credentials.
+    """
+    try:
+        g.tenant.authorize(session['credential_id'], credentials, products)
+    except TenantAccessError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 403
+    except QuotaExceededError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 429
+    except Exception as e:
+        logger.error(f"Tenant access check error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Could not verify access to this data, please retry shortly'
+        }), 503
+    return None
+
+
+def cached_json_response(cache_key, producer, ttl=None):
+    """Serve a JSON payload from the tenant's result cache, producing it on a miss
+    
+    The cached bytes are written straight into the response, so a hit in any
+    worker costs no API call and no JSON re-encoding. Report data is shared by
+    every authenticated user of the tenant's property/account.
+    """
+    shared_cache = g.tenant.cache
+    body = shared_cache.get_bytes(cache_key)
+    
+    if body is None:
+        try:
+            payload = producer()
+        except QuotaExceededError as e:
             return jsonify({
                 'success': False,
-                'error': 'Not authenticated'
-            }), 401
-        
-        # Create credentials object
-        credentials = Credentials(**session['credentials'])
+                'error': str(e)
+            }), 429
+        # The payload and its encoding are both held until the response is built
+        with get_memory_accountant().in_flight(payload):
+            body = current_app.json.dumps(payload).encode('utf-8')
         
-        # Initialize GA4 client
-        client = BetaAnalyticsDataClient(credentials=credentials)
-        property_id = current_app.config['GA4_PROPERTY_ID']
+        # Only cache complete, successful payloads
+        if payload.get('success'):
+            shared_cache.set_bytes(cache_key, body, ttl)
+    
+    return current_app.response_class(body, mimetype='application/json')
+
+@analytics_bp.route('/active-users')
+def active_users():
+    """API endpoint to get active users data"""
+    # Check if user is authenticated
+    if 'credential_id' not in session:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    # Create credentials object, refreshing an expired token
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    access_error = tenant_access_error(credentials, 'ga4')
+    if access_error:
+        return access_error
+    
+    try:
+        property_id = g.tenant.ga4_property_id
         
         # Get requested time period
         days = request.args.get('days', default=30, type=int)
         
+        # Optional chart resolution: at most this many points, picked with LTTB
+        points = request.args.get('points', type=int)
+        
         # Calculate date range
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         end_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Define API request
-        ga_request = RunReportRequest(
-            property=f'properties/{property_id}',
-            dimensions=[Dimension(name="date")],
-            metrics=[
-                Metric(name="activeUsers"),
-                Metric(name="newUsers")
-            ],
-            date_ranges=[
-                DateRange(
-                    start_date=start_date,
-                    end_date=end_date
-                )
-            ]
-        )
-        
-        # Execute request
-        response = client.run_report(ga_request)
-        
-        # Format response data
-        data = []
-        for row in response.rows:
-            data_point = {
-                'date': row.dimension_values[0].value,
-                'activeUsers': float(row.metric_values[0].value),
-                'newUsers': float(row.metric_values[1].value)
+        def fetch():
+            from app.analytics.downsample import downsample
+            
+            # Get the tenant's pooled GA4 client
+            client = g.tenant.ga4(credentials)
+            
+            # Define API request
+            ga_request = sdk.RunReportRequest(
+                property=f'properties/{property_id}',
+                dimensions=[sdk.Dimension(name="date")],
+                metrics=[
+                    sdk.Metric(name="activeUsers"),
+                    sdk.Metric(name="newUsers")
+                ],
+                date_ranges=[
+                    sdk.DateRange(
+                        start_date=start_date,
+                        end_date=end_date
+                    )
+                ]
+            )
+            
+            # Execute request
+            response = client.run_report(ga_request)
+            
+            # Format response data
+            data = []
+            for row in response.rows:
+                data_point = {
+                    'date': row.dimension_values[0].value,
+                    'activeUsers': float(row.metric_values[0].value),
+                    'newUsers': float(row.metric_values[1].value)
+                }
+                data.append(data_point)
+            
+            return {
+                'success': True,
+                'data': downsample(data, 'date', ['activeUsers', 'newUsers'], points)
             }
-            data.append(data_point)
         
-        return jsonify({
-            'success': True,
-            'data': data
-        })
+        return cached_json_response(f"ga4:{property_id}:active-users:{start_date}:{end_date}:{points or ''}", fetch)
     except Exception as e:
         # Handle errors
         logger.error(f"Active users error: {str(e)}")
@@ -91,61 +225,79 @@ def active_users():
 @analytics_bp.route('/traffic-sources')
 def traffic_sources():
     """API endpoint to get traffic sources data"""
+    # Check if user is authenticated
+    if 'credential_id' not in session:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    # Create credentials object, refreshing an expired token
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    access_error = tenant_access_error(credentials, 'ga4')
+    if access_error:
+        return access_error
+    
     try:
-        # Check if user is authenticated
-        if 'credentials' not in session:
-            return jsonify({
-                'success': False,
-                'error': 'Not authenticated'
-            }), 401
-        
-        # Create credentials object
-        credentials = Credentials(**session['credentials'])
-        
-        # Initialize GA4 client
-        client = BetaAnalyticsDataClient(credentials=credentials)
-        property_id = current_app.config['GA4_PROPERTY_ID']
+        property_id = g.tenant.ga4_property_id
         
         # Get requested time period
         days = request.args.get('days', default=30, type=int)
         
+        # Optional top-N by sessions, with the remaining sources in one 'Other' row
+        top = request.args.get('top', type=int)
+        
         # Calculate date range
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         end_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Define API request
-        ga_request = RunReportRequest(
-            property=f'properties/{property_id}',
-            dimensions=[Dimension(name="sessionSource")],
-            metrics=[
-                Metric(name="sessions"),
-                Metric(name="activeUsers")
-            ],
-            date_ranges=[
-                DateRange(
-                    start_date=start_date,
-                    end_date=end_date
-                )
-            ]
-        )
-        
-        # Execute request
-        response = client.run_report(ga_request)
-        
-        # Format response data
-        data = []
-        for row in response.rows:
-            data_point = {
-                'sessionSource': row.dimension_values[0].value,
-                'sessions': float(row.metric_values[0].value),
-                'activeUsers': float(row.metric_values[1].value)
+        def fetch():
+            from app.analytics.downsample import top_n
+            
+            # Get the tenant's pooled GA4 client
+            client = g.tenant.ga4(credentials)
+            
+            # Define API request
+            ga_request = sdk.RunReportRequest(
+                property=f'properties/{property_id}',
+                dimensions=[sdk.Dimension(name="sessionSource")],
+                metrics=[
+                    sdk.Metric(name="sessions"),
+                    sdk.Metric(name="activeUsers")
+                ],
+                date_ranges=[
+                    sdk.DateRange(
+                        start_date=start_date,
+                        end_date=end_date
+                    )
+                ]
+            )
+            
+            # Execute request
+            response = client.run_report(ga_request)
+            
+            # Format response data
+            data = []
+            for row in response.rows:
+                data_point = {
+                    'sessionSource': row.dimension_values[0].value,
+                    'sessions': float(row.metric_values[0].value),
+                    'activeUsers': float(row.metric_values[1].value)
+                }
+                data.append(data_point)
+            
+            return {
+                'success': True,
+                'data': top_n(data, 'sessions', top, 'sessionSource') if top else data
             }
-            data.append(data_point)
         
-        return jsonify({
-            'success': True,
-            'data': data
-        })
+        return cached_json_response(f"ga4:{property_id}:traffic-sources:{start_date}:{end_date}:{top or ''}", fetch)
     except Exception as e:
         # Handle errors
         logger.error(f"Traffic sources error: {str(e)}")
@@ -159,7 +311,7 @@ def ads_campaigns():
     """API endpoint to get Google Ads campaign data"""
     try:
         # Check if user is authenticated
-        if 'credentials' not in session:
+        if 'credential_id' not in session:
             logger.error("User not authenticated for Google Ads API access")
             return jsonify({
                 'success': False,
@@ -173,93 +325,46 @@ def ads_campaigns():
         # Log the start of processing
         logger.info("Processing Google Ads campaign data request")
         
-        # Create credentials object from session
-        credentials_dict = session.get('credentials', {})
-        
-        # Log the credential info (without sensitive parts)
-        if credentials_dict:
-            scopes = credentials_dict.get('scopes', [])
-            has_refresh_token = 'refresh_token' in credentials_dict and bool(credentials_dict['refresh_token'])
-            has_token = 'token' in credentials_dict and bool(credentials_dict['token'])
-            
-            logger.info(f"Credentials scopes: {scopes}")
-            logger.info(f"Credentials have refresh_token: {has_refresh_token}")
-            logger.info(f"Credentials have token: {has_token}")
-            
-            # Check for required Google Ads API scope
-            if 'https://www.googleapis.com/auth/adwords' not in scopes:
-                logger.error("Missing required Google Ads API scope")
-                return jsonify({
-                    'success': False,
-                    'error': "Missing required Google Ads API permissions. Please log out and log in again.",
-                    'login_url': url_for('auth.logout') + "?next=" + url_for('auth.login')
-                }), 403
-        
-        # Validate required credential fields
-        required_fields = ['token', 'refresh_token', 'token_uri', 'client_id', 'client_secret', 'scopes']
-        missing_fields = [field for field in required_fields if field not in credentials_dict]
-        
-        if missing_fields:
-            logger.error(f"Missing credential fields: {missing_fields}")
+        # Get the user's credentials from the vault, refreshing an expired token
+        try:
+            credentials = get_session_credentials()
+        except Exception as refresh_error:
+            logger.error(f"Error refreshing OAuth token: {str(refresh_error)}")
+            logger.error(traceback.format_exc())
             return jsonify({
                 'success': False,
-                'error': f"Incomplete credentials. Missing fields: {', '.join(missing_fields)}. Please log out and log in again.",
-                'login_url': url_for('auth.logout') + "?next=" + url_for('auth.login')
-            }), 400
-        
-        # Create credentials object and refresh if needed
-        credentials = Credentials(**credentials_dict)
+                'error': f"Failed to refresh OAuth token: {str(refresh_error)}. Please log out and log in again.",
+                'login_url': url_for('auth.logout')
+            }), 401
         
-        # Check token validity
-        if not credentials.token:
-            logger.error("OAuth token is empty or invalid")
+        if credentials is None or not credentials.token:
+            logger.error("OAuth credentials are missing from the vault or invalid")
             return jsonify({
                 'success': False,
                 'error': "Invalid OAuth token. Please log out and log in again.",
-                'login_url': url_for('auth.logout') + "?next=" + url_for('auth.login')
+                'login_url': url_for('auth.logout')
             }), 401
         
-        # Check if token is expired and refresh it
-        token_refreshed = False
-        if credentials.expired and credentials.refresh_token:
-            logger.info("Refreshing expired OAuth token")
-            try:
-                credentials.refresh(Request())
-                token_refreshed = True
-                logger.info("Successfully refreshed OAuth token")
-                
-                # Update session with refreshed credentials
-                session['credentials'] = {
-                    'token': credentials.token,
-                    'refresh_token': credentials.refresh_token,
-                    'token_uri': credentials.token_uri,
-                    'client_id': credentials.client_id,
-                    'client_secret': credentials.client_secret,
-                    'scopes': credentials.scopes
-                }
-                logger.info("Updated session with refreshed credentials")
-            except Exception as refresh_error:
-                logger.error(f"Error refreshing OAuth token: {str(refresh_error)}")
-                logger.error(traceback.format_exc())
-                return jsonify({
-                    'success': False,
-                    'error': f"Failed to refresh OAuth token: {str(refresh_error)}. Please log out and log in again.",
-                    'login_url': url_for('auth.logout') + "?next=" + url_for('auth.login')
-                }), 401
-        
-        # Get Google Ads configuration
-        customer_id = current_app.config['GOOGLE_ADS_CUSTOMER_ID']
+        # Log the credential info (without sensitive parts)
+        scopes = credentials.scopes or []
+        logger.info(f"Credentials scopes: {scopes}")
+        logger.info(f"Credentials have refresh_token: {bool(credentials.refresh_token)}")
         
-        # Check if we're using the old incorrect ID and switch to the MCC ID
-        if str(customer_id).strip() == "8437927403":
-            customer_id = "5686645688"  # AllerVie MCC ID
-            logger.warning(f"Using MCC ID instead of client ID: {customer_id}")
+        # Check for required Google Ads API scope
+        if 'https://www.googleapis.com/auth/adwords' not in scopes:
+            logger.error("Missing required Google Ads API scope")
+            return jsonify({
+                'success': False,
+                'error': "Missing required Google Ads API permissions. Please log out and log in again.",
+                'login_url': url_for('auth.logout')
+            }), 403
         
-        # Format customer ID properly (remove quotes and other non-numeric characters)
-        customer_id = str(customer_id).replace('-', '').strip().replace('"', '').replace("'", "")
-        logger.info(f"Using Google Ads Customer ID: {customer_id}")
+        access_error = tenant_access_error(credentials, 'ads')
+        if access_error:
+            return access_error
         
-        developer_token = current_app.config['GOOGLE_ADS_DEVELOPER_TOKEN']
+        # Get the tenant's Google Ads account (known-bad IDs are already replaced)
+        customer_id = g.tenant.ads_customer_id
         
         # Log the access attempt (without sensitive info)
         logger.info(f"Accessing Google Ads API with customer_id: {customer_id}")
@@ -267,36 +372,69 @@ def ads_campaigns():
         # Get requested time period
         days = request.args.get('days', default=30, type=int)
         
+        # Optional column projection, e.g. ?fields=campaign_name,impressions,clicks
+        fields = request.args.get('fields')
+        fields = fields.split(',') if fields else None
+        
+        # Optional top-N by a metric, with the remaining campaigns in one 'Other' row
+        top = request.args.get('top', type=int)
+        sort = request.args.get('sort', default='impressions')
+        
         # Log the request parameters
         logger.info(f"Requested campaign data for the last {days} days")
         
         # Create GoogleAdsAnalytics instance
         try:
-            from app.analytics.google_ads import GoogleAdsAnalytics
-            google_ads = GoogleAdsAnalytics(credentials, customer_id, developer_token)
-            
-            # Log the credential status
-            logger.info(f"OAuth credential status - expired: {credentials.expired}, token: {'Present' if credentials.token else 'Missing'}, token refreshed: {token_refreshed}")
+            from app.analytics.google_ads import GAQL_RESOURCES, column_name, resolve_fields
+            from app.analytics.downsample import top_n
             
-            # Get campaign performance data (this will try GRPC first, then REST API if needed)
-            logger.info("Fetching campaign performance data...")
-            data = google_ads.get_campaign_performance(days)
+            # Validate the requested projection before calling the API
+            try:
+                fields = resolve_fields('campaign', fields) if fields else None
+            except ValueError as field_error:
+                return jsonify({
+                    'success': False,
+                    'error': str(field_error)
+                }), 400
             
-            if not data:
-                logger.warning("No campaign data returned from Google Ads API")
+            if top and sort not in [column_name(field) for field in fields or GAQL_RESOURCES['campaign']['fields']]:
                 return jsonify({
-                    'success': True,
-                    'data': [],
-                    'message': 'No campaign data found for the specified period. Check that your Google Ads account has active campaigns.'
-                })
+                    'success': False,
+                    'error': f"Cannot sort by {sort}: it is not one of the requested fields"
+                }), 400
             
-            # Log success
-            logger.info(f"Successfully retrieved {len(data)} campaigns")
+            def fetch():
+                google_ads = g.tenant.google_ads(credentials)
+                
+                # Log the credential status
+                logger.info(f"OAuth credential status - expired: {credentials.expired}, token: {'Present' if credentials.token else 'Missing'}")
+                
+                # Get campaign performance data (this will try GRPC first, then REST API if needed)
+                logger.info("Fetching campaign performance data...")
+                data = google_ads.get_campaign_performance(days, fields=fields)
+                
+                if not data:
+                    logger.warning("No campaign data returned from Google Ads API")
+                    return {
+                        'success': True,
+                        'data': [],
+                        'message': 'No campaign data found for the specified period. Check that your Google Ads account has active campaigns.'
+                    }
+                
+                # Log success
+                logger.info(f"Successfully retrieved {len(data)} campaigns")
+                
+                return {
+                    'success': True,
+                    'data': top_n(data, sort, top, 'campaign_id', 'campaign_name') if top else data
+                }
             
-            return jsonify({
-                'success': True,
-                'data': data
-            })
+            # Serve repeat requests from the shared cache without building an Ads
+            # client; the key changes with the account's edits (see changes.py)
+            end_date = datetime.now().strftime('%Y-%m-%d')
+            version = g.tenant.changes.version()
+            cache_key = f"ads:{customer_id}:{version}:campaigns:{days}:{end_date}:{','.join(fields or [])}:{top or ''}:{sort}"
+            return cached_json_response(cache_key, fetch)
         except Exception as api_error:
             # Log the detailed error for debugging
             logger.error(f"Google Ads API error details: {str(api_error)}")
@@ -310,7 +448,7 @@ def ads_campaigns():
                     'success': False,
                     'error': f"Authentication error with Google Ads API. Please log out and log in again.",
                     'error_details': str(api_error),
-                    'login_url': url_for('auth.logout') + "?next=" + url_for('auth.login')
+                    'login_url': url_for('auth.logout')
                 }), 401
             
             # Try to parse JSON error response if present
@@ -353,7 +491,7 @@ def ads_campaigns():
                 'error_type': type(api_error).__name__
             }), 500
             
-    except GoogleAdsException as ex:
+    except sdk.GoogleAdsException as ex:
         # Handle Google Ads API errors specifically
         error_message = []
         
@@ -372,7 +510,7 @@ def ads_campaigns():
                 'success': False,
                 'error': "Authentication error with Google Ads API. Please log out and log in again.",
                 'error_details': error_str,
-                'login_url': url_for('auth.logout') + "?next=" + url_for('auth.login')
+                'login_url': url_for('auth.logout')
             }), 401
         
         return jsonify({
@@ -387,4 +525,733 @@ def ads_campaigns():
         return jsonify({
             'success': False,
             'error': f"Unexpected error: {str(e)}"
-        }), 500
\ No newline at end of file
+        }), 500
+
+@analytics_bp.route('/ads/search-terms')
+def ads_search_terms():
+    """API endpoint for the top search terms by cost, clicks, conversions or impressions
+    
+    ?top=K (default 25) terms ranked by ?sort= (default cost) are returned,
+    followed by an '(other)' row with the remaining totals. The report is
+    streamed and aggregated in memory bounded by K; each row's 'error' is how
+    much its ranked metric may be undercounted (0 when exact).
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    days = request.args.get('days', default=30, type=int)
+    top = min(max(request.args.get('top', default=SEARCH_TERMS_TOP, type=int), 1), SEARCH_TERMS_MAX_TOP)
+    sort = request.args.get('sort', default='cost')
+    if sort not in SEARCH_TERM_SORTS:
+        return jsonify({
+            'success': False,
+            'error': f"Cannot sort search terms by {sort}; use one of {', '.join(SEARCH_TERM_SORTS)}"
+        }), 400
+    
+    access_error = tenant_access_error(credentials, 'ads')
+    if access_error:
+        return access_error
+    
+    tenant = g.tenant
+    
+    def fetch():
+        google_ads = tenant.google_ads(credentials)
+        rows, stats = google_ads.get_top_search_terms(days, sort, top)
+        logger.info(f"Aggregated {stats['rows']} search term rows into {stats['counters']} counters")
+        return {
+            'success': True,
+            'data': rows
+        }
+    
+    end_date = datetime.now().strftime('%Y-%m-%d')
+    cache_key = f"ads:{tenant.ads_customer_id}:{tenant.changes.version()}:search-terms:{days}:{end_date}:{top}:{sort}"
+    try:
+        return cached_json_response(cache_key, fetch)
+    except Exception as e:
+        logger.error(f"Google Ads search terms error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/ads/campaigns/<int:campaign_id>/ad-groups')
+def ads_ad_groups(campaign_id):
+    """API endpoint listing a campaign's ad groups, one page at a time"""
+    return drilldown_response('ad_groups', campaign_id)
+
+@analytics_bp.route('/ads/ad-groups/<int:ad_group_id>/keywords')
+def ads_keywords(ad_group_id):
+    """API endpoint listing an ad group's keywords, one page at a time"""
+    return drilldown_response('keywords', ad_group_id)
+
+def drilldown_response(level, parent_id):
+    """Serve one page of a drill-down level, ordered by impressions
+    
+    Pages are slices of Google Ads result pages. The response's next_cursor
+    (null on the last page) is passed back as ?cursor= for the next slice; it
+    is signed and only valid for the same level, parent, range and fields.
+    Only the Google Ads pages a client actually reaches are fetched.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    from app.analytics.google_ads import drilldown_query
+    
+    days = request.args.get('days', default=30, type=int)
+    limit = min(max(request.args.get('limit', default=DRILLDOWN_PAGE_SIZE, type=int), 1), DRILLDOWN_MAX_PAGE_SIZE)
+    fields = _split_param('fields')
+    
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    try:
+        query = drilldown_query(level, parent_id, start_date, end_date, fields or None).build()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    tenant = g.tenant
+    customer_id = tenant.ads_customer_id
+    scope = f"{tenant.name}:{customer_id}:{query}"
+    
+    cursor = request.args.get('cursor')
+    try:
+        position = decode_cursor(current_app.secret_key, scope, cursor) if cursor else {'page_token': None, 'offset': 0}
+    except InvalidCursorError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    page_token, offset = position['page_token'], position['offset']
+    
+    access_error = tenant_access_error(credentials, 'ads')
+    if access_error:
+        return access_error
+    
+    def fetch():
+        google_ads = tenant.google_ads(credentials)
+        rows, next_page_token = google_ads.search_page(query, page_token)
+        
+        # Continue within this Ads page, then on the next one
+        end = offset + limit
+        if end < len(rows):
+            following = {'page_token': page_token, 'offset': end}
+        elif next_page_token:
+            following = {'page_token': next_page_token, 'offset': 0}
+        else:
+            following = None
+        
+        return {
+            'success': True,
+            'data': rows[offset:end],
+            'next_cursor': encode_cursor(current_app.secret_key, scope, following) if following else None
+        }
+    
+    version = tenant.changes.query_version(query)[0]
+    cache_key = f"ads:{customer_id}:{version}:drilldown:{page_token or ''}:{offset}:{limit}:{query}"
+    try:
+        return cached_json_response(cache_key, fetch)
+    except Exception as e:
+        logger.error(f"Google Ads drill-down error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/anomalies')
+def anomalies():
+    """API endpoint flagging anomalies and forecasting daily metrics
+    
+    ?source=ga4 (default) analyses active/new users; ?source=ads analyses
+    cost, clicks and conversions of every campaign at once. Pass
+    ?detail=<campaign_id,...> to include baselines and forecasts for chart
+    overlays (always included for GA4). Today is excluded from detection
+    because its numbers are still incomplete.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    from app.analytics import anomaly
+    
+    source = request.args.get('source', 'ga4')
+    days = request.args.get('days', default=30, type=int)
+    if not 1 <= days <= ANOMALY_MAX_DAYS:
+        return jsonify({
+            'success': False,
+            'error': f"days must be between 1 and {ANOMALY_MAX_DAYS}"
+        }), 400
+    
+    # Analyse complete days only, with extra history so baselines are warm
+    end_date = datetime.now().date() - timedelta(days=1)
+    start_date = end_date - timedelta(days=days - 1)
+    history_start = start_date - timedelta(days=anomaly.ANALYSIS_WARMUP_DAYS)
+    
+    try:
+        if source == 'ga4':
+            cache_key = f"anomalies:ga4:{start_date}:{end_date}"
+            
+            def fetch():
+                ga4 = g.tenant.ga4(credentials)
+                rows = ga4.get_active_users((datetime.now().date() - history_start).days)
+                frame = anomaly.to_frame(rows, ['activeUsers', 'newUsers'], None, history_start, end_date)
+                return {
+                    'success': True,
+                    'data': anomaly.analyze(frame, since=start_date, detail={'total'})
+                }
+        elif source == 'ads':
+            detail = sorted(set(_split_param('detail')))
+            cache_key = f"anomalies:ads:{g.tenant.changes.version()}:{start_date}:{end_date}:{','.join(detail)}"
+            
+            def fetch():
+                google_ads = g.tenant.google_ads(credentials)
+                rows = google_ads.get_campaign_daily(history_start, end_date, ANOMALY_ADS_FIELDS)
+                labels = {row['campaign_id']: row['campaign_name'] for row in rows}
+                frame = anomaly.to_frame(rows, ['cost', 'clicks', 'conversions'], 'campaign_id', history_start, end_date)
+                return {
+                    'success': True,
+                    'data': anomaly.analyze(frame, since=start_date, detail=set(detail), labels=labels)
+                }
+        else:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown source: {source}"
+            }), 400
+        
+        access_error = tenant_access_error(credentials, source)
+        if access_error:
+            return access_error
+        
+        return cached_json_response(cache_key, fetch)
+    except Exception as e:
+        logger.error(f"Anomaly analysis error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/attribution')
+def attribution():
+    """API endpoint attributing GA4 sessions and revenue to Google Ads spend
+    
+    Returns cost per session, Ads ROAS and blended (GA4 revenue) ROAS per
+    campaign, or per campaign and day with ?group=day. ?campaign_id=<id,...>
+    limits the result to some campaigns.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    from app.analytics import attribution as model
+    
+    group = request.args.get('group', 'campaign')
+    if group not in ('campaign', 'day'):
+        return jsonify({
+            'success': False,
+            'error': f"Unsupported grouping: {group}"
+        }), 400
+    
+    days = request.args.get('days', default=30, type=int)
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    campaign_ids = sorted(set(_split_param('campaign_id')))
+    
+    access_error = tenant_access_error(credentials, 'ga4', 'ads')
+    if access_error:
+        return access_error
+    
+    tenant = g.tenant
+    
+    def fetch():
+        ga4 = tenant.ga4(credentials)
+        ga4_rows = list(itertools.chain.from_iterable(ga4.iter_report(
+            model.GA4_DIMENSIONS,
+            model.GA4_METRICS,
+            start_date.strftime('%Y-%m-%d'),
+            end_date.strftime('%Y-%m-%d')
+        )))
+        
+        google_ads = tenant.google_ads(credentials)
+        ads_rows = google_ads.get_campaign_daily(start_date, end_date, model.ADS_FIELDS)
+        
+        return {
+            'success': True,
+            'data': model.attribute(ads_rows, ga4_rows, group, campaign_ids)
+        }
+    
+    cache_key = f"attribution:{tenant.changes.version()}:{start_date}:{end_date}:{group}:{','.join(campaign_ids)}"
+    try:
+        return cached_json_response(cache_key, fetch)
+    except Exception as e:
+        logger.error(f"Attribution error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/series/<name>')
+def series(name):
+    """API endpoint for an hourly-capable time series (ga4-traffic or ads-traffic)
+
+    ?granularity=hour|day|week picks the bucket size; the default (auto)
+    picks the finest one that keeps the window under ?points= buckets.
+    Hours are kept for recent days only and days for about a year, so
+    older windows are served at the next coarser granularity.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+
+    from app.analytics import rollups
+
+    if name not in rollups.SERIES:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown series: {name}"
+        }), 404
+
+    days = max(request.args.get('days', default=30, type=int), 1)
+    points = request.args.get('points', default=rollups.SERIES_MAX_POINTS, type=int)
+    start_date = datetime.now().date() - timedelta(days=days - 1)
+    try:
+        tier = rollups.choose_tier(start_date, request.args.get('granularity', 'auto'), points)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    access_error = tenant_access_error(credentials, rollups.SERIES[name][0])
+    if access_error:
+        return access_error
+
+    tenant = g.tenant
+
+    def fetch():
+        return {
+            'success': True,
+            'granularity': tier,
+            'data': rollups.load_series(tenant, credentials, name, start_date, tier)
+        }
+
+    version = tenant.changes.version() if rollups.SERIES[name][0] == 'ads' else ''
+    cache_key = f"series:{name}:{version}:{tier}:{start_date}:{datetime.now().strftime('%Y-%m-%d %H')}"
+    try:
+        return cached_json_response(cache_key, fetch)
+    except Exception as e:
+        logger.error(f"Series {name} error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/realtime')
+def realtime():
+    """API endpoint for GA4 realtime data (users active in the last 30 minutes)
+    
+    Served from a shared in-memory poller, so any number of clients cost a
+    fixed upstream rate. Pass ?history=1 for the buffered snapshots, or
+    ?since=<fetched_at> for only those newer than a previous response.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    from app.analytics.realtime import get_realtime_poller
+    
+    access_error = tenant_access_error(credentials, 'ga4')
+    if access_error:
+        return access_error
+    
+    poller = get_realtime_poller(g.tenant)
+    snapshot = poller.read(credentials)
+    if snapshot is None:
+        return jsonify({
+            'success': False,
+            'error': 'Realtime data is not available yet. Please try again shortly.'
+        }), 503
+    
+    response = {
+        'success': True,
+        'data': snapshot['data'],
+        'fetched_at': snapshot['fetched_at']
+    }
+    
+    since = request.args.get('since', type=float)
+    if request.args.get('history') == '1' or since is not None:
+        response['history'] = poller.history(since)
+    
+    return jsonify(response)
+
+@analytics_bp.route('/metrics')
+def metrics():
+    """API endpoint exposing cache and backend health metrics for this worker
+    
+    Requires ADMIN_TOKEN as a bearer token, like the admin API.
+    """
+    from app.admin.routes import check_admin_token
+    from app.analytics.google_ads import backend_stats, query_cache_stats
+    from app.analytics.live import get_live_hub, get_request_slots
+    from app.analytics.realtime import realtime_stats
+    
+    error = check_admin_token()
+    if error is not None:
+        return error
+    
+    return jsonify({
+        'success': True,
+        'data': {
+            'pid': os.getpid(),
+            'ads_backends': backend_stats(),
+            'ads_query_cache': query_cache_stats(),
+            'shared_cache': get_shared_cache().stats(),
+            'memory': get_memory_accountant().stats(),
+            'credential_vault': get_credential_vault(current_app).stats(),
+            'live': get_live_hub().stats(),
+            'long_requests': get_request_slots().stats(),
+            'realtime': realtime_stats(),
+            'tenants': {name: tenant.stats() for name, tenant in current_app.extensions['tenants'].items()}
+        }
+    })
+
+
+def export_response(batches, columns, numeric_columns, export_format, filename):
+    """Stream export batches to the client as CSV or Parquet
+    
+    CSV is streamed chunk by chunk as rows arrive. Parquet needs its footer
+    written last, so row groups are written to a temporary file on disk and
+    the file is streamed once complete. Either way only one chunk of rows is
+    in memory at a time.
+    """
+    headers = {'Content-Disposition': f'attachment; filename="{filename}.{export_format}"'}
+    mimetype = export.EXPORT_FORMATS[export_format]
+    
+    # Fetch the first chunk up front so API errors still produce a JSON error
+    # response instead of a truncated download
+    batches = export.rebatch(batches)
+    first = next(batches, [])
+    batches = itertools.chain([first], batches)
+    
+    if export_format == 'csv':
+        return current_app.response_class(export.iter_csv(batches, columns), mimetype=mimetype, headers=headers)
+    
+    handle, path = tempfile.mkstemp(suffix='.parquet')
+    os.close(handle)
+    try:
+        rows = export.write_parquet(batches, columns, numeric_columns, path)
+        logger.info(f"Wrote {rows} rows to Parquet export {filename}")
+    except Exception:
+        os.unlink(path)
+        raise
+    
+    def stream_file():
+        try:
+            with open(path, 'rb') as file:
+                while True:
+                    chunk = file.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.unlink(path)
+    
+    headers['Content-Length'] = str(os.path.getsize(path))
+    return current_app.response_class(stream_file(), mimetype=mimetype, headers=headers)
+
+def _export_params():
+    """Read the format and date range shared by the export endpoints"""
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in export.EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    
+    days = request.args.get('days', default=30, type=int)
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    return export_format, start_date, end_date
+
+def _split_param(name):
+    value = request.args.get(name)
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+@analytics_bp.route('/export/ga4')
+def export_ga4():
+    """API endpoint to export raw GA4 report rows as CSV or Parquet
+    
+    Query parameters: dimensions, metrics (comma separated), days, format.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    access_error = tenant_access_error(credentials, 'ga4')
+    if access_error:
+        return access_error
+    
+    try:
+        export_format, start_date, end_date = _export_params()
+        ga4 = g.tenant.ga4(credentials)
+        batches, columns, numeric_columns = export.ga4_export(
+            ga4,
+            _split_param('dimensions') or ['date'],
+            _split_param('metrics') or ['activeUsers', 'sessions'],
+            start_date.strftime('%Y-%m-%d'),
+            end_date.strftime('%Y-%m-%d')
+        )
+        
+        logger.info(f"Exporting GA4 columns {columns} as {export_format}")
+        return export_response(batches, columns, numeric_columns, export_format, f"ga4-{start_date}-{end_date}")
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"GA4 export error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/export/ads')
+def export_ads():
+    """API endpoint to export raw Google Ads rows as CSV or Parquet
+    
+    Query parameters: resource (campaign, ad_group, keyword_view,
+    search_term_view), fields, segments (comma separated), days, format.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    access_error = tenant_access_error(credentials, 'ads')
+    if access_error:
+        return access_error
+    
+    try:
+        export_format, start_date, end_date = _export_params()
+        resource = request.args.get('resource', 'campaign')
+        google_ads = g.tenant.google_ads(credentials)
+        batches, columns, numeric_columns = export.ads_export(
+            google_ads,
+            resource,
+            _split_param('fields'),
+            _split_param('segments'),
+            start_date,
+            end_date
+        )
+        
+        logger.info(f"Exporting Google Ads {resource} columns {columns} as {export_format}")
+        return export_response(batches, columns, numeric_columns, export_format, f"ads-{resource}-{start_date}-{end_date}")
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Google Ads export error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@analytics_bp.route('/jobs', methods=['POST'])
+def create_job():
+    """API endpoint to queue a long-running report job
+    
+    Body: {"kind": "ga4_report" | "ads_query", "params": {...}}. Returns a job
+    ID immediately; poll /jobs/<id> for progress and the result.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    body = request.get_json(silent=True) or {}
+    kind = body.get('kind')
+    params = body.get('params') or {}
+    
+    from app.analytics.jobs import JOB_PRODUCTS, get_job_runner, validate_job
+    
+    # Reject params the job could never run with now, not when it's polled
+    try:
+        validate_job(kind, params)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    if kind in JOB_PRODUCTS:
+        access_error = tenant_access_error(credentials, JOB_PRODUCTS[kind])
+        if access_error:
+            return access_error
+    
+    # Credentials and configuration stay in memory; only params are stored
+    context = g.tenant.context(credentials)
+    
+    try:
+        job_id = get_job_runner().submit(kind, params, session.sid, context)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('analytics.job_status', job_id=job_id)
+    }), 202
+
+@analytics_bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """API endpoint to poll (or long-poll with ?wait=seconds) a report job
+    
+    Pass ?since=<updated_at> with wait to return as soon as the job changes,
+    and ?partial=1 to include partial results of a running job (the number
+    of rows fetched so far and the first few of them).
+    """
+    if 'credential_id' not in session:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    from app.analytics.jobs import get_job_runner
+    from app.analytics.live import get_request_slots
+    
+    runner = get_job_runner()
+    
+    # Keep long-polls well below the gunicorn worker timeout; when this
+    # worker's long-request slots are taken, answer right away instead
+    wait = min(request.args.get('wait', default=0, type=float), 25)
+    since = request.args.get('since', type=float)
+    slots = get_request_slots()
+    if wait > 0 and slots.acquire():
+        try:
+            job = runner.wait(job_id, wait, since)
+        finally:
+            slots.release()
+    else:
+        job = runner.store.get(job_id)
+    
+    if job is None or job['owner'] != session.sid:
+        return jsonify({
+            'success': False,
+            'error': 'Job not found'
+        }), 404
+    
+    data = {name: job[name] for name in ('id', 'kind', 'params', 'status', 'progress', 'message', 'error', 'created_at', 'updated_at')}
+    if job['status'] == 'succeeded':
+        data['result'] = job['result']
+    elif request.args.get('partial') == '1':
+        data['partial'] = job['partial']
+    
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+@analytics_bp.route('/stream')
+def stream():
+    """Server-Sent Events endpoint pushing live dashboard updates
+    
+    The first event per report is a full 'snapshot'; later events carry only
+    the rows that were added or changed ('upsert') and the keys that
+    disappeared ('remove'). Connections are closed after STREAM_MAX_SECONDS
+    and the browser's EventSource reconnects on its own. Each stream holds a
+    request thread, so a worker only keeps LONG_REQUEST_SLOTS of them open
+    and answers further ones with 503 and Retry-After.
+    """
+    credentials = get_session_credentials()
+    if credentials is None:
+        return jsonify({
+            'success': False,
+            'error': 'Not authenticated'
+        }), 401
+    
+    from app.analytics.live import TOPIC_KEYS, TOPIC_PRODUCTS, get_live_hub, get_request_slots
+    
+    days = request.args.get('days', default=30, type=int)
+    kinds = _split_param('topics') or list(TOPIC_KEYS)
+    unknown = [kind for kind in kinds if kind not in TOPIC_KEYS]
+    if unknown:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown topics: {', '.join(unknown)}"
+        }), 400
+    
+    access_error = tenant_access_error(credentials, *sorted({TOPIC_PRODUCTS[kind] for kind in kinds}))
+    if access_error:
+        return access_error
+    
+    slots = get_request_slots()
+    if not slots.acquire():
+        logger.warning(f"Turning a live stream away, all {slots.limit} stream slots of worker {os.getpid()} are in use")
+        return jsonify({
+            'success': False,
+            'error': 'Too many live connections, please retry shortly',
+            'retry_after': STREAM_BUSY_RETRY_SECONDS
+        }), 503, {'Retry-After': str(STREAM_BUSY_RETRY_SECONDS)}
+    
+    context = g.tenant.context(credentials)
+    hub = get_live_hub()
+    subscription = hub.subscribe(kinds, days, context)
+    dumps = current_app.json.dumps
+    
+    def generate():
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        deadline = time.monotonic() + STREAM_MAX_SECONDS
+        while time.monotonic() < deadline and not subscription.closed:
+            event = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            if event is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            name = 'snapshot' if 'snapshot' in event else 'delta'
+            yield f"event: {name}\ndata: {dumps(event)}\n\n"
+    
+    def close():
+        hub.unsubscribe(subscription)
+        slots.release()
+    
+    response = current_app.response_class(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Runs when the server closes the response, even if it never started streaming
+    response.call_on_close(close)
+    return response
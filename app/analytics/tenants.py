@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from app.analytics.cache import RESULT_CACHE_DIR, NamespacedCache, ResultCache, SQLiteStore, get_shared_cache
+from app.analytics.changes import ChangeTracker
+
+logger = logging.getLogger('allervie-analytics.tenants')
+
+# Per-tenant defaults; each tenant in TENANTS can override them
+TENANT_QUOTA_PER_MINUTE = int(os.getenv('TENANT_QUOTA_PER_MINUTE', 120))
+TENANT_CACHE_ENTRIES = int(os.getenv('TENANT_CACHE_ENTRIES', 256))
+TENANT_CACHE_BYTES = int(os.getenv('TENANT_CACHE_BYTES', 64 * 1024 * 1024))
+TENANT_MAX_CLIENTS = int(os.getenv('TENANT_MAX_CLIENTS', 32))
+
+# Idle pooled API clients are dropped after this many seconds
+CLIENT_POOL_TTL = 3600
+
+# Seconds a user's verified access to a tenant's data is trusted before it is
+# checked with Google again (a denial is rechecked sooner)
+TENANT_ACCESS_TTL = int(os.getenv('TENANT_ACCESS_TTL', 3600))
+TENANT_ACCESS_DENIED_TTL = 300
+
+# Google products holding a tenant's data, as named in error messages
+PRODUCTS = {
+    'ga4': 'Google Analytics',
+    'ads': 'Google Ads'
+}
+
+
+class UnknownTenantError(Exception):
+    """Raised for a tenant name that isn't configured"""
+
+
+class QuotaExceededError(Exception):
+    """Raised when a tenant has used up its upstream API budget"""
+
+
+class TenantAccessError(Exception):
+    """Raised when a user's Google account can't read a tenant's data"""
+
+
+class QuotaStore(SQLiteStore):
+    """Token buckets in the shared SQLite database, so a budget spans all workers"""
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS quota ('
+        'tenant TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+    ]
+
+    def acquire(self, tenant, per_minute, burst, cost=1.0):
+        """Take cost tokens from a tenant's bucket; returns False if there aren't enough"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated_at FROM quota WHERE tenant = ?', (tenant,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * per_minute / 60)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                'INSERT OR REPLACE INTO quota (tenant, tokens, updated_at) VALUES (?, ?, ?)',
+                (tenant, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed
+
+    def tokens(self, tenant):
+        """Return the tokens left at the last update, or None if unused"""
+        row = self._connect().execute('SELECT tokens FROM quota WHERE tenant = ?', (tenant,)).fetchone()
+        return row[0] if row else None
+
+
+_quota_store = None
+_quota_store_lock = threading.Lock()
+
+
+def get_quota_store():
+    """Return the process-wide handle on the quota database"""
+    global _quota_store
+    with _quota_store_lock:
+        if _quota_store is None:
+            _quota_store = QuotaStore(os.path.join(RESULT_CACHE_DIR, 'quota.sqlite3'))
+        return _quota_store
+
+
+class Tenant:
+    """One clinic/brand: its GA4 property, Google Ads account and resource limits
+
+    Each tenant has its own namespace and byte budget in the shared result
+    cache, its own in-process Google Ads query cache, a bounded pool of API
+    clients and an upstream request budget, so a busy tenant can't evict
+    another's data or spend its quota. Edits to its Google Ads account are
+    tracked to version the cached Ads data. Cached data is shared by all of
+    the tenant's users and served without calling Google, so each user's
+    access to the property/account is verified with their own credentials
+    before anything is served (see authorize).
+    """
+
+    def __init__(self, name, ga4_property_id, ads_customer_id, ads_developer_token,
+                 ads_login_customer_id=None, ads_customer_id_aliases=None,
+                 quota_per_minute=TENANT_QUOTA_PER_MINUTE, cache_entries=TENANT_CACHE_ENTRIES,
+                 cache_bytes=TENANT_CACHE_BYTES, max_clients=TENANT_MAX_CLIENTS):
+        """Initialize from the tenant's settings (see TENANTS in .env.example)"""
+        self.name = name
+        self.ga4_property_id = ga4_property_id
+
+        # Some configured IDs are known to be wrong and map to the right account
+        aliases = ads_customer_id_aliases or {}
+        customer_id = str(ads_customer_id or '').strip()
+        if customer_id in aliases:
+            logger.warning(f"Tenant {name}: replacing Google Ads customer ID {customer_id} with {aliases[customer_id]}")
+            customer_id = aliases[customer_id]
+        self.ads_customer_id = customer_id.replace('-', '').replace('"', '').replace("'", "")
+        self.ads_login_customer_id = ads_login_customer_id
+        self.ads_developer_token = ads_developer_token
+
+        self.quota_per_minute = quota_per_minute
+        self.cache_entries = cache_entries
+        self.cache = NamespacedCache(get_shared_cache(), f"tenant:{name}", cache_bytes)
+        self.query_cache = None
+        self.clients = ResultCache(ttl=CLIENT_POOL_TTL, max_entries=max_clients)
+        self.changes = ChangeTracker(self)
+        self.quota_rejections = 0
+
+    def charge(self, cost=1.0):
+        """Spend upstream budget, raising QuotaExceededError when it's used up"""
+        if not get_quota_store().acquire(self.name, self.quota_per_minute, self.quota_per_minute, cost):
+            self.quota_rejections += 1
+            raise QuotaExceededError(f"API quota for {self.name} is used up, please try again in a minute")
+
+    def authorize(self, user_id, credentials, products):
+        """Check that a user's Google account can read this tenant's data in products ('ga4', 'ads')
+
+        Raises TenantAccessError if not. Each product is checked once with a
+        minimal uncached request; the outcome is kept in the tenant's cache
+        for TENANT_ACCESS_TTL seconds (TENANT_ACCESS_DENIED_TTL if denied).
+        """
+        for product in products:
+            key = f"access:{product}:{user_id}"
+            allowed = self.cache.get(key)
+            if allowed is None:
+                if product == 'ga4':
+                    allowed = self.ga4(credentials).check_access()
+                else:
+                    allowed = self.google_ads(credentials, watch=False).check_access()
+                if not allowed:
+                    logger.warning(f"Tenant {self.name}: denied a user without {PRODUCTS[product]} access")
+                self.cache.set(key, allowed, TENANT_ACCESS_TTL if allowed else TENANT_ACCESS_DENIED_TTL)
+            if not allowed:
+                raise TenantAccessError(f"Your Google account has no access to the {PRODUCTS[product]} data of {self.name}")
+
+    def _pooled(self, kind, credentials, factory):
+        """Return a pooled client for this user, creating it on first use"""
+        user = hashlib.sha256(str(credentials.refresh_token or credentials.token).encode('utf-8')).hexdigest()
+        key = f"{kind}:{user}"
+        client = self.clients.get(key)
+        if client is None:
+            client = factory()
+            self.clients.set(key, client)
+        return client
+
+    def ga4(self, credentials):
+        """Return a GA4Analytics client for this tenant's property"""
+        from app.analytics.ga4 import GA4Analytics
+
+        return self._pooled('ga4', credentials, lambda: GA4Analytics(credentials, self.ga4_property_id, quota=self.charge))
+
+    def google_ads(self, credentials, watch=True):
+        """Return a GoogleAdsAnalytics client for this tenant's account
+
+        Using it keeps the account's change tracker polling (unless watch is
+        False, as for the tracker's own queries).
+        """
+        from app.analytics.google_ads import QUERY_CACHE_TTL, GoogleAdsAnalytics
+
+        # Created here so building tenants doesn't import the Google Ads SDK
+        if self.query_cache is None:
+            self.query_cache = ResultCache(
+                ttl=QUERY_CACHE_TTL, max_entries=self.cache_entries, shared=self.cache, pool=f"ads-queries:{self.name}"
+            )
+
+        if watch:
+            self.changes.watch(credentials)
+
+        return self._pooled('ads', credentials, lambda: GoogleAdsAnalytics(
+            credentials,
+            self.ads_customer_id,
+            self.ads_developer_token,
+            login_customer_id=self.ads_login_customer_id,
+            query_cache=self.query_cache,
+            quota=self.charge,
+            changes=self.changes
+        ))
+
+    def context(self, credentials):
+        """In-memory context handed to background work (jobs, live updates)"""
+        return {
+            'tenant': self,
+            'credentials': credentials
+        }
+
+    def stats(self):
+        """Return cache, pool and quota usage for a metrics endpoint"""
+        return {
+            'cache': self.cache.stats(),
+            'query_cache': self.query_cache.stats() if self.query_cache is not None else None,
+            'clients': self.clients.stats()['entries'],
+            'ads_changes': self.changes.stats(),
+            'quota_per_minute': self.quota_per_minute,
+            'quota_tokens': get_quota_store().tokens(self.name),
+            'quota_rejections': self.quota_rejections
+        }
+
+
+def load_tenants(config):
+    """Build the tenants from configuration
+
+    TENANTS is a JSON object keyed by tenant name. Without it, a single
+    'default' tenant is built from GA4_PROPERTY_ID and the GOOGLE_ADS_*
+    settings. Tenants inherit the developer token and customer ID aliases.
+    """
+    aliases = json.loads(config.get('GOOGLE_ADS_CUSTOMER_ID_ALIASES') or '{}')
+    settings = json.loads(config.get('TENANTS') or '{}')
+    if not settings:
+        settings = {
+            config.get('DEFAULT_TENANT') or 'default': {
+                'ga4_property_id': config.get('GA4_PROPERTY_ID'),
+                'ads_customer_id': config.get('GOOGLE_ADS_CUSTOMER_ID')
+            }
+        }
+
+    tenants = {}
+    for name, options in settings.items():
+        options = dict(options)
+        options.setdefault('ads_developer_token', config.get('GOOGLE_ADS_DEVELOPER_TOKEN'))
+        options.setdefault('ads_customer_id_aliases', aliases)
+        tenants[name] = Tenant(name, **options)
+    return tenants
+
+
+def init_tenants(app):
+    """Load the tenants into app.extensions['tenants']"""
+    app.extensions['tenants'] = load_tenants(app.config)
+    default = app.config.get('DEFAULT_TENANT') or 'default'
+    app.config['DEFAULT_TENANT'] = default if default in app.extensions['tenants'] else next(iter(app.extensions['tenants']))
+
+
+def get_tenant(app, name=None):
+    """Return the named tenant (the default one if name is empty)"""
+    tenants = app.extensions['tenants']
+    name = name or app.config['DEFAULT_TENANT']
+    if name not in tenants:
+        raise UnknownTenantError(f"Unknown tenant: {name}")
+    return tenants[name]
@@ -0,0 +1,119 @@
+"""Top-K aggregation over row streams in bounded memory.
+
+High-cardinality reports (search terms over months) can hold millions of
+rows. TopK keeps a fixed number of counters with the Space-Saving algorithm:
+when a new key arrives and every counter is taken, the counter with the
+smallest total is handed over to it. Heavy hitters can't be evicted, so the
+top K are found in one pass whatever the number of distinct keys.
+"""
+import heapq
+from collections import defaultdict
+
+from app.analytics.downsample import OTHER_KEY
+
+# Counters kept per requested row (at least MIN_CAPACITY); while the distinct
+# keys fit in the counters the result is exact
+CAPACITY_FACTOR = 20
+MIN_CAPACITY = 10000
+
+
+class TopK:
+    """Space-Saving summary of weighted keys, ranked by one metric
+
+    Each counter holds the metric sums seen since its key took the counter
+    (lower bounds, exact unless the key was evicted before) and an error:
+    the ranked total it inherited, the most the key's metric can be under
+    its reported value. Grand totals are exact, so the 'Other' row is the
+    difference between them and the reported top rows.
+    """
+
+    def __init__(self, metric, metrics, capacity):
+        self.metric = metric
+        self.metrics = list(metrics)
+        self.capacity = capacity
+        self.totals = dict.fromkeys(self.metrics, 0.0)
+        self.rows = 0
+        self.evictions = 0
+        self._counters = {}
+        self._heap = []
+
+    def update(self, rows, key_field):
+        """Add a batch of rows; rows of one key are summed before touching the counters"""
+        batch = defaultdict(lambda: dict.fromkeys(self.metrics, 0.0))
+        for row in rows:
+            sums = batch[row[key_field]]
+            for metric in self.metrics:
+                sums[metric] += row.get(metric) or 0.0
+        self.rows += len(rows)
+
+        for key, sums in batch.items():
+            for metric in self.metrics:
+                self.totals[metric] += sums[metric]
+            self._add(key, sums)
+
+    def _add(self, key, sums):
+        counter = self._counters.get(key)
+        if counter is None:
+            error = 0.0
+            if len(self._counters) >= self.capacity:
+                # Hand the smallest counter over to the new key
+                error, evicted = self._pop_smallest()
+                del self._counters[evicted]
+                self.evictions += 1
+            counter = self._counters[key] = {'error': error, 'values': dict.fromkeys(self.metrics, 0.0)}
+
+        for metric in self.metrics:
+            counter['values'][metric] += sums[metric]
+        heapq.heappush(self._heap, (self._rank(counter), key))
+
+        # Superseded heap entries are dropped lazily; rebuild when they pile up
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(self._rank(entry), entry_key) for entry_key, entry in self._counters.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_smallest(self):
+        while True:
+            rank, key = heapq.heappop(self._heap)
+            counter = self._counters.get(key)
+            if counter is not None and self._rank(counter) == rank:
+                return rank, key
+
+    def _rank(self, counter):
+        return counter['error'] + counter['values'][self.metric]
+
+    def top(self, k, key_field):
+        """Return the k largest keys as rows, followed by an 'Other' remainder row
+
+        Rows carry the metric sums and 'error'; the 'Other' row holds the
+        totals not attributed to the returned keys.
+        """
+        ranked = sorted(self._counters.items(), key=lambda item: self._rank(item[1]), reverse=True)[:k]
+
+        rows = []
+        for key, counter in ranked:
+            row = {key_field: key}
+            row.update(counter['values'])
+            row['error'] = counter['error']
+            rows.append(row)
+
+        if len(self._counters) > len(rows) or self.evictions:
+            other = {key_field: OTHER_KEY}
+            for metric in self.metrics:
+                other[metric] = max(self.totals[metric] - sum(row[metric] for row in rows), 0.0)
+            other['error'] = 0.0
+            rows.append(other)
+        return rows
+
+    def stats(self):
+        """Return how many rows were seen and how the counters were used"""
+        return {
+            'rows': self.rows,
+            'counters': len(self._counters),
+            'capacity': self.capacity,
+            'evictions': self.evictions
+        }
+
+
+def capacity_for(k):
+    """Number of counters used to find the top k keys"""
+    return max(k * CAPACITY_FACTOR, MIN_CAPACITY)
@@ -1 +1,10 @@
-# Authentication module
\ No newline at end of file
+# Authentication module
+from app.lazy import lazy_attributes
+
+# OAuth libraries are loaded on first use so the login redirect is the only
+# route that waits for them
+__getattr__ = lazy_attributes(__name__, {
+    'Flow': 'google_auth_oauthlib.flow',
+    'Credentials': 'google.oauth2.credentials',
+    'Request': 'google.auth.transport.requests'
+})
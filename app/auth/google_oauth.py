@@ -1,10 +1,11 @@
 from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
 from flask import session, url_for, current_app
 import json
 import os
 import logging
 
+from app.auth.vault import get_credential_vault
+
 class GoogleOAuth:
     """Handles Google OAuth authentication flow"""
     
@@ -54,18 +55,18 @@ class GoogleOAuth:
             current_app.logger.info(f"Requested scopes: {requested_scopes}")
             current_app.logger.info(f"Received scopes: {received_scopes}")
         
-        # Store credentials in session
+        # Store credentials in the vault; the session only keeps the reference
         credentials = flow.credentials
-        session['credentials'] = self._credentials_to_dict(credentials)
+        session['credential_id'] = get_credential_vault(current_app).store(credentials)
         
         return credentials
     
     def get_credentials_from_session(self):
-        """Retrieve credentials from session"""
-        if 'credentials' not in session:
+        """Retrieve the session user's credentials from the vault"""
+        if 'credential_id' not in session:
             return None
         
-        return Credentials(**session['credentials'])
+        return get_credential_vault(current_app).get(session['credential_id'])
     
     def _create_flow(self):
         """Create an OAuth flow instance"""
@@ -75,22 +76,11 @@ class GoogleOAuth:
                 "web": {
                     "client_id": self.client_id,
                     "client_secret": self.client_secret,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "auth_uri": current_app.config['GOOGLE_AUTH_URI'],
+                    "token_uri": current_app.config['GOOGLE_TOKEN_URI'],
                     "redirect_uris": [self.redirect_uri]
                 }
             },
             scopes=self.scopes,
             redirect_uri=self.redirect_uri
         )
-    
-    def _credentials_to_dict(self, credentials):
-        """Convert credentials to dictionary for session storage"""
-        return {
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        }
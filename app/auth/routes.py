@@ -1,9 +1,8 @@
 from flask import Blueprint, redirect, request, url_for, current_app, flash, session, render_template
 import os
 import time
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
+from app import auth as sdk
+from app.auth.vault import get_credential_vault
 import logging
 
 auth_bp = Blueprint('auth', __name__)
@@ -15,21 +14,21 @@ logger = logging.getLogger('allervie-analytics.auth')
 def login():
     """Start the OAuth flow by redirecting to Google's consent page"""
     # Clear any existing credentials to ensure a fresh login
-    if 'credentials' in session:
-        del session['credentials']
+    if 'credential_id' in session:
+        del session['credential_id']
         logger.info("Cleared existing credentials for fresh login")
     
     # Set environment variable to relax scope checking
     os.environ['OAUTHLIB_RELAX_TOKEN_SCOPE'] = '1'
     
     # Create OAuth flow instance
-    flow = Flow.from_client_config(
+    flow = sdk.Flow.from_client_config(
         {
             "web": {
                 "client_id": current_app.config['GOOGLE_CLIENT_ID'],
                 "client_secret": current_app.config['GOOGLE_CLIENT_SECRET'],
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "auth_uri": current_app.config['GOOGLE_AUTH_URI'],
+                "token_uri": current_app.config['GOOGLE_TOKEN_URI'],
                 "redirect_uris": [current_app.config['REDIRECT_URI']]
             }
         },
@@ -79,13 +78,13 @@ def callback():
     
     # Exchange code for credentials
     try:
-        flow = Flow.from_client_config(
+        flow = sdk.Flow.from_client_config(
             {
                 "web": {
                     "client_id": current_app.config['GOOGLE_CLIENT_ID'],
                     "client_secret": current_app.config['GOOGLE_CLIENT_SECRET'],
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
+                    "auth_uri": current_app.config['GOOGLE_AUTH_URI'],
+                    "token_uri": current_app.config['GOOGLE_TOKEN_URI'],
                     "redirect_uris": [current_app.config['REDIRECT_URI']]
                 }
             },
@@ -111,33 +110,15 @@ def callback():
             flash(f"Authentication failed: Missing required Google Ads permissions. Please try again.", 'error')
             return redirect(url_for('auth.login'))
             
-        # Store credentials in session
-        session['credentials'] = {
-            'token': credentials.token,
-            'refresh_token': credentials.refresh_token,
-            'token_uri': credentials.token_uri,
-            'client_id': credentials.client_id,
-            'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        }
-        
         # Force token refresh to ensure we have a fresh token
-        creds = Credentials(**session['credentials'])
-        if creds.expired:
+        if credentials.expired:
             logger.info("Refreshing expired token")
-            creds.refresh(Request())
-            
-            # Update session with refreshed credentials
-            session['credentials'] = {
-                'token': creds.token,
-                'refresh_token': creds.refresh_token,
-                'token_uri': creds.token_uri,
-                'client_id': creds.client_id,
-                'client_secret': creds.client_secret,
-                'scopes': creds.scopes
-            }
+            credentials.refresh(sdk.Request())
             logger.info("Token successfully refreshed")
         
+        # Store credentials in the encrypted vault; the session only keeps the reference
+        session['credential_id'] = get_credential_vault(current_app).store(credentials)
+        
         flash('Authentication successful!', 'success')
         logger.info("OAuth authentication completed successfully")
         
@@ -149,11 +130,17 @@ def callback():
 
 @auth_bp.route('/logout')
 def logout():
-    """Log out user by clearing session"""
-    # Clear credentials from session
-    if 'credentials' in session:
-        del session['credentials']
-        logger.info("User logged out, credentials cleared from session")
+    """Log out user by clearing session and deleting their stored credentials
+
+    The vault entry belongs to the Google account, so this also logs out the
+    user's other sessions (other browsers and devices). Always redirects to
+    the login page.
+    """
+    # Clear credentials from the session and the vault
+    if 'credential_id' in session:
+        get_credential_vault(current_app).delete(session['credential_id'])
+        del session['credential_id']
+        logger.info("User logged out, credentials cleared from session and vault")
     
     # Clear any other session data
     session.clear()
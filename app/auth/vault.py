@@ -0,0 +1,287 @@
+"""Encrypted server-side store of users' OAuth credentials.
+
+Sessions only hold a reference (the user ID) to a vault entry. Entries are
+Fernet-encrypted JSON in a local SQLite database shared by all workers;
+each worker keeps one decrypted Credentials object per user and reuses it
+while its token is valid. A refresh is done by whichever worker takes the
+entry's refresh lease first; the others wait for the new token instead of
+refreshing the same grant again.
+"""
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from app import auth as sdk
+from app.analytics.cache import RESULT_CACHE_DIR, SQLiteStore
+
+logger = logging.getLogger('allervie-analytics.vault')
+
+CREDENTIAL_VAULT_PATH = os.getenv('CREDENTIAL_VAULT_PATH', os.path.join(RESULT_CACHE_DIR, 'credentials.sqlite3'))
+
+# Entries not refreshed or stored for this long belong to expired sessions
+# (sessions last 5 days)
+VAULT_RETENTION = 7 * 86400
+
+# A refresh lease outlives a slow token request; workers waiting on another
+# worker's refresh give up and refresh themselves after REFRESH_WAIT_SECONDS
+REFRESH_LEASE_SECONDS = 30
+REFRESH_WAIT_SECONDS = 10
+REFRESH_POLL_SECONDS = 0.1
+
+CREDENTIAL_FIELDS = ('token', 'refresh_token', 'token_uri', 'client_id', 'client_secret', 'scopes')
+
+
+class CredentialRefreshError(Exception):
+    """Raised when a user's expired token can't be refreshed (e.g. the grant was revoked)"""
+
+
+def vault_keys(configured, secret_key):
+    """Return the Fernet keys to use: CREDENTIAL_VAULT_KEY (comma-separated, newest first) or one derived from the app secret"""
+    if configured:
+        return [key.strip().encode('ascii') for key in configured.split(',') if key.strip()]
+    digest = hashlib.sha256(b'credential-vault:' + secret_key.encode('utf-8')).digest()
+    return [base64.urlsafe_b64encode(digest)]
+
+
+def user_id_for(credentials):
+    """Return a stable ID for the user the credentials belong to
+
+    The Google account ID from the OpenID token when there is one, else a
+    hash of the refresh token.
+    """
+    id_token = getattr(credentials, 'id_token', None)
+    if id_token:
+        try:
+            payload = id_token.split('.')[1]
+            subject = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['sub']
+            return f"google:{subject}"
+        except (IndexError, KeyError, ValueError):
+            pass
+    grant = credentials.refresh_token or credentials.token
+    return f"grant:{hashlib.sha256(str(grant).encode('utf-8')).hexdigest()[:32]}"
+
+
+class CredentialVault(SQLiteStore):
+    """Encrypted credentials per user, with a per-process cache of decrypted ones"""
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS credentials ('
+        'user_id TEXT PRIMARY KEY, data BLOB NOT NULL, version INTEGER NOT NULL, '
+        'refreshing_until REAL NOT NULL DEFAULT 0, updated_at REAL NOT NULL)'
+    ]
+
+    def __init__(self, path, keys):
+        """Initialize with the database path and Fernet keys (the first one encrypts)"""
+        super().__init__(path)
+        self._fernet = MultiFernet([Fernet(key) for key in keys])
+        self._cached = {}
+        self._user_locks = {}
+        self._lock = threading.Lock()
+        self.decrypts = 0
+        self.refreshes = 0
+        self.shared_refreshes = 0
+
+    def store(self, credentials):
+        """Save a user's credentials (e.g. after login) and return the user ID to keep in the session"""
+        user_id = user_id_for(credentials)
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO credentials (user_id, data, version, refreshing_until, updated_at) VALUES (?, ?, 1, 0, ?) '
+            'ON CONFLICT (user_id) DO UPDATE SET data = excluded.data, version = version + 1, '
+            'refreshing_until = 0, updated_at = excluded.updated_at',
+            (user_id, self._encrypt(credentials), now)
+        )
+        conn.execute('DELETE FROM credentials WHERE updated_at < ?', (now - VAULT_RETENTION,))
+
+        with self._lock:
+            self._cached.pop(user_id, None)
+        return user_id
+
+    def get(self, user_id):
+        """Return the user's Credentials with a valid token, refreshing it if needed; None if unknown
+
+        Raises CredentialRefreshError when an expired token can't be refreshed.
+        """
+        cached = self._cached.get(user_id)
+        if cached is not None and not cached[1].expired:
+            return cached[1]
+
+        with self._user_lock(user_id):
+            cached = self._cached.get(user_id)
+            if cached is not None and not cached[1].expired:
+                return cached[1]
+
+            row = self._load(user_id)
+            if row is None:
+                with self._lock:
+                    self._cached.pop(user_id, None)
+                return None
+
+            try:
+                credentials = self._sync(user_id, *row)
+            except ValueError as e:
+                logger.warning(f"Ignoring stored credentials of {user_id}: {str(e)}")
+                return None
+            if credentials.expired and credentials.refresh_token:
+                credentials = self._refresh(user_id, credentials, row[0])
+            return credentials
+
+    def delete(self, user_id):
+        """Remove a user's credentials (e.g. on logout); every session of the user has to log in again"""
+        self._connect().execute('DELETE FROM credentials WHERE user_id = ?', (user_id,))
+        with self._lock:
+            self._cached.pop(user_id, None)
+            self._user_locks.pop(user_id, None)
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def _load(self, user_id):
+        return self._connect().execute(
+            'SELECT version, data FROM credentials WHERE user_id = ?', (user_id,)
+        ).fetchone()
+
+    def _sync(self, user_id, version, data):
+        """Bring the cached Credentials object up to a stored version
+
+        The object is updated in place, so API clients already built with it
+        pick up a token another worker refreshed.
+        """
+        cached = self._cached.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        values = self._decrypt(data)
+        self.decrypts += 1
+        if cached is None:
+            credentials = sdk.Credentials(**values)
+            # Lets clients holding the object refresh it through the vault
+            credentials.vault_entry = (self, user_id)
+        else:
+            credentials = cached[1]
+            credentials.token = values['token']
+            credentials.expiry = values['expiry']
+            credentials._refresh_token = values['refresh_token']
+
+        with self._lock:
+            self._cached[user_id] = (version, credentials)
+        return credentials
+
+    def _refresh(self, user_id, credentials, version):
+        """Refresh an expired token once across workers and return the credentials"""
+        conn = self._connect()
+        deadline = time.monotonic() + REFRESH_WAIT_SECONDS
+
+        while True:
+            now = time.time()
+            leased = conn.execute(
+                'UPDATE credentials SET refreshing_until = ? WHERE user_id = ? AND version = ? AND refreshing_until < ?',
+                (now + REFRESH_LEASE_SECONDS, user_id, version, now)
+            ).rowcount == 1
+            if leased or time.monotonic() >= deadline:
+                break
+
+            # Another worker is refreshing this grant; wait for its token
+            time.sleep(REFRESH_POLL_SECONDS)
+            row = self._load(user_id)
+            if row is None:
+                return credentials
+            if row[0] != version:
+                credentials = self._sync(user_id, *row)
+                version = row[0]
+                if not credentials.expired:
+                    self.shared_refreshes += 1
+                    return credentials
+
+        logger.info(f"Refreshing OAuth token for {user_id}")
+        try:
+            credentials.refresh(sdk.Request())
+        except Exception as e:
+            conn.execute(
+                'UPDATE credentials SET refreshing_until = 0 WHERE user_id = ? AND version = ?', (user_id, version)
+            )
+            raise CredentialRefreshError(f"OAuth token refresh failed: {str(e)}") from e
+        self.refreshes += 1
+
+        conn.execute(
+            'UPDATE credentials SET data = ?, version = version + 1, refreshing_until = 0, updated_at = ? WHERE user_id = ?',
+            (self._encrypt(credentials), time.time(), user_id)
+        )
+        row = self._load(user_id)
+        with self._lock:
+            self._cached[user_id] = (row[0] if row else version + 1, credentials)
+        return credentials
+
+    def _encrypt(self, credentials):
+        values = {field: getattr(credentials, field) for field in CREDENTIAL_FIELDS}
+        values['scopes'] = list(values['scopes'] or [])
+        values['expiry'] = credentials.expiry.isoformat() if credentials.expiry else None
+        return self._fernet.encrypt(json.dumps(values).encode('utf-8'))
+
+    def _decrypt(self, data):
+        try:
+            values = json.loads(self._fernet.decrypt(data))
+        except InvalidToken:
+            raise ValueError("Stored credentials can't be decrypted (was CREDENTIAL_VAULT_KEY changed?)")
+        values['expiry'] = datetime.fromisoformat(values['expiry']) if values['expiry'] else None
+        return values
+
+    def stats(self):
+        """Return counters for a metrics endpoint"""
+        return {
+            'cached_users': len(self._cached),
+            'decrypts': self.decrypts,
+            'refreshes': self.refreshes,
+            'shared_refreshes': self.shared_refreshes
+        }
+
+
+def refresh_credentials(credentials):
+    """Refresh expired credentials in place, through the vault when they came from it
+
+    API clients, jobs and live topics hold the vault's cached Credentials
+    object, so a token expiring in background work is refreshed once across
+    workers and saved like one refreshed for a request. Raises
+    CredentialRefreshError when the token can't be refreshed.
+    """
+    vault, user_id = getattr(credentials, 'vault_entry', (None, None))
+    if vault is None:
+        try:
+            credentials.refresh(sdk.Request())
+        except Exception as e:
+            raise CredentialRefreshError(f"OAuth token refresh failed: {str(e)}") from e
+        return
+
+    fresh = vault.get(user_id)
+    if fresh is None:
+        raise CredentialRefreshError("OAuth token refresh failed: the user has logged out")
+    if fresh is not credentials:
+        # The entry was stored again (a new login) since this object was handed out
+        credentials.token = fresh.token
+        credentials.expiry = fresh.expiry
+        credentials._refresh_token = fresh.refresh_token
+
+
+_vault = None
+_vault_lock = threading.Lock()
+
+
+def get_credential_vault(app):
+    """Return the process-wide credential vault, keyed from the app's configuration"""
+    global _vault
+    with _vault_lock:
+        if _vault is None:
+            _vault = CredentialVault(
+                CREDENTIAL_VAULT_PATH,
+                vault_keys(app.config.get('CREDENTIAL_VAULT_KEY'), app.config['SECRET_KEY'])
+            )
+        return _vault
@@ -14,11 +14,23 @@ HOST = os.getenv('HOST', '0.0.0.0')
 PORT = int(os.getenv('PORT', 8080))
 SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'dev-key-change-in-production')
 
+# Fernet key(s) encrypting stored OAuth credentials, comma-separated with the
+# newest first (older ones still decrypt); derived from SECRET_KEY if unset
+CREDENTIAL_VAULT_KEY = os.getenv('CREDENTIAL_VAULT_KEY')
+
+# Bearer token for the admin API (/api/admin) and /api/analytics/metrics; both
+# are disabled without it
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
 # Google OAuth settings
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
 REDIRECT_URI = os.getenv('REDIRECT_URI', 'http://localhost:8080/auth/callback')
 
+# OAuth endpoints; point them at a local stand-in for load tests (see loadtest/)
+GOOGLE_AUTH_URI = os.getenv('GOOGLE_AUTH_URI', 'https://accounts.google.com/o/oauth2/auth')
+GOOGLE_TOKEN_URI = os.getenv('GOOGLE_TOKEN_URI', 'https://oauth2.googleapis.com/token')
+
 # Google Analytics settings
 GA4_PROPERTY_ID = os.getenv('GA4_PROPERTY_ID')
 
@@ -26,6 +38,15 @@ GA4_PROPERTY_ID = os.getenv('GA4_PROPERTY_ID')
 GOOGLE_ADS_CUSTOMER_ID = os.getenv('GOOGLE_ADS_CUSTOMER_ID')
 GOOGLE_ADS_DEVELOPER_TOKEN = os.getenv('GOOGLE_ADS_DEVELOPER_TOKEN')
 
+# Customer IDs to replace before calling Google Ads (JSON), e.g. a client
+# account ID that must be accessed as its AllerVie MCC
+GOOGLE_ADS_CUSTOMER_ID_ALIASES = os.getenv('GOOGLE_ADS_CUSTOMER_ID_ALIASES', '{"8437927403": "5686645688"}')
+
+# Tenants (clinics/brands) served by this deployment (JSON keyed by tenant name).
+# Without it, the single property/account above is served as DEFAULT_TENANT.
+TENANTS = os.getenv('TENANTS')
+DEFAULT_TENANT = os.getenv('DEFAULT_TENANT', 'default')
+
 # OAuth scopes needed for Google APIs - exact match with Google's response
 SCOPES = [
     'https://www.googleapis.com/auth/adwords',
@@ -0,0 +1,22 @@
+import importlib
+
+
+def lazy_attributes(package, attributes):
+    """Build a module __getattr__ that imports attributes on first access
+
+    attributes maps an exported name to the module it lives in. Once loaded,
+    the value is stored in the package namespace so later lookups are plain
+    attribute reads.
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name):
+        module_name = attributes.get(name)
+        if module_name is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+
+        value = getattr(importlib.import_module(module_name), name)
+        namespace[name] = value
+        return value
+
+    return __getattr__
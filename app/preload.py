@@ -0,0 +1,159 @@
+"""Warm-start helpers that import heavy client libraries ahead of the first request.
+
+Run ``python -m app.preload`` to print an import-time breakdown, or
+``python -m app.preload --benchmark`` to measure a cold app start.
+"""
+import importlib
+import json
+import logging
+import subprocess
+import sys
+import time
+
+logger = logging.getLogger('allervie-analytics.preload')
+
+# Modules that are slow to import, roughly in dependency order
+HEAVY_MODULES = [
+    'numpy',
+    'pandas',
+    'grpc',
+    'google.auth.transport.requests',
+    'google_auth_oauthlib.flow',
+    'google.analytics.data_v1beta',
+    'google.ads.googleads.client',
+    'google.ads.googleads.errors',
+    'app.analytics.ga4',
+    'app.analytics.google_ads',
+    'app.analytics.anomaly',
+    'app.analytics.attribution',
+    'app.analytics.downsample',
+    'app.analytics.topk'
+]
+
+# GA4 proto messages used by the analytics endpoints
+GA4_MESSAGES = ['RunReportRequest', 'RunReportResponse', 'RunRealtimeReportRequest', 'RunRealtimeReportResponse']
+
+
+def preload_modules(modules=None):
+    """Import each module and return a list of (module, seconds) timings
+
+    Modules that aren't installed are logged and skipped.
+    """
+    timings = []
+    for name in modules or HEAVY_MODULES:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Could not preload {name}: {str(e)}")
+            continue
+        timings.append((name, time.perf_counter() - started))
+    return timings
+
+
+def resolve_descriptors():
+    """Load the versioned Google Ads service modules and resolve proto descriptors
+
+    The Ads library imports its versioned services and the large GoogleAdsRow
+    message lazily on first get_service(); doing it here moves that cost out
+    of the first request. Returns a list of (step, seconds) timings.
+    """
+    timings = []
+
+    started = time.perf_counter()
+    try:
+        from google.analytics.data_v1beta import types
+        for name in GA4_MESSAGES:
+            getattr(types, name).pb().DESCRIPTOR
+        timings.append(('ga4 descriptors', time.perf_counter() - started))
+    except ImportError as e:
+        logger.warning(f"Could not resolve GA4 descriptors: {str(e)}")
+
+    started = time.perf_counter()
+    try:
+        from google.ads.googleads import client
+        version = client._DEFAULT_VERSION
+        importlib.import_module(f'google.ads.googleads.{version}.services.services.google_ads_service')
+        service_types = importlib.import_module(f'google.ads.googleads.{version}.services.types.google_ads_service')
+        service_types.GoogleAdsRow.pb().DESCRIPTOR
+        timings.append((f'google ads {version} descriptors', time.perf_counter() - started))
+    except (ImportError, AttributeError) as e:
+        logger.warning(f"Could not resolve Google Ads descriptors: {str(e)}")
+
+    return timings
+
+
+def warm_start(log=None):
+    """Preload heavy modules and descriptors, logging an import-time breakdown"""
+    log = log or logger.info
+
+    started = time.perf_counter()
+    timings = preload_modules() + resolve_descriptors()
+    total = time.perf_counter() - started
+
+    for name, seconds in timings:
+        log(f"Preloaded {name} in {seconds * 1000:.0f} ms")
+    log(f"Warm start finished in {total * 1000:.0f} ms")
+
+    return timings, total
+
+
+# Runs in a fresh interpreter: build the app and serve /health once
+_COLD_START_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get('/health').status_code
+served = time.perf_counter()
+print(json.dumps({
+    'create_app_ms': (created - started) * 1000,
+    'first_health_ms': (served - created) * 1000,
+    'status': status,
+    'heavy_modules_loaded': sorted(set(%r) & set(sys.modules))
+}))
+"""
+
+
+def benchmark_cold_start(top=10):
+    """Measure a cold create_app() plus first /health request in a new interpreter
+
+    Returns the measurements and the slowest imports reported by -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _COLD_START_SCRIPT % HEAVY_MODULES],
+        capture_output=True, text=True, check=True
+    )
+
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((name.strip(), int(cumulative) / 1000))
+
+    measurements = json.loads(result.stdout.strip().splitlines()[-1])
+    slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+    return measurements, slowest
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(message)s', stream=sys.stdout)
+
+    if '--benchmark' in sys.argv:
+        measurements, slowest = benchmark_cold_start()
+        print(f"create_app():       {measurements['create_app_ms']:8.1f} ms")
+        print(f"first /health:      {measurements['first_health_ms']:8.1f} ms (status {measurements['status']})")
+        print(f"heavy modules:      {', '.join(measurements['heavy_modules_loaded']) or 'none'}")
+        print(f"\n{'slowest imports (cumulative)':<45} {'ms':>8}")
+        for name, ms in slowest:
+            print(f"{name:<45} {ms:>8.1f}")
+        sys.exit(0)
+
+    timings, total = warm_start()
+    print(f"{'module':<45} {'ms':>8}")
+    for name, seconds in sorted(timings, key=lambda item: item[1], reverse=True):
+        print(f"{name:<45} {seconds * 1000:>8.1f}")
+    print(f"{'total':<45} {total * 1000:>8.1f}")
@@ -0,0 +1,301 @@
+"""Sampling profiler for live traffic, switched on from the admin API.
+
+While enabled, a background thread samples the Python stacks of requests in
+flight every few milliseconds: a percentage of requests from their start,
+and any other request once it runs past the slow threshold. Requests slower
+than the threshold are saved with their stacks in folded (flamegraph.pl /
+speedscope) format; the last PROFILE_RING_SIZE profiles are kept. Settings
+and profiles live in a local SQLite database so every gunicorn worker
+follows the same switch and any worker can serve the profiles.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import sysconfig
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import request
+
+from app.analytics.cache import RESULT_CACHE_DIR, SQLiteStore
+
+logger = logging.getLogger('allervie-analytics.profiler')
+
+# Seconds between stack samples, and profiles kept across all workers
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', 0.005))
+PROFILE_RING_SIZE = int(os.getenv('PROFILE_RING_SIZE', 50))
+
+# Defaults for an enable request: requests slower than this are captured,
+# and profiling switches itself off after PROFILE_DEFAULT_MINUTES
+PROFILE_SLOW_SECONDS = float(os.getenv('PROFILE_SLOW_SECONDS', 5))
+PROFILE_DEFAULT_MINUTES = 30
+
+# Seconds a worker reuses the shared settings before reading them again
+SETTINGS_CHECK_INTERVAL = 2
+
+# Deeper stacks are cut at the root end
+MAX_STACK_DEPTH = 128
+
+# Requests that are never profiled (the admin API itself, static files)
+EXCLUDED_ENDPOINTS = {'static'}
+EXCLUDED_BLUEPRINTS = {'admin'}
+
+
+class ProfileStore(SQLiteStore):
+    """Profiler settings and captured profiles (a ring of the newest)"""
+
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS profiler_settings ('
+        'id INTEGER PRIMARY KEY CHECK (id = 1), sample_percent REAL NOT NULL, slow_seconds REAL NOT NULL, '
+        'enabled_until REAL NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS profiles ('
+        'id TEXT PRIMARY KEY, created_at REAL NOT NULL, pid INTEGER NOT NULL, method TEXT NOT NULL, '
+        'path TEXT NOT NULL, endpoint TEXT, status INTEGER, duration REAL NOT NULL, sampled INTEGER NOT NULL, '
+        'samples INTEGER NOT NULL, stacks TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS profiles_created_at ON profiles (created_at)'
+    ]
+
+    def settings(self):
+        """Return the active settings as a dict, or None when profiling is off"""
+        row = self._connect().execute(
+            'SELECT sample_percent, slow_seconds, enabled_until FROM profiler_settings WHERE id = 1 AND enabled_until > ?',
+            (time.time(),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'sample_percent': row[0], 'slow_seconds': row[1], 'enabled_until': row[2]}
+
+    def enable(self, sample_percent, slow_seconds, minutes):
+        """Switch profiling on for every worker for a number of minutes"""
+        self._connect().execute(
+            'INSERT OR REPLACE INTO profiler_settings (id, sample_percent, slow_seconds, enabled_until) VALUES (1, ?, ?, ?)',
+            (sample_percent, slow_seconds, time.time() + minutes * 60)
+        )
+
+    def disable(self):
+        self._connect().execute('DELETE FROM profiler_settings')
+
+    def add(self, profile):
+        """Save a profile and drop the oldest beyond PROFILE_RING_SIZE"""
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO profiles (id, created_at, pid, method, path, endpoint, status, duration, sampled, samples, stacks) '
+            'VALUES (:id, :created_at, :pid, :method, :path, :endpoint, :status, :duration, :sampled, :samples, :stacks)',
+            {**profile, 'stacks': json.dumps(profile['stacks'])}
+        )
+        conn.execute(
+            'DELETE FROM profiles WHERE id NOT IN (SELECT id FROM profiles ORDER BY created_at DESC LIMIT ?)',
+            (PROFILE_RING_SIZE,)
+        )
+
+    def list(self):
+        """Return the metadata of the kept profiles, newest first"""
+        cursor = self._connect().execute(
+            'SELECT id, created_at, pid, method, path, endpoint, status, duration, sampled, samples '
+            'FROM profiles ORDER BY created_at DESC'
+        )
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def get(self, profile_id):
+        """Return a profile with its stacks ({folded stack: samples}), or None"""
+        cursor = self._connect().execute('SELECT * FROM profiles WHERE id = ?', (profile_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        profile = dict(zip([column[0] for column in cursor.description], row))
+        profile['stacks'] = json.loads(profile['stacks'])
+        return profile
+
+
+def fold_stack(frame):
+    """Return a frame's call stack as 'root;...;leaf' with one 'file:function' entry per frame"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{_short_path(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+_PATH_PREFIXES = ('site-packages' + os.sep, os.getcwd() + os.sep, sysconfig.get_paths()['stdlib'] + os.sep)
+
+
+def _short_path(filename):
+    """Trim a source path to the part after site-packages, the project root or the standard library"""
+    for marker in _PATH_PREFIXES:
+        index = filename.find(marker)
+        if index != -1:
+            return filename[index + len(marker):]
+    return filename
+
+
+def folded_text(stacks):
+    """Render stacks in the folded format read by flamegraph.pl and speedscope"""
+    return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+
+def hot_functions(stacks, limit=20):
+    """Return the functions with the most samples on top of the stack (self time)"""
+    counts = Counter()
+    for stack, count in stacks.items():
+        counts[stack.rsplit(';', 1)[-1]] += count
+    total = sum(counts.values()) or 1
+    return [
+        {'function': name, 'samples': count, 'share': round(count / total, 4)}
+        for name, count in counts.most_common(limit)
+    ]
+
+
+class _ActiveRequest:
+    def __init__(self, sampled):
+        self.started = time.monotonic()
+        self.sampled = sampled
+        self.status = None
+        self.samples = 0
+        self.stacks = Counter()
+
+
+class Profiler:
+    """Per-process request profiler driven by the shared ProfileStore settings"""
+
+    def __init__(self, store):
+        self.store = store
+        self.captured = 0
+        self.errors = 0
+        self._settings = None
+        self._checked_at = 0.0
+        self._active = {}
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def settings(self):
+        """Return the shared settings, re-read at most every SETTINGS_CHECK_INTERVAL seconds"""
+        now = time.monotonic()
+        if now - self._checked_at > SETTINGS_CHECK_INTERVAL:
+            self._checked_at = now
+            try:
+                self._settings = self.store.settings()
+            except Exception as e:
+                logger.warning(f"Could not read profiler settings: {str(e)}")
+                self._settings = None
+        return self._settings
+
+    def refresh(self):
+        """Drop the cached settings, e.g. after the admin API changed them"""
+        self._checked_at = 0.0
+
+    def start_request(self):
+        settings = self.settings()
+        if settings is None:
+            return
+        if request.endpoint in EXCLUDED_ENDPOINTS or request.blueprint in EXCLUDED_BLUEPRINTS:
+            return
+
+        sampled = random.random() * 100 < settings['sample_percent']
+        with self._lock:
+            self._active[threading.get_ident()] = _ActiveRequest(sampled)
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+                self._thread.start()
+
+    def record_response(self, response):
+        active = self._active.get(threading.get_ident())
+        if active is not None:
+            active.status = response.status_code
+        return response
+
+    def finish_request(self, exc=None):
+        with self._lock:
+            active = self._active.pop(threading.get_ident(), None)
+        if active is None:
+            return
+
+        duration = time.monotonic() - active.started
+        settings = self._settings
+        if settings is None or duration < settings['slow_seconds'] or not active.samples:
+            return
+
+        try:
+            self.store.add({
+                'id': uuid.uuid4().hex,
+                'created_at': time.time(),
+                'pid': os.getpid(),
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': active.status if exc is None else 500,
+                'duration': round(duration, 3),
+                'sampled': int(active.sampled),
+                'samples': active.samples,
+                'stacks': dict(active.stacks)
+            })
+            self.captured += 1
+            logger.info(f"Captured profile of {request.method} {request.path} ({duration:.2f}s, {active.samples} samples)")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Could not save profile: {str(e)}")
+
+    def _sample_loop(self):
+        """Sample the stacks of profiled requests until none are in flight"""
+        pid = os.getpid()
+        while pid == os.getpid():
+            time.sleep(PROFILE_SAMPLE_INTERVAL)
+            settings = self._settings
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active.items())
+
+            # Unsampled requests are only watched until they turn out slow
+            now = time.monotonic()
+            slow_seconds = settings['slow_seconds'] if settings else float('inf')
+            targets = [(ident, entry) for ident, entry in active if entry.sampled or now - entry.started >= slow_seconds]
+            if not targets:
+                continue
+
+            frames = sys._current_frames()
+            for ident, entry in targets:
+                frame = frames.get(ident)
+                if frame is not None:
+                    entry.stacks[fold_stack(frame)] += 1
+                    entry.samples += 1
+            del frames
+
+    def stats(self):
+        """Return this worker's profiler state"""
+        return {
+            'pid': os.getpid(),
+            'in_flight': len(self._active),
+            'sampling': self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+            'captured': self.captured,
+            'errors': self.errors
+        }
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Return the process-wide profiler"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler(ProfileStore(os.path.join(RESULT_CACHE_DIR, 'profiles.sqlite3')))
+        return _profiler
+
+
+def init_profiler(app):
+    """Hook the profiler into every request of the app"""
+    profiler = get_profiler()
+    app.before_request(profiler.start_request)
+    app.after_request(profiler.record_response)
+    app.teardown_request(profiler.finish_request)
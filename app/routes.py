@@ -10,7 +10,7 @@ def index():
 @main_bp.route('/api/auth/status')
 def auth_status():
     """API endpoint to check authentication status"""
-    if 'credentials' in session:
+    if 'credential_id' in session:
         return jsonify({
             'authenticated': True
         })
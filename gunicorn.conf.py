@@ -0,0 +1,71 @@
+"""Gunicorn configuration.
+
+The app is loaded once in the master process before workers are forked. The
+app itself is import-light (Google SDKs load on first use); WARM_START decides
+when the heavy Google client libraries are imported:
+
+  master - in the master before forking, so every worker (including ones
+           restarted by gunicorn) shares them copy-on-write (default)
+  worker - in a background thread in each worker after it starts serving,
+           so health checks answer immediately on a cold container
+  off    - on the first request that needs them
+"""
+import os
+import threading
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+timeout = 120
+
+# Threaded workers, so long-lived live-update (SSE) connections and long-polls
+# each hold a thread rather than a whole worker process.
+#
+# Capacity: a container serves workers x threads requests at once (4 x 8 = 32
+# by default). A live stream holds its thread for up to STREAM_MAX_SECONDS
+# (600s) and a job long-poll for up to 25s, so 32 open dashboards would take
+# every thread and leave none for /health. Streams and long-polls therefore
+# share LONG_REQUEST_SLOTS threads per worker (default threads // 2 = 4, so 16
+# open dashboards per container); beyond that streams get a 503 with
+# Retry-After and long-polls answer without waiting. The other
+# threads - LONG_REQUEST_SLOTS (4 per worker, 16 per container) always serve
+# short requests. Raise GUNICORN_THREADS together with LONG_REQUEST_SLOTS to
+# hold more dashboards open.
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Import the application (and everything it imports) in the master
+preload_app = True
+
+warm_start_mode = os.getenv('WARM_START', 'master').lower()
+
+
+def on_starting(server):
+    """Import the heavy modules in the master before workers are forked"""
+    if warm_start_mode != 'master':
+        return
+
+    from app.preload import warm_start
+
+    warm_start(log=server.log.info)
+
+
+def post_worker_init(worker):
+    """Warm each worker in the background when not warming in the master"""
+    if warm_start_mode != 'worker':
+        worker.log.info(f"Worker {worker.pid} booted (warm start: {warm_start_mode})")
+        return
+
+    from app.preload import warm_start
+
+    thread = threading.Thread(target=warm_start, kwargs={'log': worker.log.info}, daemon=True)
+    thread.start()
+
+
+def on_exit(server):
+    """Save the shared result cache once the workers are gone, so the next start is warm"""
+    from app.analytics.cache import get_shared_cache
+
+    try:
+        get_shared_cache().save()
+    except Exception as e:
+        server.log.warning(f"Could not save the result cache: {str(e)}")
@@ -0,0 +1 @@
+"""Load-test suite: a local OAuth stand-in, synthetic upstream clients and a scenario driver (python -m loadtest)"""
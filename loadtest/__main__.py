@@ -0,0 +1,267 @@
+"""Load-test the login and dashboard flows against a local OAuth stand-in.
+
+Examples:
+    python -m loadtest --users 50 --duration 60 --token-lifetime 40
+    python -m loadtest --users 200 --ramp 0 --duration 30     # login burst
+    python -m loadtest --target http://localhost:8080 --oauth-port 9000
+
+By default the app runs in-process on a free port with synthetic GA4 and
+Google Ads clients, so nothing reaches Google. With --target, the app under
+test must be started with GOOGLE_AUTH_URI/GOOGLE_TOKEN_URI pointing at the
+stand-in (http://127.0.0.1:<oauth-port>/o/oauth2/auth and /token); its
+upstream API calls are real, so use a warm cache or expect errors there.
+
+Each virtual user logs in, then loads the dashboard reports over and over
+with a random range and think time until the run ends. Short token
+lifetimes make sessions hit token expiry and refresh during the run;
+lifetimes under google-auth's 20s refresh margin refresh on every request
+(a refresh storm).
+"""
+import argparse
+import asyncio
+import logging
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+import requests
+
+from loadtest.fake_oauth import FakeOAuthServer
+
+# Requests of one dashboard load, as the dashboard issues them
+DASHBOARD_REQUESTS = [
+    ('status', '/api/auth/status'),
+    ('active-users', '/api/analytics/active-users?days=90&points=120'),
+    ('traffic-sources', '/api/analytics/traffic-sources?days={days}&top=8'),
+    ('campaigns', '/api/analytics/ads/campaigns?days={days}&fields=campaign_name,impressions,clicks,conversions&top=10'),
+    ('anomalies', '/api/analytics/anomalies?days={days}'),
+    ('ads-anomalies', '/api/analytics/anomalies?source=ads&days={days}'),
+    ('ad-groups', '/api/analytics/ads/campaigns/1000/ad-groups?days={days}')
+]
+DASHBOARD_RANGES = [7, 30, 90]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test login and dashboard flows")
+    parser.add_argument('--users', type=int, default=20, help="Concurrent virtual users")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds each user keeps loading dashboards")
+    parser.add_argument('--ramp', type=float, default=5, help="Seconds over which users start (0 for a login burst)")
+    parser.add_argument('--think', type=float, default=2, help="Mean seconds between a user's dashboard loads")
+    parser.add_argument('--token-lifetime', type=int, default=50,
+                        help="Access token lifetime issued by the stand-in; google-auth refreshes "
+                             "20s before expiry, so the default expires tokens after 30s")
+    parser.add_argument('--oauth-latency', type=float, default=0.05, help="Seconds added to every token request")
+    parser.add_argument('--upstream-latency', type=float, default=0.2, help="Seconds per synthetic GA4/Ads call (in-process only)")
+    parser.add_argument('--oauth-port', type=int, default=0, help="Port of the OAuth stand-in (default: any free port)")
+    parser.add_argument('--target', help="Base URL of an app already running (default: run it in-process)")
+    parser.add_argument('--session-dir', help="Session directory to measure (in-process: a temporary one)")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for ranges and think times")
+    return parser.parse_args()
+
+
+class Recorder:
+    """Collects latencies and outcomes per step"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, outcome):
+        with self._lock:
+            self.latencies[step].append(seconds)
+            self.outcomes[step][outcome] += 1
+
+    def report(self, elapsed):
+        lines = [f"{'step':<16}{'count':>7}{'req/s':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}  outcomes"]
+        for step in sorted(self.latencies):
+            values = sorted(self.latencies[step])
+            outcomes = ', '.join(f"{outcome}: {count}" for outcome, count in sorted(self.outcomes[step].items()))
+            lines.append(
+                f"{step:<16}{len(values):>7}{len(values) / elapsed:>8.1f}"
+                f"{percentile(values, 50):>9.0f}{percentile(values, 90):>9.0f}{percentile(values, 99):>9.0f}"
+                f"{values[-1] * 1000:>9.0f}  {outcomes}"
+            )
+        return '\n'.join(lines)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of sorted values, in milliseconds"""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))
+    return values[index] * 1000
+
+
+def session_store_usage(path):
+    """Return (files, bytes) in a session directory"""
+    if not path or not os.path.isdir(path):
+        return 0, 0
+    sizes = [entry.stat().st_size for entry in os.scandir(path) if entry.is_file()]
+    return len(sizes), sum(sizes)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_app(oauth, args, workdir):
+    """Run the app in-process with synthetic upstream clients; returns (base URL, session dir)"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    # Settings are read when the app is created, so set them first
+    os.environ.update({
+        'GOOGLE_AUTH_URI': oauth.auth_uri,
+        'GOOGLE_TOKEN_URI': oauth.token_uri,
+        'REDIRECT_URI': f"{base_url}/auth/callback",
+        'RESULT_CACHE_DIR': os.path.join(workdir, 'analytics_cache'),
+        'OAUTHLIB_INSECURE_TRANSPORT': '1'
+    })
+    os.environ.setdefault('GOOGLE_CLIENT_ID', 'loadtest-client')
+    os.environ.setdefault('GOOGLE_CLIENT_SECRET', 'loadtest-secret')
+    os.environ.setdefault('GA4_PROPERTY_ID', '123456789')
+    os.environ.setdefault('GOOGLE_ADS_CUSTOMER_ID', '1234567890')
+
+    # The session directory is relative to the working directory
+    os.chdir(workdir)
+
+    from werkzeug.serving import make_server
+    from app import create_app
+    from loadtest import fake_google
+
+    fake_google.install(latency=args.upstream_latency)
+    app = create_app()
+
+    # The app logs every request at DEBUG (and the ads route resets its
+    # logger's level per request); filter at the handlers to keep the report readable
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return base_url, app.config['SESSION_FILE_DIR']
+
+
+def timed(recorder, step, call):
+    """Run an HTTP call, recording its latency and outcome"""
+    started = time.perf_counter()
+    try:
+        response = call()
+        outcome = str(response.status_code)
+        return response
+    except requests.RequestException as e:
+        outcome = type(e).__name__
+        return None
+    finally:
+        recorder.record(step, time.perf_counter() - started, outcome)
+
+
+def login(http, base_url, recorder):
+    """Walk the OAuth redirects: app login -> stand-in consent -> app callback"""
+    started = time.perf_counter()
+    response = timed(recorder, 'login', lambda: http.get(urljoin(base_url, '/auth/login'), allow_redirects=False))
+    if response is None or response.status_code != 302:
+        return False
+
+    consent = response.headers['Location']
+    response = timed(recorder, 'authorize', lambda: http.get(consent, allow_redirects=False))
+    if response is None or response.status_code != 302:
+        return False
+
+    callback = response.headers['Location']
+    response = timed(recorder, 'callback', lambda: http.get(callback, allow_redirects=False))
+    if response is None:
+        return False
+
+    status = http.get(urljoin(base_url, '/api/auth/status')).json()
+    recorder.record('login-flow', time.perf_counter() - started, 'ok' if status.get('authenticated') else 'failed')
+    return bool(status.get('authenticated'))
+
+
+def load_dashboard(http, base_url, recorder, days):
+    started = time.perf_counter()
+    ok = True
+    for step, path in DASHBOARD_REQUESTS:
+        response = timed(recorder, step, lambda: http.get(urljoin(base_url, path.format(days=days))))
+        ok = ok and response is not None and response.status_code == 200
+    recorder.record('dashboard', time.perf_counter() - started, 'ok' if ok else 'failed')
+
+
+async def virtual_user(index, base_url, args, recorder, executor, rng, deadline):
+    """Log in, then load dashboards with think time until the deadline"""
+    loop = asyncio.get_running_loop()
+    await asyncio.sleep(args.ramp * index / max(args.users, 1))
+
+    http = requests.Session()
+    if not await loop.run_in_executor(executor, login, http, base_url, recorder):
+        return
+
+    while time.monotonic() < deadline:
+        await loop.run_in_executor(executor, load_dashboard, http, base_url, recorder, rng.choice(DASHBOARD_RANGES))
+        await asyncio.sleep(rng.expovariate(1 / args.think) if args.think > 0 else 0)
+
+
+async def run(base_url, args, recorder):
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.ramp + args.duration
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        await asyncio.gather(*(
+            virtual_user(index, base_url, args, recorder, executor, random.Random(rng.random()), deadline)
+            for index in range(args.users)
+        ))
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    oauth = FakeOAuthServer(port=args.oauth_port, token_lifetime=args.token_lifetime, latency=args.oauth_latency).start()
+    workdir = tempfile.mkdtemp(prefix='allervie-loadtest-')
+
+    if args.target:
+        base_url, session_dir = args.target, args.session_dir
+        print(f"OAuth stand-in at {oauth.url}; the target must use it as GOOGLE_AUTH_URI/GOOGLE_TOKEN_URI")
+    else:
+        base_url, session_dir = start_app(oauth, args, workdir)
+        session_dir = args.session_dir or session_dir
+
+    sessions_before = session_store_usage(session_dir)
+    recorder = Recorder()
+    started = time.monotonic()
+    asyncio.run(run(base_url, args, recorder))
+    elapsed = time.monotonic() - started
+    sessions_after = session_store_usage(session_dir)
+
+    oauth_stats = oauth.stats()
+    oauth.stop()
+
+    print(f"\n{args.users} users, {elapsed:.1f}s, token lifetime {args.token_lifetime}s\n")
+    print(recorder.report(elapsed))
+    print(
+        f"\nToken endpoint: {oauth_stats['code_exchanges']} code exchanges, "
+        f"{oauth_stats['refreshes']} refreshes, {oauth_stats['rejected']} rejected"
+    )
+    if session_dir:
+        print(
+            f"Session store: {sessions_before[0]} -> {sessions_after[0]} files, "
+            f"{sessions_before[1] / 1024:.0f} -> {sessions_after[1] / 1024:.0f} KiB ({session_dir})"
+        )
+
+    failed = sum(count for outcomes in recorder.outcomes.values() for outcome, count in outcomes.items() if outcome == 'failed')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Synthetic GA4 and Google Ads clients for load tests.
+
+They subclass the real clients and replace only the network calls, so
+request building, row decoding, quotas and caching run as in production.
+Values are deterministic per row, so repeated reports agree with each other.
+"""
+import random
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from google.analytics.data_v1beta.types import (
+    DimensionHeader, DimensionValue, MetricHeader, MetricValue, Row,
+    RunRealtimeReportResponse, RunReportResponse
+)
+from app.analytics import ga4, google_ads
+from app.auth.vault import refresh_credentials
+
+# Distinct values per non-date GA4 dimension and rows per Google Ads resource
+GA4_DIMENSION_VALUES = 40
+ADS_RESOURCE_ROWS = {
+    'campaign': 60,
+    'ad_group': 300,
+    'keyword_view': 1500,
+    'search_term_view': 3000,
+    'customer': 24,
+    'customer_client': 5,
+    'change_status': 0
+}
+
+# Rows per result page (the real API returns up to 10,000); smaller pages
+# exercise drill-down paging with the synthetic row counts
+ADS_PAGE_SIZE = 1000
+
+# Simulated upstream response time in seconds (set by install())
+UPSTREAM_LATENCY = 0.0
+
+_DATE_RANGE = re.compile(r"segments\.date BETWEEN '(\d{4}-\d{2}-\d{2})' AND '(\d{4}-\d{2}-\d{2})'")
+
+
+def install(latency=0.0):
+    """Make tenants build the synthetic clients instead of the real ones"""
+    global UPSTREAM_LATENCY
+    UPSTREAM_LATENCY = latency
+    ga4.GA4Analytics = FakeGA4Analytics
+    google_ads.GoogleAdsAnalytics = FakeGoogleAdsAnalytics
+
+
+def _value(*key):
+    """Deterministic pseudo-random metric value for a row"""
+    return random.Random('|'.join(map(str, key))).randint(0, 1000)
+
+
+def _dates(start_date, end_date):
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+class FakeDataClient:
+    """Answers GA4 Data API requests with synthetic rows"""
+
+    def run_report(self, request):
+        time.sleep(UPSTREAM_LATENCY)
+        dimensions = [dimension.name for dimension in request.dimensions]
+        metrics = [metric.name for metric in request.metrics]
+        date_range = request.date_ranges[0]
+
+        keys = [()]
+        for name in dimensions:
+            if name == 'date':
+                values = [day.strftime('%Y%m%d') for day in _dates(date_range.start_date, date_range.end_date)]
+            elif name == 'dateHour':
+                values = [
+                    f"{day.strftime('%Y%m%d')}{hour:02d}"
+                    for day in _dates(date_range.start_date, date_range.end_date) for hour in range(24)
+                ]
+            else:
+                values = [f"{name}-{index}" for index in range(GA4_DIMENSION_VALUES)]
+            keys = [key + (value,) for key in keys for value in values]
+
+        page = keys[request.offset:request.offset + request.limit] if request.limit else keys[request.offset:]
+        return RunReportResponse(
+            dimension_headers=[DimensionHeader(name=name) for name in dimensions],
+            metric_headers=[MetricHeader(name=name) for name in metrics],
+            rows=[
+                Row(
+                    dimension_values=[DimensionValue(value=value) for value in key],
+                    metric_values=[MetricValue(value=str(_value(*key, metric))) for metric in metrics]
+                )
+                for key in page
+            ],
+            row_count=len(keys)
+        )
+
+    def run_realtime_report(self, request):
+        time.sleep(UPSTREAM_LATENCY)
+        metrics = [metric.name for metric in request.metrics]
+        minute = int(time.time() // 60)
+        return RunRealtimeReportResponse(
+            metric_headers=[MetricHeader(name=name) for name in metrics],
+            rows=[Row(metric_values=[MetricValue(value=str(_value(minute, metric))) for metric in metrics])],
+            row_count=1
+        )
+
+
+class FakeGA4Analytics(ga4.GA4Analytics):
+    """GA4Analytics backed by FakeDataClient"""
+
+    def __init__(self, credentials, property_id, quota=None):
+        self.client = FakeDataClient()
+        self.credentials = credentials
+        self.property_id = property_id
+        self.quota = quota
+
+
+class FakeGoogleAdsAnalytics(google_ads.GoogleAdsAnalytics):
+    """GoogleAdsAnalytics whose GRPC backend returns synthetic rows"""
+
+    def __init__(self, credentials, customer_id, developer_token, login_customer_id=None,
+                 query_cache=None, quota=None, changes=None):
+        self.query_cache = query_cache or google_ads._query_cache
+        self.quota = quota
+        self.changes = changes
+        self.customer_id = str(customer_id)
+        self.login_customer_id = str(login_customer_id or customer_id)
+        self.developer_token = developer_token
+        self.credentials = credentials
+        self.client = None
+
+        # Same token handling as the real client, so refreshes hit the token endpoint
+        if self.credentials.expired and self.credentials.refresh_token:
+            refresh_credentials(self.credentials)
+
+    def _available_backends(self):
+        return ['grpc']
+
+    def _search_grpc(self, query, fields):
+        time.sleep(UPSTREAM_LATENCY)
+        resource = query.split(' FROM ', 1)[1].split()[0]
+        match = _DATE_RANGE.search(query)
+        days = _dates(*match.groups()) if match and 'segments.date' in fields else [None]
+
+        return [
+            google_ads.decode_row(self._row(resource, index, day, fields), fields)
+            for index in range(ADS_RESOURCE_ROWS.get(resource, 10))
+            for day in days
+        ]
+
+    def _page_grpc(self, query, fields, page_token=None):
+        rows = self._search_grpc(query, fields)
+        start = int(page_token or 0)
+        end = start + ADS_PAGE_SIZE
+        return rows[start:end], str(end) if end < len(rows) else None
+
+    def _stream_grpc(self, query, fields):
+        yield self._search_grpc(query, fields)
+
+    def _row(self, resource, index, day, fields):
+        """Build a REST-style result row (nested camelCase JSON) for decode_row"""
+        row = {}
+        for field in fields:
+            *parents, leaf = field.split('.')
+            if field == 'segments.date':
+                value = day.strftime('%Y-%m-%d') if isinstance(day, date) else None
+            elif field == 'segments.hour':
+                value = index % 24
+            elif field.startswith('metrics.'):
+                value = _value(resource, index, day, field) * (1000000 if 'micros' in field or field in google_ads.MICROS_FIELDS else 1)
+            elif leaf == 'id' or leaf.endswith('_id'):
+                value = str(1000 + index)
+            elif leaf in ('name', 'descriptive_name', 'text', 'search_term'):
+                value = f"{parents[-1]} {index}"
+            elif leaf.endswith('status'):
+                value = 'ENABLED'
+            else:
+                value = None
+
+            node = row
+            for part in parents:
+                node = node.setdefault(google_ads._camel_case(part), {})
+            node[google_ads._camel_case(leaf)] = value
+        return row
@@ -0,0 +1,154 @@
+"""Local stand-in for Google's OAuth 2.0 authorization and token endpoints.
+
+The authorization endpoint approves every request at once and redirects back
+with a code; the token endpoint exchanges codes and refresh tokens for short
+lived access tokens. Point GOOGLE_AUTH_URI and GOOGLE_TOKEN_URI at it to run
+the login and token refresh flows without Google.
+"""
+import json
+import logging
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+logger = logging.getLogger('allervie-analytics.loadtest')
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 resets connections during login bursts
+    request_queue_size = 128
+    daemon_threads = True
+
+AUTH_PATH = '/o/oauth2/auth'
+TOKEN_PATH = '/token'
+STATS_PATH = '/stats'
+
+
+class FakeOAuthServer:
+    """Threaded HTTP server issuing fake authorization codes and tokens
+
+    token_lifetime is the access token lifetime in seconds (short values
+    force refreshes); latency adds a delay to every token request.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, token_lifetime=3600, latency=0.0):
+        self.token_lifetime = token_lifetime
+        self.latency = latency
+        self.codes = {}
+        self.refresh_tokens = {}
+        self.counts = {'authorizations': 0, 'code_exchanges': 0, 'refreshes': 0, 'rejected': 0}
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def auth_uri(self):
+        return self.url + AUTH_PATH
+
+    @property
+    def token_uri(self):
+        return self.url + TOKEN_PATH
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        """Return request counters and the number of live refresh tokens"""
+        with self._lock:
+            return dict(self.counts, refresh_tokens=len(self.refresh_tokens))
+
+    def authorize(self, params):
+        """Approve an authorization request; returns the redirect URL"""
+        code = secrets.token_urlsafe(16)
+        with self._lock:
+            self.codes[code] = params.get('scope', '')
+            self.counts['authorizations'] += 1
+
+        query = {'code': code, 'scope': params.get('scope', '')}
+        if 'state' in params:
+            query['state'] = params['state']
+        return f"{params['redirect_uri']}?{urlencode(query)}"
+
+    def grant(self, form):
+        """Handle a token request; returns (status, JSON body)"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        grant_type = form.get('grant_type')
+        with self._lock:
+            if grant_type == 'authorization_code' and form.get('code') in self.codes:
+                scope = self.codes.pop(form['code'])
+                refresh_token = secrets.token_urlsafe(24)
+                self.refresh_tokens[refresh_token] = scope
+                self.counts['code_exchanges'] += 1
+            elif grant_type == 'refresh_token' and form.get('refresh_token') in self.refresh_tokens:
+                refresh_token = form['refresh_token']
+                scope = self.refresh_tokens[refresh_token]
+                self.counts['refreshes'] += 1
+            else:
+                self.counts['rejected'] += 1
+                return 400, {'error': 'invalid_grant', 'error_description': 'Unknown code or refresh token'}
+
+        body = {
+            'access_token': secrets.token_urlsafe(32),
+            'expires_in': self.token_lifetime,
+            'scope': scope,
+            'token_type': 'Bearer'
+        }
+        if grant_type == 'authorization_code':
+            body['refresh_token'] = refresh_token
+        return 200, body
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+                if url.path == AUTH_PATH and 'redirect_uri' in params:
+                    self.send_response(302)
+                    self.send_header('Location', server.authorize(params))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                elif url.path == STATS_PATH:
+                    self._json(200, server.stats())
+                else:
+                    self._json(404, {'error': 'not_found'})
+
+            def do_POST(self):
+                if urlparse(self.path).path != TOKEN_PATH:
+                    self._json(404, {'error': 'not_found'})
+                    return
+
+                length = int(self.headers.get('Content-Length') or 0)
+                form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode('utf-8')).items()}
+                self._json(*server.grant(form))
+
+            def _json(self, status, body):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
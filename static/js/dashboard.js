@@ -7,6 +7,67 @@ let activeUsersChart;
 let trafficSourcesChart;
 let campaignPerformanceChart;
 
+// Only request the campaign columns the chart actually plots
+const CAMPAIGN_CHART_FIELDS = 'campaign_name,impressions,clicks,conversions';
+
+// Chart sizes: the server sends the top N rows plus one 'Other' row, and at
+// most CHART_MAX_POINTS points per time series, however large the account
+const CAMPAIGN_CHART_TOP = 10;
+const TRAFFIC_CHART_TOP = 8;
+const CHART_MAX_POINTS = 120;
+const OTHER_KEY = '(other)';
+
+// Report parameters per chart, shared by initial loads and live updates
+const ACTIVE_USERS_PARAMS = { points: CHART_MAX_POINTS };
+const TRAFFIC_PARAMS = { top: TRAFFIC_CHART_TOP };
+const CAMPAIGN_PARAMS = { fields: CAMPAIGN_CHART_FIELDS, top: CAMPAIGN_CHART_TOP };
+
+// Live update stream, the report each topic refreshes (rows keyed like the
+// server diffs them) and the rows it has delivered
+const LIVE_TOPICS = {
+    'active-users': { key: 'date', path: '/api/analytics/active-users', params: ACTIVE_USERS_PARAMS },
+    'traffic-sources': { key: 'sessionSource', path: '/api/analytics/traffic-sources', params: TRAFFIC_PARAMS },
+    'campaigns': { key: 'campaign_id', path: '/api/analytics/ads/campaigns', params: CAMPAIGN_PARAMS }
+};
+const liveRows = {};
+let liveSource;
+let liveDays;
+
+// Pause before reconnecting a stream the server turned away (503 when busy)
+const LIVE_BUSY_RETRY_MS = 30000;
+
+// Latest rows and anomaly analysis per chart, so overlays survive redraws
+let activeUsersRows = [];
+let campaignRows = [];
+let activeUsersAnalysis = null;
+let flaggedCampaigns = new Set();
+
+// Campaigns with an anomaly this recently are marked on the chart
+const CAMPAIGN_FLAG_DAYS = 7;
+
+// Drill-down below a campaign bar: each level's endpoint, row key and label,
+// the columns shown, and the level opened by clicking one of its rows
+const DRILLDOWN_LEVELS = {
+    'ad-groups': {
+        path: id => `/api/analytics/ads/campaigns/${id}/ad-groups`,
+        key: 'ad_group_id',
+        label: 'ad_group_name',
+        columns: ['impressions', 'clicks', 'conversions'],
+        child: 'keywords'
+    },
+    'keywords': {
+        path: id => `/api/analytics/ads/ad-groups/${id}/keywords`,
+        key: 'keyword_id',
+        label: 'keyword_text',
+        columns: ['keyword_match_type', 'impressions', 'clicks', 'conversions'],
+        child: null
+    }
+};
+
+// Open drill-down levels, outermost first ({ level, id, name, rows, cursor })
+let drilldownPath = [];
+let drilldownDays;
+
 // Initialize charts when page loads
 document.addEventListener('DOMContentLoaded', async function() {
     // Check authentication status first
@@ -14,26 +75,17 @@ document.addEventListener('DOMContentLoaded', async function() {
     
     if (authenticated) {
         initializeCharts();
+    } else {
+        // Don't leave another user's reports in the browser cache
+        clearReports();
     }
 });
 
 /**
- * Initialize all dashboard charts
+ * Initialize all dashboard charts for the selected date range
  */
 async function initializeCharts() {
-    // Default to 30 days
-    const days = 30;
-    
-    // Initialize charts in parallel with proper error handling
-    try {
-        await Promise.all([
-            initActiveUsersChart(days).catch(handleChartError('active-users-chart')),
-            initTrafficSourcesChart(days).catch(handleChartError('traffic-sources-chart')),
-            initCampaignPerformanceChart(days).catch(handleChartError('campaign-performance-chart'))
-        ]);
-    } catch (error) {
-        console.error('Error initializing charts:', error);
-    }
+    await updateCharts(document.getElementById('date-range').value || 30);
 }
 
 /**
@@ -48,397 +100,627 @@ function handleChartError(chartId) {
 }
 
 /**
- * Update all charts when date range changes
+ * Load all charts for a date range, creating them on first use
+ *
+ * Reports come from the data layer, so ranges already seen (or cut from a
+ * longer cached series) render without a request.
  */
 async function updateCharts(days) {
-    // Update all charts with new data
     try {
         await Promise.all([
-            updateActiveUsersChart(days).catch(handleChartError('active-users-chart')),
-            updateTrafficSourcesChart(days).catch(handleChartError('traffic-sources-chart')),
-            updateCampaignPerformanceChart(days).catch(handleChartError('campaign-performance-chart'))
+            loadActiveUsersChart(days).catch(handleChartError('active-users-chart')),
+            loadTrafficSourcesChart(days).catch(handleChartError('traffic-sources-chart')),
+            loadCampaignPerformanceChart(days).catch(handleChartError('campaign-performance-chart'))
         ]);
     } catch (error) {
         console.error('Error updating charts:', error);
     }
+    
+    closeDrilldown();
+    loadAnomalyOverlays(days);
+    connectLiveUpdates(days);
 }
 
 /**
- * Initialize Active Users chart
+ * Load and draw the Active Users chart
  */
-async function initActiveUsersChart(days) {
-    try {
-        // Fetch active users data
-        const response = await fetch(`/api/analytics/active-users?days=${days}`);
-        const result = await response.json();
-        
-        if (!result.success) {
-            throw new Error(result.error || 'Failed to load active users data');
-        }
-        
-        // Format the data
-        const data = result.data || [];
-        
-        if (data.length === 0) {
-            throw new Error('No active users data available');
-        }
-        
-        // Sort data by date
-        data.sort((a, b) => {
-            return new Date(formatDateString(a.date)) - new Date(formatDateString(b.date));
-        });
-        
-        // Extract data for chart
-        const dates = data.map(item => formatDate(item.date));
-        const activeUsers = data.map(item => item.activeUsers);
-        const newUsers = data.map(item => item.newUsers);
-        
-        // Get canvas context
-        const ctx = document.getElementById('active-users-chart').getContext('2d');
-        
-        // Create chart
-        activeUsersChart = new Chart(ctx, {
-            type: 'line',
-            data: {
-                labels: dates,
-                datasets: [
-                    {
-                        label: 'Active Users',
-                        data: activeUsers,
-                        borderColor: '#4a6bef',
-                        backgroundColor: 'rgba(74, 107, 239, 0.1)',
-                        tension: 0.4,
-                        fill: true
-                    },
-                    {
-                        label: 'New Users',
-                        data: newUsers,
-                        borderColor: '#28a745',
-                        backgroundColor: 'rgba(40, 167, 69, 0.1)',
-                        tension: 0.4,
-                        fill: true
-                    }
-                ]
+async function loadActiveUsersChart(days) {
+    const data = await loadReport('/api/analytics/active-users', days, ACTIVE_USERS_PARAMS);
+    
+    if (data.length === 0) {
+        throw new Error('No active users data available');
+    }
+    
+    renderActiveUsersChart(data);
+}
+
+/**
+ * Create the Active Users chart with empty datasets
+ */
+function createActiveUsersChart() {
+    const ctx = document.getElementById('active-users-chart').getContext('2d');
+    
+    return new Chart(ctx, {
+        type: 'line',
+        data: {
+            labels: [],
+            datasets: [
+                {
+                    label: 'Active Users',
+                    data: [],
+                    borderColor: '#4a6bef',
+                    backgroundColor: 'rgba(74, 107, 239, 0.1)',
+                    tension: 0.4,
+                    fill: true
+                },
+                {
+                    label: 'New Users',
+                    data: [],
+                    borderColor: '#28a745',
+                    backgroundColor: 'rgba(40, 167, 69, 0.1)',
+                    tension: 0.4,
+                    fill: true
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    position: 'top',
+                },
+                title: {
+                    display: false
+                }
             },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {
-                    legend: {
-                        position: 'top',
-                    },
-                    title: {
-                        display: false
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    grid: {
+                        drawBorder: false
                     }
                 },
-                scales: {
-                    y: {
-                        beginAtZero: true,
-                        grid: {
-                            drawBorder: false
-                        }
-                    },
-                    x: {
-                        grid: {
-                            display: false
-                        }
+                x: {
+                    grid: {
+                        display: false
                     }
                 }
             }
-        });
-    } catch (error) {
-        console.error('Failed to initialize active users chart:', error);
-        throw error;
+        }
+    });
+}
+
+/**
+ * Draw the Active Users chart from rows, diffing the existing datasets in place
+ */
+function renderActiveUsersChart(data, mode) {
+    // Sort a copy by date; the rows may be shared with the data cache
+    data = data.slice().sort((a, b) => {
+        return new Date(formatDateString(a.date)) - new Date(formatDateString(b.date));
+    });
+    
+    activeUsersRows = data;
+    if (!activeUsersChart) {
+        activeUsersChart = createActiveUsersChart();
+    }
+    
+    // Update chart data; forecast days extend the labels
+    const labels = data.map(item => formatDate(item.date));
+    let changed = applyActiveUsersOverlay(data, labels);
+    changed = setInPlace(activeUsersChart.data.labels, labels) || changed;
+    changed = setInPlace(activeUsersChart.data.datasets[0].data, data.map(item => item.activeUsers)) || changed;
+    changed = setInPlace(activeUsersChart.data.datasets[1].data, data.map(item => item.newUsers)) || changed;
+    
+    // Only redraw when something visible changed
+    if (changed) {
+        activeUsersChart.update(mode);
     }
 }
 
 /**
- * Initialize Traffic Sources chart
+ * Add the expected range, anomaly markers and forecast to the Active Users chart
+ *
+ * Forecast dates past the data are appended to labels. Returns whether the
+ * overlay datasets changed.
  */
-async function initTrafficSourcesChart(days) {
-    try {
-        // Fetch traffic sources data
-        const response = await fetch(`/api/analytics/traffic-sources?days=${days}`);
-        const result = await response.json();
-        
-        if (!result.success) {
-            throw new Error(result.error || 'Failed to load traffic sources data');
+function applyActiveUsersOverlay(data, labels) {
+    const datasets = activeUsersChart.data.datasets;
+    
+    const analysis = activeUsersAnalysis && activeUsersAnalysis.series.total;
+    if (!analysis || !analysis.activeUsers) {
+        // Keep only the two base datasets
+        const changed = datasets.length > 2;
+        datasets.length = 2;
+        return changed;
+    }
+    
+    const series = analysis.activeUsers;
+    const baseline = new Map(series.dates.map((date, i) => [date.replace(/-/g, ''), series.baseline[i]]));
+    const forecast = new Map(series.forecast.map(point => [point.date.replace(/-/g, ''), point.value]));
+    const anomalies = new Set(
+        activeUsersAnalysis.anomalies
+            .filter(item => item.metric === 'activeUsers')
+            .map(item => item.date.replace(/-/g, ''))
+    );
+    
+    // Forecast days after the last data point extend the x axis
+    const lastDate = data.length ? data[data.length - 1].date : '';
+    const futureDates = series.forecast
+        .map(point => point.date.replace(/-/g, ''))
+        .filter(date => date > lastDate);
+    labels.push(...futureDates.map(formatDate));
+    
+    const overlays = [
+        {
+            label: 'Expected',
+            data: data.map(item => baseline.has(item.date) ? baseline.get(item.date) : null),
+            borderColor: '#6c757d',
+            borderDash: [4, 4],
+            pointRadius: 0,
+            fill: false
+        },
+        {
+            label: 'Anomaly',
+            data: data.map(item => anomalies.has(item.date) ? item.activeUsers : null),
+            borderColor: '#dc3545',
+            backgroundColor: '#dc3545',
+            pointRadius: 6,
+            showLine: false
+        },
+        {
+            label: 'Forecast',
+            data: data.map(item => forecast.has(item.date) ? forecast.get(item.date) : null)
+                .concat(futureDates.map(date => forecast.get(date))),
+            borderColor: '#4a6bef',
+            borderDash: [2, 6],
+            pointRadius: 0,
+            fill: false
         }
-        
-        // Format the data
-        const data = result.data || [];
-        
-        if (data.length === 0) {
-            throw new Error('No traffic sources data available');
+    ];
+    
+    // Reuse existing overlay datasets so only changed points are redrawn
+    let changed = false;
+    overlays.forEach((overlay, i) => {
+        const existing = datasets[2 + i];
+        if (existing) {
+            changed = setInPlace(existing.data, overlay.data) || changed;
+        } else {
+            datasets.push(overlay);
+            changed = true;
         }
-        
-        // Sort data by sessions (descending)
-        data.sort((a, b) => b.sessions - a.sessions);
-        
-        // Get top 8 sources
-        const topSources = data.slice(0, 8);
-        
-        // Extract data for chart
-        const sources = topSources.map(item => item.sessionSource || 'Direct');
-        const sessions = topSources.map(item => item.sessions);
-        
-        // Get canvas context
-        const ctx = document.getElementById('traffic-sources-chart').getContext('2d');
-        
-        // Colors for chart
-        const colors = [
-            '#4a6bef', '#28a745', '#dc3545', '#ffc107',
-            '#17a2b8', '#6c757d', '#6f42c1', '#fd7e14'
-        ];
-        
-        // Create chart
-        trafficSourcesChart = new Chart(ctx, {
-            type: 'doughnut',
-            data: {
-                labels: sources,
-                datasets: [{
-                    data: sessions,
-                    backgroundColor: colors,
-                    borderWidth: 1
-                }]
-            },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {
-                    legend: {
-                        position: 'right',
-                    }
+    });
+    return changed;
+}
+
+/**
+ * Load and draw the Traffic Sources chart
+ */
+async function loadTrafficSourcesChart(days) {
+    const data = await loadReport('/api/analytics/traffic-sources', days, TRAFFIC_PARAMS);
+    
+    if (data.length === 0) {
+        throw new Error('No traffic sources data available');
+    }
+    
+    renderTrafficSourcesChart(data);
+}
+
+/**
+ * Create the Traffic Sources chart with an empty dataset
+ */
+function createTrafficSourcesChart() {
+    const ctx = document.getElementById('traffic-sources-chart').getContext('2d');
+    
+    // Colors for chart; the last one is for the 'Other' bucket
+    const colors = [
+        '#4a6bef', '#28a745', '#dc3545', '#ffc107',
+        '#17a2b8', '#6c757d', '#6f42c1', '#fd7e14',
+        '#ced4da'
+    ];
+    
+    return new Chart(ctx, {
+        type: 'doughnut',
+        data: {
+            labels: [],
+            datasets: [{
+                data: [],
+                backgroundColor: colors,
+                borderWidth: 1
+            }]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            plugins: {
+                legend: {
+                    position: 'right',
                 }
             }
-        });
-    } catch (error) {
-        console.error('Failed to initialize traffic sources chart:', error);
-        throw error;
+        }
+    });
+}
+
+/**
+ * Draw the Traffic Sources chart from rows, diffing the existing dataset in place
+ */
+function renderTrafficSourcesChart(data, mode) {
+    // Sort a copy by sessions (descending), 'Other' last, and keep the top sources
+    const topSources = data.slice()
+        .sort(byMetricOtherLast('sessionSource', 'sessions'))
+        .slice(0, TRAFFIC_CHART_TOP + 1);
+    if (!trafficSourcesChart) {
+        trafficSourcesChart = createTrafficSourcesChart();
+    }
+    
+    // Update chart data
+    let changed = setInPlace(trafficSourcesChart.data.labels, topSources.map(item => {
+        return item.sessionSource === OTHER_KEY ? 'Other' : (item.sessionSource || 'Direct');
+    }));
+    changed = setInPlace(trafficSourcesChart.data.datasets[0].data, topSources.map(item => item.sessions)) || changed;
+    
+    // Only redraw when something visible changed
+    if (changed) {
+        trafficSourcesChart.update(mode);
     }
 }
 
 /**
- * Initialize Campaign Performance chart
+ * Load and draw the Campaign Performance chart
  */
-async function initCampaignPerformanceChart(days) {
-    try {
-        // Fetch campaign data
-        const response = await fetch(`/api/analytics/ads/campaigns?days=${days}`);
-        const result = await response.json();
-        
-        if (!result.success) {
-            throw new Error(result.error || 'Failed to load campaign data');
-        }
-        
-        // Format the data
-        const data = result.data || [];
-        
-        if (data.length === 0) {
-            throw new Error('No campaign data available');
-        }
-        
-        // Sort data by impressions (descending)
-        data.sort((a, b) => b.impressions - a.impressions);
-        
-        // Get top 10 campaigns
-        const topCampaigns = data.slice(0, 10);
-        
-        // Extract data for chart
-        const campaigns = topCampaigns.map(item => item.campaign_name);
-        const impressions = topCampaigns.map(item => item.impressions);
-        const clicks = topCampaigns.map(item => item.clicks);
-        const conversions = topCampaigns.map(item => item.conversions);
-        
-        // Get canvas context
-        const ctx = document.getElementById('campaign-performance-chart').getContext('2d');
-        
-        // Create chart
-        campaignPerformanceChart = new Chart(ctx, {
-            type: 'bar',
-            data: {
-                labels: campaigns,
-                datasets: [
-                    {
-                        label: 'Impressions',
-                        data: impressions,
-                        backgroundColor: 'rgba(74, 107, 239, 0.7)',
-                        order: 3
-                    },
-                    {
-                        label: 'Clicks',
-                        data: clicks,
-                        backgroundColor: 'rgba(40, 167, 69, 0.7)',
-                        order: 2
-                    },
-                    {
-                        label: 'Conversions',
-                        data: conversions,
-                        backgroundColor: 'rgba(220, 53, 69, 0.7)',
-                        order: 1
-                    }
-                ]
+async function loadCampaignPerformanceChart(days) {
+    const data = await loadReport('/api/analytics/ads/campaigns', days, CAMPAIGN_PARAMS);
+    
+    if (data.length === 0) {
+        throw new Error('No campaign data available');
+    }
+    
+    renderCampaignPerformanceChart(data);
+}
+
+/**
+ * Create the Campaign Performance chart with empty datasets
+ */
+function createCampaignPerformanceChart() {
+    const ctx = document.getElementById('campaign-performance-chart').getContext('2d');
+    
+    return new Chart(ctx, {
+        type: 'bar',
+        data: {
+            labels: [],
+            datasets: [
+                {
+                    label: 'Impressions',
+                    data: [],
+                    backgroundColor: 'rgba(74, 107, 239, 0.7)',
+                    order: 3
+                },
+                {
+                    label: 'Clicks',
+                    data: [],
+                    backgroundColor: 'rgba(40, 167, 69, 0.7)',
+                    order: 2
+                },
+                {
+                    label: 'Conversions',
+                    data: [],
+                    backgroundColor: 'rgba(220, 53, 69, 0.7)',
+                    order: 1
+                }
+            ]
+        },
+        options: {
+            responsive: true,
+            maintainAspectRatio: false,
+            // Clicking a campaign's bars opens its ad groups
+            onClick: (event, elements) => {
+                const campaign = elements.length ? campaignRows[elements[0].index] : null;
+                if (campaign && campaign.campaign_id !== OTHER_KEY) {
+                    openDrilldown(0, 'ad-groups', campaign.campaign_id, campaign.campaign_name);
+                }
             },
-            options: {
-                responsive: true,
-                maintainAspectRatio: false,
-                plugins: {
-                    legend: {
-                        position: 'top',
+            plugins: {
+                legend: {
+                    position: 'top',
+                }
+            },
+            scales: {
+                y: {
+                    beginAtZero: true,
+                    grid: {
+                        drawBorder: false
                     }
                 },
-                scales: {
-                    y: {
-                        beginAtZero: true,
-                        grid: {
-                            drawBorder: false
-                        }
-                    },
-                    x: {
-                        grid: {
-                            display: false
-                        }
+                x: {
+                    grid: {
+                        display: false
                     }
                 }
             }
-        });
-    } catch (error) {
-        console.error('Failed to initialize campaign performance chart:', error);
-        throw error;
+        }
+    });
+}
+
+/**
+ * Draw the Campaign Performance chart from rows, diffing the existing datasets in place
+ */
+function renderCampaignPerformanceChart(data, mode) {
+    // Sort a copy by impressions (descending), 'Other' last, and keep the top campaigns
+    data = data.slice().sort(byMetricOtherLast('campaign_id', 'impressions'));
+    const topCampaigns = data.slice(0, CAMPAIGN_CHART_TOP + 1);
+    
+    campaignRows = data;
+    if (!campaignPerformanceChart) {
+        campaignPerformanceChart = createCampaignPerformanceChart();
+    }
+    
+    // Update chart data, marking campaigns with recent anomalies
+    const datasets = campaignPerformanceChart.data.datasets;
+    let changed = setInPlace(campaignPerformanceChart.data.labels, topCampaigns.map(item => {
+        return flaggedCampaigns.has(item.campaign_id) ? `${item.campaign_name} ⚠` : item.campaign_name;
+    }));
+    changed = setInPlace(datasets[0].data, topCampaigns.map(item => item.impressions)) || changed;
+    changed = setInPlace(datasets[1].data, topCampaigns.map(item => item.clicks)) || changed;
+    changed = setInPlace(datasets[2].data, topCampaigns.map(item => item.conversions)) || changed;
+    
+    // Only redraw when something visible changed
+    if (changed) {
+        campaignPerformanceChart.update(mode);
     }
 }
 
 /**
- * Update Active Users chart
+ * Open a drill-down level at a depth of the path, replacing deeper levels
+ *
+ * Levels load one page at a time; 'Load more' fetches the next page with the
+ * cursor the server returned, so only what is opened is ever requested.
+ */
+async function openDrilldown(depth, level, id, name) {
+    drilldownDays = document.getElementById('date-range').value || 30;
+    drilldownPath = drilldownPath.slice(0, depth);
+    drilldownPath.push({ level, id, name, rows: [], cursor: null });
+    await loadDrilldownPage();
+}
+
+/**
+ * Append the next page of the innermost drill-down level
  */
-async function updateActiveUsersChart(days) {
+async function loadDrilldownPage() {
+    const current = drilldownPath[drilldownPath.length - 1];
+    const spec = DRILLDOWN_LEVELS[current.level];
+    const fields = [spec.label].concat(spec.columns).join(',');
+    
     try {
-        // Fetch new data
-        const response = await fetch(`/api/analytics/active-users?days=${days}`);
-        const result = await response.json();
-        
-        if (!result.success) {
-            throw new Error(result.error || 'Failed to update active users data');
-        }
-        
-        // Format the data
-        const data = result.data || [];
-        
-        if (data.length === 0) {
-            throw new Error('No active users data available');
+        const page = await loadReportPage(spec.path(current.id), drilldownDays, current.cursor, { fields });
+        if (drilldownPath[drilldownPath.length - 1] !== current) {
+            return;  // Another level was opened meanwhile
         }
-        
-        // Sort data by date
-        data.sort((a, b) => {
-            return new Date(formatDateString(a.date)) - new Date(formatDateString(b.date));
-        });
-        
-        // Extract data for chart
-        const dates = data.map(item => formatDate(item.date));
-        const activeUsers = data.map(item => item.activeUsers);
-        const newUsers = data.map(item => item.newUsers);
-        
-        // Update chart data
-        activeUsersChart.data.labels = dates;
-        activeUsersChart.data.datasets[0].data = activeUsers;
-        activeUsersChart.data.datasets[1].data = newUsers;
-        
-        // Update chart
-        activeUsersChart.update();
+        current.rows = current.rows.concat(page.rows);
+        current.cursor = page.nextCursor;
+        renderDrilldown();
     } catch (error) {
-        console.error('Failed to update active users chart:', error);
-        throw error;
+        console.error(`Failed to load ${current.level}:`, error);
+        renderDrilldown(error.message || 'Unknown error');
     }
 }
 
 /**
- * Update Traffic Sources chart
+ * Hide the drill-down panel (e.g. when the date range changes)
  */
-async function updateTrafficSourcesChart(days) {
-    try {
-        // Fetch new data
-        const response = await fetch(`/api/analytics/traffic-sources?days=${days}`);
-        const result = await response.json();
-        
-        if (!result.success) {
-            throw new Error(result.error || 'Failed to update traffic sources data');
-        }
-        
-        // Format the data
-        const data = result.data || [];
-        
-        if (data.length === 0) {
-            throw new Error('No traffic sources data available');
+function closeDrilldown() {
+    drilldownPath = [];
+    renderDrilldown();
+}
+
+/**
+ * Draw the drill-down panel: a breadcrumb of open levels and the innermost level's rows
+ */
+function renderDrilldown(errorMessage) {
+    const panel = document.getElementById('campaign-drilldown');
+    panel.replaceChildren();
+    panel.hidden = drilldownPath.length === 0;
+    if (panel.hidden) {
+        return;
+    }
+    
+    const breadcrumb = document.createElement('div');
+    breadcrumb.className = 'drilldown-breadcrumb';
+    drilldownPath.forEach((item, depth) => {
+        const link = document.createElement('button');
+        link.type = 'button';
+        link.textContent = item.name;
+        link.onclick = () => {
+            drilldownPath = drilldownPath.slice(0, depth + 1);
+            renderDrilldown();
+        };
+        breadcrumb.append(depth ? ' › ' : '', link);
+    });
+    const close = document.createElement('button');
+    close.type = 'button';
+    close.className = 'drilldown-close';
+    close.textContent = '×';
+    close.onclick = closeDrilldown;
+    breadcrumb.append(close);
+    panel.append(breadcrumb);
+    
+    const current = drilldownPath[drilldownPath.length - 1];
+    const spec = DRILLDOWN_LEVELS[current.level];
+    const table = document.createElement('table');
+    table.className = 'drilldown-table';
+    const header = table.createTHead().insertRow();
+    [spec.label].concat(spec.columns).forEach(column => {
+        const cell = document.createElement('th');
+        cell.textContent = column.replace(/_/g, ' ');
+        header.append(cell);
+    });
+    
+    const body = table.createTBody();
+    current.rows.forEach(row => {
+        const tr = body.insertRow();
+        [spec.label].concat(spec.columns).forEach(column => {
+            const value = row[column];
+            tr.insertCell().textContent = typeof value === 'number' ? value.toLocaleString() : (value ?? '');
+        });
+        if (spec.child) {
+            tr.className = 'drilldown-row';
+            tr.onclick = () => openDrilldown(drilldownPath.length, spec.child, row[spec.key], row[spec.label]);
         }
-        
-        // Sort data by sessions (descending)
-        data.sort((a, b) => b.sessions - a.sessions);
-        
-        // Get top 8 sources
-        const topSources = data.slice(0, 8);
-        
-        // Extract data for chart
-        const sources = topSources.map(item => item.sessionSource || 'Direct');
-        const sessions = topSources.map(item => item.sessions);
-        
-        // Update chart data
-        trafficSourcesChart.data.labels = sources;
-        trafficSourcesChart.data.datasets[0].data = sessions;
-        
-        // Update chart
-        trafficSourcesChart.update();
-    } catch (error) {
-        console.error('Failed to update traffic sources chart:', error);
-        throw error;
+    });
+    panel.append(table);
+    
+    if (errorMessage) {
+        const error = document.createElement('div');
+        error.className = 'error-message';
+        error.textContent = `Failed to load ${current.level}: ${errorMessage}`;
+        panel.append(error);
+    } else if (current.cursor) {
+        const more = document.createElement('button');
+        more.type = 'button';
+        more.className = 'auth-button';
+        more.textContent = 'Load more';
+        more.onclick = loadDrilldownPage;
+        panel.append(more);
+    } else if (current.rows.length === 0) {
+        const empty = document.createElement('p');
+        empty.textContent = 'No data for this period.';
+        panel.append(empty);
+    }
+}
+
+/**
+ * Fetch anomaly analysis for both sources and redraw the charts with overlays
+ */
+async function loadAnomalyOverlays(days) {
+    const [ga4, ads] = await Promise.all([
+        fetchAnomalies(days, {}),
+        fetchAnomalies(days, { source: 'ads' })
+    ]);
+    
+    if (ga4 && activeUsersChart && activeUsersRows.length) {
+        activeUsersAnalysis = ga4;
+        renderActiveUsersChart(activeUsersRows, 'none');
+    }
+    
+    if (ads && campaignPerformanceChart && campaignRows.length) {
+        const cutoff = new Date(Date.now() - CAMPAIGN_FLAG_DAYS * 86400000).toISOString().slice(0, 10);
+        flaggedCampaigns = new Set(ads.anomalies.filter(item => item.date >= cutoff).map(item => item.series));
+        renderCampaignPerformanceChart(campaignRows, 'none');
     }
 }
 
 /**
- * Update Campaign Performance chart
+ * Fetch one anomaly analysis; overlays are optional, so failures are only logged
  */
-async function updateCampaignPerformanceChart(days) {
+async function fetchAnomalies(days, params) {
     try {
-        // Fetch new data
-        const response = await fetch(`/api/analytics/ads/campaigns?days=${days}`);
-        const result = await response.json();
-        
-        if (!result.success) {
-            throw new Error(result.error || 'Failed to update campaign data');
+        return await loadReport('/api/analytics/anomalies', days, params);
+    } catch (error) {
+        console.error('Failed to load anomaly overlay:', error);
+        return null;
+    }
+}
+
+/**
+ * Subscribe to live updates for the selected date range
+ *
+ * The server sends a full 'snapshot' per report, then 'delta' events with
+ * only the changed rows, which are merged here and redrawn without animation.
+ */
+function connectLiveUpdates(days) {
+    if (liveSource) {
+        liveSource.close();
+    }
+    if (!window.EventSource) {
+        return;
+    }
+    
+    Object.keys(liveRows).forEach(topic => delete liveRows[topic]);
+    liveDays = days;
+    const source = new EventSource(apiUrl(`/api/analytics/stream?days=${days}`));
+    liveSource = source;
+    
+    // EventSource gives up on a non-200 response instead of reconnecting
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            setTimeout(function() {
+                if (liveSource === source) {
+                    connectLiveUpdates(days);
+                }
+            }, LIVE_BUSY_RETRY_MS);
         }
-        
-        // Format the data
-        const data = result.data || [];
-        
-        if (data.length === 0) {
-            throw new Error('No campaign data available');
+    };
+    
+    liveSource.addEventListener('snapshot', function(event) {
+        const message = JSON.parse(event.data);
+        const key = LIVE_TOPICS[message.topic].key;
+        liveRows[message.topic] = new Map(message.snapshot.map(row => [String(row[key]), row]));
+        renderLiveTopic(message.topic);
+    });
+    
+    liveSource.addEventListener('delta', function(event) {
+        const message = JSON.parse(event.data);
+        const rows = liveRows[message.topic];
+        if (!rows) {
+            return;
         }
         
-        // Sort data by impressions (descending)
-        data.sort((a, b) => b.impressions - a.impressions);
-        
-        // Get top 10 campaigns
-        const topCampaigns = data.slice(0, 10);
-        
-        // Extract data for chart
-        const campaigns = topCampaigns.map(item => item.campaign_name);
-        const impressions = topCampaigns.map(item => item.impressions);
-        const clicks = topCampaigns.map(item => item.clicks);
-        const conversions = topCampaigns.map(item => item.conversions);
-        
-        // Update chart data
-        campaignPerformanceChart.data.labels = campaigns;
-        campaignPerformanceChart.data.datasets[0].data = impressions;
-        campaignPerformanceChart.data.datasets[1].data = clicks;
-        campaignPerformanceChart.data.datasets[2].data = conversions;
-        
-        // Update chart
-        campaignPerformanceChart.update();
+        const key = LIVE_TOPICS[message.topic].key;
+        message.upsert.forEach(row => rows.set(String(row[key]), row));
+        message.remove.forEach(rowKey => rows.delete(rowKey));
+        renderLiveTopic(message.topic);
+    });
+}
+
+/**
+ * Redraw one chart from the rows received on the live stream
+ */
+function renderLiveTopic(topic) {
+    const data = Array.from(liveRows[topic].values());
+    if (data.length === 0) {
+        return;
+    }
+    
+    // Keep the data cache current so range switches show the live rows
+    updateReport(LIVE_TOPICS[topic].path, liveDays, data, LIVE_TOPICS[topic].params);
+    
+    try {
+        if (topic === 'active-users' && activeUsersChart) {
+            renderActiveUsersChart(data, 'none');
+        } else if (topic === 'traffic-sources' && trafficSourcesChart) {
+            renderTrafficSourcesChart(data, 'none');
+        } else if (topic === 'campaigns' && campaignPerformanceChart) {
+            renderCampaignPerformanceChart(data, 'none');
+        }
     } catch (error) {
-        console.error('Failed to update campaign performance chart:', error);
-        throw error;
+        console.error(`Failed to apply live ${topic} update:`, error);
     }
 }
 
+/**
+ * Copy values into an existing chart array in place
+ *
+ * Chart.js keeps the elements of unchanged points, so an update only
+ * animates what actually changed. Returns whether anything changed.
+ */
+function setInPlace(target, values) {
+    let changed = target.length !== values.length;
+    values.forEach((value, i) => {
+        if (target[i] !== value) {
+            target[i] = value;
+            changed = true;
+        }
+    });
+    target.length = values.length;
+    return changed;
+}
+
+/**
+ * Comparator sorting rows by a metric (descending) with the 'Other' row last
+ */
+function byMetricOtherLast(keyField, metric) {
+    return (a, b) => (a[keyField] === OTHER_KEY) - (b[keyField] === OTHER_KEY) || b[metric] - a[metric];
+}
+
 /**
  * Helper function to format date from YYYYmmdd to readable format
  */
@@ -0,0 +1,218 @@
+/**
+ * Dashboard data layer
+ *
+ * Report responses are cached per (endpoint, range) in memory and in
+ * IndexedDB, and concurrent requests for the same report share one fetch.
+ * Daily series are always fetched for the longest range, so shorter ranges
+ * are cut from the cached series without another request. Paginated reports
+ * are cached per page, keyed by their cursor.
+ */
+
+// Tenant from the page URL (?tenant=...), forwarded on every API call
+const TENANT = new URLSearchParams(window.location.search).get('tenant');
+
+// How long a cached report is used before it is fetched again (matches RESULT_CACHE_TTL)
+const REPORT_CACHE_TTL = 15 * 60 * 1000;
+
+// Daily series endpoints and their date field; shorter ranges are derived from these
+const DAILY_SERIES = {
+    '/api/analytics/active-users': 'date'
+};
+
+// Range fetched for daily series (the longest option of the date filter)
+const SERIES_FETCH_DAYS = 90;
+
+const REPORT_DB_NAME = 'allervie-analytics';
+const REPORT_STORE = 'reports';
+
+// Cached reports by URL, and fetches in flight by URL
+const reportCache = new Map();
+const pendingReports = new Map();
+let reportDb;
+
+/**
+ * Add the selected tenant to an API URL
+ * @param {string} url - API URL, possibly with a query string
+ * @returns {string} The URL scoped to the current tenant
+ */
+function apiUrl(url) {
+    if (!TENANT) {
+        return url;
+    }
+    return `${url}${url.includes('?') ? '&' : '?'}tenant=${encodeURIComponent(TENANT)}`;
+}
+
+/**
+ * Return report rows for an endpoint and range, from cache when possible
+ * @param {string} path - API endpoint, e.g. /api/analytics/active-users
+ * @param {number} days - Number of days in the range
+ * @param {Object} params - Extra query parameters
+ * @returns {Promise<*>} The response's data
+ */
+async function loadReport(path, days, params = {}) {
+    days = Number(days);
+    const dateField = DAILY_SERIES[path];
+    const url = reportUrl(path, dateField ? Math.max(days, SERIES_FETCH_DAYS) : days, params);
+
+    let entry = await readReport(url);
+    if (!entry) {
+        entry = await fetchReport(url);
+    }
+
+    if (dateField) {
+        const start = daysAgo(days);
+        return entry.data.filter(row => String(row[dateField]).replace(/-/g, '') >= start);
+    }
+    return entry.data;
+}
+
+/**
+ * Return one page of a paginated report, from cache when possible
+ * @param {string} path - API endpoint returning data and next_cursor
+ * @param {number} days - Number of days in the range
+ * @param {?string} cursor - Cursor of the page (null for the first page)
+ * @param {Object} params - Extra query parameters
+ * @returns {Promise<{rows: Array, nextCursor: ?string}>} The page and the next page's cursor
+ */
+async function loadReportPage(path, days, cursor, params = {}) {
+    const url = reportUrl(path, days, cursor ? { ...params, cursor } : params);
+
+    let entry = await readReport(url);
+    if (!entry) {
+        entry = await fetchReport(url);
+    }
+    return { rows: entry.data, nextCursor: entry.nextCursor || null };
+}
+
+/**
+ * Merge rows pushed by the live stream into the cached report
+ *
+ * Daily series are merged by date into the cached longest range, so
+ * derived ranges see the update; other reports are replaced outright.
+ */
+function updateReport(path, days, rows, params = {}) {
+    const dateField = DAILY_SERIES[path];
+    if (!dateField) {
+        storeReport(reportUrl(path, days, params), rows);
+        return;
+    }
+
+    const url = reportUrl(path, Math.max(Number(days), SERIES_FETCH_DAYS), params);
+    const entry = reportCache.get(url);
+    if (!entry) {
+        return;
+    }
+
+    const merged = new Map(entry.data.map(row => [row[dateField], row]));
+    rows.forEach(row => merged.set(row[dateField], row));
+    storeReport(url, Array.from(merged.values()), entry.fetchedAt);
+}
+
+/**
+ * Drop every cached report (on logout, so another user can't read them)
+ */
+async function clearReports() {
+    reportCache.clear();
+    const db = await openReportDb();
+    if (db) {
+        db.transaction(REPORT_STORE, 'readwrite').objectStore(REPORT_STORE).clear();
+    }
+}
+
+function reportUrl(path, days, params = {}) {
+    const query = new URLSearchParams({ days: String(days), ...params });
+    return apiUrl(`${path}?${query.toString()}`);
+}
+
+/**
+ * Fetch a report, sharing the request with any identical one in flight
+ */
+function fetchReport(url) {
+    if (!pendingReports.has(url)) {
+        const request = (async () => {
+            const response = await fetch(url);
+            const result = await response.json();
+
+            if (!result.success) {
+                throw new Error(result.error || 'Failed to load report');
+            }
+            return storeReport(url, result.data || [], Date.now(), result.next_cursor);
+        })();
+
+        pendingReports.set(url, request);
+        request.finally(() => pendingReports.delete(url)).catch(() => {});
+    }
+    return pendingReports.get(url);
+}
+
+function storeReport(url, data, fetchedAt = Date.now(), nextCursor = null) {
+    const entry = { url, data, fetchedAt };
+    if (nextCursor) {
+        entry.nextCursor = nextCursor;
+    }
+    reportCache.set(url, entry);
+
+    openReportDb().then(db => {
+        if (db) {
+            db.transaction(REPORT_STORE, 'readwrite').objectStore(REPORT_STORE).put(entry);
+        }
+    });
+    return entry;
+}
+
+/**
+ * Return a fresh cached report from memory or IndexedDB, or null
+ */
+async function readReport(url) {
+    let entry = reportCache.get(url);
+
+    if (!entry) {
+        const db = await openReportDb();
+        if (db) {
+            entry = await new Promise(resolve => {
+                const request = db.transaction(REPORT_STORE).objectStore(REPORT_STORE).get(url);
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => resolve(null);
+            });
+            if (entry) {
+                reportCache.set(url, entry);
+            }
+        }
+    }
+
+    if (!entry || Date.now() - entry.fetchedAt > REPORT_CACHE_TTL) {
+        return null;
+    }
+    return entry;
+}
+
+/**
+ * Open the IndexedDB cache; resolves to null where it's unavailable (e.g. private browsing)
+ */
+function openReportDb() {
+    if (!reportDb) {
+        reportDb = new Promise(resolve => {
+            if (!window.indexedDB) {
+                resolve(null);
+                return;
+            }
+
+            const request = indexedDB.open(REPORT_DB_NAME, 1);
+            request.onupgradeneeded = () => request.result.createObjectStore(REPORT_STORE, { keyPath: 'url' });
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => resolve(null);
+            request.onblocked = () => resolve(null);
+        });
+    }
+    return reportDb;
+}
+
+/**
+ * Return the date `days` ago as YYYYmmdd, the start of the server's range
+ */
+function daysAgo(days) {
+    const date = new Date(Date.now() - days * 86400000);
+    const month = String(date.getMonth() + 1).padStart(2, '0');
+    const day = String(date.getDate()).padStart(2, '0');
+    return `${date.getFullYear()}${month}${day}`;
+}
@@ -0,0 +1,85 @@
+"""Shared fixtures: the app with synthetic GA4/Google Ads clients and scratch storage.
+
+Nothing here reaches Google. Storage paths are read when the app modules
+are imported, so they are pointed at a temporary directory before anything
+from app/ is loaded.
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+WORKDIR = tempfile.mkdtemp(prefix='allervie-tests-')
+
+os.environ.update({
+    'RESULT_CACHE_DIR': os.path.join(WORKDIR, 'analytics_cache'),
+    'CACHE_SAVE_INTERVAL': '0',
+    'FLASK_SECRET_KEY': 'test-secret-key',
+    'GOOGLE_CLIENT_ID': 'test-client',
+    'GOOGLE_CLIENT_SECRET': 'test-secret',
+    'GA4_PROPERTY_ID': '123456789',
+    'GOOGLE_ADS_CUSTOMER_ID': '1234567890',
+    'GOOGLE_ADS_DEVELOPER_TOKEN': 'test-developer-token',
+    'TENANTS': '',
+    'ADMIN_TOKEN': ''
+})
+
+from app import auth, create_app  # noqa: E402
+from app.analytics import google_ads  # noqa: E402
+from app.analytics.cache import get_shared_cache  # noqa: E402
+from app.analytics.circuit import CircuitBreaker  # noqa: E402
+from app.auth.vault import get_credential_vault  # noqa: E402
+from loadtest import fake_google  # noqa: E402
+
+fake_google.install()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """A fresh app over an empty result cache, with closed circuit breakers"""
+    for name in list(google_ads._breakers):
+        monkeypatch.setitem(google_ads._breakers, name, CircuitBreaker(name))
+
+    # The session directory is relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+
+    google_ads._query_cache.invalidate()
+    conn = get_shared_cache()._connect()
+    conn.execute('DELETE FROM results')
+    conn.execute('DELETE FROM invalidations')
+
+
+@pytest.fixture
+def make_credentials():
+    """Build OAuth credentials like the ones a login stores"""
+    def make(refresh_token='test-refresh-token', expires_in=3600, scopes=None):
+        return auth.Credentials(
+            token=f"token-for-{refresh_token}",
+            refresh_token=refresh_token,
+            token_uri='https://oauth2.googleapis.com/token',
+            client_id='test-client',
+            client_secret='test-secret',
+            scopes=scopes or ['https://www.googleapis.com/auth/adwords', 'https://www.googleapis.com/auth/analytics.readonly'],
+            expiry=datetime.utcnow() + timedelta(seconds=expires_in)
+        )
+    return make
+
+
+@pytest.fixture
+def anonymous(app):
+    """A client without a session"""
+    return app.test_client()
+
+
+@pytest.fixture
+def client(app, make_credentials):
+    """A client logged in as a user whose credentials are in the vault"""
+    client = app.test_client()
+    credential_id = get_credential_vault(app).store(make_credentials())
+    with client.session_transaction() as flask_session:
+        flask_session['credential_id'] = credential_id
+    return client
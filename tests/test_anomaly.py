@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from app.analytics import anomaly
+
+
+def daily_rows(days, value, series='1', start=date(2025, 1, 1)):
+    """Google Ads style rows with a small weekly pattern"""
+    return [
+        {'date': (start + timedelta(days=offset)).isoformat(), 'campaign_id': series, 'clicks': value(offset)}
+        for offset in range(days)
+    ]
+
+
+def test_to_frame_pivots_series_and_fills_missing_days():
+    rows = [
+        {'date': '20250101', 'campaign_id': 'a', 'clicks': 2},
+        {'date': '20250103', 'campaign_id': 'b', 'clicks': 5}
+    ]
+
+    frame = anomaly.to_frame(rows, ['clicks'], 'campaign_id', date(2025, 1, 1), date(2025, 1, 4))
+
+    assert list(frame.columns) == [('a', 'clicks'), ('b', 'clicks')]
+    assert frame[('a', 'clicks')].tolist() == [2.0, 0.0, 0.0, 0.0]
+    assert frame[('b', 'clicks')].tolist() == [0.0, 0.0, 5.0, 0.0]
+    assert anomaly.to_frame([], ['clicks']).empty
+
+
+def test_detect_flags_a_spike_but_not_the_weekly_pattern():
+    rows = daily_rows(60, lambda day: 500 if day == 55 else (100 if day % 7 else 40))
+    frame = anomaly.to_frame(rows, ['clicks'], 'campaign_id')
+
+    flags = anomaly.detect(frame)[3]
+
+    assert np.flatnonzero(flags[:, 0]).tolist() == [55]
+
+
+def test_forecast_follows_the_weekday_pattern():
+    rows = daily_rows(56, lambda day: 100 if day % 7 else 40)
+    frame = anomaly.to_frame(rows, ['clicks'], 'campaign_id')
+
+    dates, predicted, lower, upper = anomaly.forecast(frame)
+
+    assert len(dates) == anomaly.FORECAST_DAYS
+    assert dates[0] == frame.index[-1] + np.timedelta64(1, 'D')
+    assert min(predicted[:, 0]) < max(predicted[:, 0])
+    assert (lower <= predicted).all() and (predicted <= upper).all()
+
+
+def test_analyze_reports_recent_anomalies_with_labels_and_detail():
+    rows = daily_rows(60, lambda day: 500 if day == 55 else 100)
+    frame = anomaly.to_frame(rows, ['clicks'], 'campaign_id')
+
+    result = anomaly.analyze(frame, since=date(2025, 2, 20), detail={'1'}, labels={'1': 'Brand'})
+
+    assert [(item['label'], item['date'], item['direction']) for item in result['anomalies']] == [('Brand', '2025-02-25', 'spike')]
+    detail = result['series']['1']['clicks']
+    assert detail['dates'][0] == '2025-02-20'
+    assert len(detail['forecast']) == anomaly.FORECAST_DAYS
+    assert anomaly.analyze(frame, since=date(2025, 2, 26))['anomalies'] == []
+
+
+def test_anomalies_endpoint_analyses_ga4_and_ads(client):
+    ga4 = client.get('/api/analytics/anomalies?days=14')
+    ads = client.get('/api/analytics/anomalies?source=ads&days=14&detail=1000')
+
+    assert ga4.status_code == ads.status_code == 200
+    assert set(ga4.get_json()['data']['series']) == {'total'}
+    assert set(ads.get_json()['data']['series']) == {'1000'}
+
+
+def test_anomalies_endpoint_rejects_unknown_sources(client):
+    response = client.get('/api/analytics/anomalies?source=facebook')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'Unknown source: facebook'}
+
+
+@pytest.mark.parametrize('days', [0, -7, 366])
+def test_anomalies_endpoint_rejects_out_of_range_days(client, days):
+    response = client.get(f'/api/analytics/anomalies?days={days}')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'days must be between 1 and 365'}
+
+
+def test_anomalies_endpoint_requires_login(anonymous):
+    assert anonymous.get('/api/analytics/anomalies').status_code == 401
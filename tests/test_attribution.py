@@ -0,0 +1,73 @@
+import pytest
+
+from app.analytics import attribution
+from app.analytics.google_ads import resolve_fields
+
+ADS_ROWS = [
+    {'date': '2025-01-01', 'campaign_id': '1', 'campaign_name': 'Brand', 'cost': 10.0, 'clicks': 5.0,
+     'conversions': 1.0, 'conversion_value': 40.0},
+    {'date': '2025-01-02', 'campaign_id': '1', 'campaign_name': 'Brand', 'cost': 10.0, 'clicks': 4.0,
+     'conversions': 0.0, 'conversion_value': 0.0},
+    {'date': '2025-01-01', 'campaign_id': '2', 'campaign_name': 'Generic', 'cost': 0.0, 'clicks': 0.0,
+     'conversions': 0.0, 'conversion_value': 0.0}
+]
+
+GA4_ROWS = [
+    {'date': '20250101', 'sessionGoogleAdsCampaignId': '1', 'sessionGoogleAdsCampaignName': 'Brand',
+     'sessions': 8.0, 'conversions': 1.0, 'totalRevenue': 50.0},
+    {'date': '20250102', 'sessionGoogleAdsCampaignId': '(not set)', 'sessionGoogleAdsCampaignName': 'brand',
+     'sessions': 2.0, 'conversions': 0.0, 'totalRevenue': 10.0},
+    {'date': '20250101', 'sessionGoogleAdsCampaignId': '(not set)', 'sessionGoogleAdsCampaignName': '(organic)',
+     'sessions': 100.0, 'conversions': 3.0, 'totalRevenue': 300.0}
+]
+
+
+def test_ads_fields_resolve_for_campaigns():
+    assert resolve_fields('campaign', attribution.ADS_FIELDS)[-1] == 'metrics.conversions_value'
+
+
+def test_attribute_joins_sessions_to_campaigns_by_id_and_name():
+    rows = attribution.attribute(ADS_ROWS, GA4_ROWS)
+
+    assert [row['campaign_id'] for row in rows] == ['1', '2']
+    brand = rows[0]
+    assert brand['sessions'] == 10.0
+    assert brand['ads_conversions_value'] == 40.0
+    assert brand['cost_per_session'] == 2.0
+    assert brand['roas'] == 2.0
+    assert brand['blended_roas'] == 3.0
+    assert rows[1]['roas'] is None
+
+
+def test_attribute_by_day_and_campaign_filter():
+    rows = attribution.attribute(ADS_ROWS, GA4_ROWS, group='day', campaign_ids=['1'])
+
+    assert [(row['date'], row['sessions']) for row in rows] == [('2025-01-01', 8.0), ('2025-01-02', 2.0)]
+
+    with pytest.raises(ValueError):
+        attribution.attribute(ADS_ROWS, GA4_ROWS, group='week')
+
+
+def test_attribution_endpoint_returns_campaign_rows(client):
+    response = client.get('/api/analytics/attribution?days=3')
+
+    assert response.status_code == 200
+    rows = response.get_json()['data']
+    assert {str(1000 + index) for index in range(60)} <= {row['campaign_id'] for row in rows}
+    assert {'cost', 'ads_conversions_value', 'sessions', 'roas', 'blended_roas'} <= set(rows[0])
+
+
+def test_attribution_endpoint_filters_and_groups_by_day(client):
+    response = client.get('/api/analytics/attribution?days=3&group=day&campaign_id=1000')
+
+    assert response.status_code == 200
+    rows = response.get_json()['data']
+    assert {row['campaign_id'] for row in rows} == {'1000'}
+    assert len(rows) == 4
+
+
+def test_attribution_endpoint_rejects_unknown_grouping(client):
+    response = client.get('/api/analytics/attribution?group=week')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,86 @@
+import os
+import time
+
+import pytest
+
+from app.analytics.cache import SharedResultCache
+from app.analytics.cachefile import CacheFile, CacheFileError, write_cache_file
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache' / 'results.avrc')
+
+
+def rows(count, ttl=600):
+    return [(f"key-{index}", f"value-{index}".encode('utf-8') * 10, time.time() + ttl) for index in range(count)]
+
+
+def test_roundtrip_serves_live_entries(path):
+    assert write_cache_file(path, rows(3) + [('expired', b'old', time.time() - 1)], 1) == 4
+
+    cache_file = CacheFile(path, 1)
+
+    assert len(cache_file) == 4
+    assert cache_file.get('key-1')[0] == b'value-1' * 10
+    assert cache_file.get('expired') is None
+    assert cache_file.get('missing') is None
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]
+
+
+def test_truncated_file_serves_its_complete_records(path):
+    write_cache_file(path, rows(3), 1)
+    with open(path, 'r+b') as file:
+        file.truncate(os.path.getsize(path) - 5)
+
+    cache_file = CacheFile(path, 1)
+
+    assert len(cache_file) == 2
+    assert cache_file.get('key-1') is not None and cache_file.get('key-2') is None
+
+
+def test_corrupt_values_are_skipped(path):
+    write_cache_file(path, rows(1), 1)
+    with open(path, 'r+b') as file:
+        file.seek(-3, os.SEEK_END)
+        file.write(b'\xff\xff\xff')
+
+    assert CacheFile(path, 1).get('key-0') is None
+
+
+@pytest.mark.parametrize('content', [b'', b'AVRC', b'NOPE' + b'\0' * 10])
+def test_unreadable_files_are_rejected(path, content):
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as file:
+        file.write(content)
+
+    with pytest.raises(CacheFileError):
+        CacheFile(path, 1)
+
+
+def test_files_of_another_schema_are_rejected(path):
+    write_cache_file(path, rows(1), 1)
+
+    with pytest.raises(CacheFileError, match='schema 1, not 2'):
+        CacheFile(path, 2)
+    with pytest.raises(CacheFileError):
+        CacheFile(path + '.missing', 1)
+
+
+def test_a_new_database_is_warmed_from_the_saved_file(tmp_path, path):
+    old = SharedResultCache(str(tmp_path / 'old.sqlite3'), cache_file=path)
+    old.set_bytes('tenant:a:report', b'{"success": true}', ttl=600)
+    old.set_bytes('tenant:b:report', b'{"success": true}', ttl=600)
+    old.set_bytes('tenant:a:soon', b'{}', ttl=10)
+    assert old.add('tenant:a:report:lease', 1, ttl=600)
+    assert old.save() == 2
+
+    new = SharedResultCache(str(tmp_path / 'new.sqlite3'), cache_file=path)
+    new.invalidate('tenant:b:')
+
+    assert new.get_bytes('tenant:a:report') == b'{"success": true}'
+    assert new.get_bytes('tenant:b:report') is None
+    assert new.get_bytes('tenant:a:soon') is None
+    assert new.add('tenant:a:report:lease', 2, ttl=600)
+    assert new.restored == 1
+    assert new.stats()['cache_file']['entries'] == 2
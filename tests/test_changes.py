@@ -0,0 +1,125 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.analytics import changes
+from app.analytics.changes import ChangeTracker, is_settled, settled_before
+from app.analytics.tenants import get_tenant
+
+
+def change(campaign, ad_group=None, at='2025-01-01 10:00:00', resource=None):
+    return {
+        'change_status_resource_name': resource or f"customers/1/changeStatus/{campaign}~{ad_group}",
+        'change_status_last_change_date_time': at,
+        'change_status_campaign': f"customers/1/campaigns/{campaign}" if campaign else None,
+        'change_status_ad_group': f"customers/1/adGroups/{ad_group}" if ad_group else None
+    }
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000000.0)
+    monkeypatch.setattr(changes, 'time', SimpleNamespace(time=lambda: clock.now, monotonic=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def tracker(app, make_credentials, clock, monkeypatch):
+    """A tracker whose change_status queries return tracker.rows"""
+    tenant = get_tenant(app)
+    tracker = ChangeTracker(tenant, interval=60)
+    tracker.credentials = make_credentials()
+    tracker.rows = []
+    monkeypatch.setattr(tenant, 'google_ads', lambda credentials, watch=True: SimpleNamespace(
+        iter_search=lambda query: iter([list(tracker.rows)])
+    ))
+    return tracker
+
+
+def poll(tracker, clock, rows):
+    clock.now += 120
+    tracker.rows = rows
+    tracker._state = tracker._poll(tracker._state)
+    return tracker._state
+
+
+def test_settled_ranges_end_before_recent_days():
+    old = (settled_before() - timedelta(days=1)).isoformat()
+    today = date.today().isoformat()
+
+    assert is_settled(f"SELECT x FROM campaign WHERE segments.date BETWEEN '2025-01-01' AND '{old}'")
+    assert not is_settled(f"SELECT x FROM campaign WHERE segments.date BETWEEN '2025-01-01' AND '{today}'")
+    assert not is_settled("SELECT x FROM campaign")
+
+
+def test_edits_bump_only_the_changed_campaign_and_ad_group(tracker, clock):
+    started = poll(tracker, clock, [change(1)])['started']
+    assert tracker.version(campaign_id=1) == tracker.version(campaign_id=2) == f"v{started}"
+
+    poll(tracker, clock, [change(1), change(5, 50, at='2025-01-01 11:00:00')])
+
+    assert tracker.version(campaign_id=5) == tracker.version(ad_group_id=50) == f"v{clock.now}"
+    assert tracker.version(campaign_id=2) == f"v{started}"
+    assert tracker.version() == f"v{clock.now}"
+    assert tracker.changed_campaigns(started) == {'5'}
+    assert tracker.changes == 1
+
+
+def test_records_at_the_high_water_mark_are_not_applied_twice(tracker, clock):
+    poll(tracker, clock, [change(1)])
+    first = poll(tracker, clock, [change(5, at='2025-01-01 11:00:00')])['account']
+
+    poll(tracker, clock, [change(5, at='2025-01-01 11:00:00')])
+
+    assert tracker.version() == f"v{first}"
+    assert tracker.changes == 1
+
+
+def test_changes_without_a_campaign_restart_every_version(tracker, clock):
+    poll(tracker, clock, [])
+    poll(tracker, clock, [change(5, at='2025-01-01 11:00:00')])
+
+    state = poll(tracker, clock, [change(None, resource='customers/1/sharedSets/9', at='2025-01-01 12:00:00')])
+
+    assert state['started'] == clock.now and state['campaigns'] == {}
+    assert tracker.changed_campaigns(clock.now - 120) is None
+
+
+def test_query_versions_follow_the_filtered_resource(tracker, clock):
+    poll(tracker, clock, [])
+    poll(tracker, clock, [change(5, 50, at='2025-01-01 11:00:00')])
+    settled = (settled_before() - timedelta(days=1)).isoformat()
+
+    label, ttl = tracker.query_version(
+        f"SELECT x FROM keyword_view WHERE ad_group.id = 50 AND campaign.id = 5 "
+        f"AND segments.date BETWEEN '2025-01-01' AND '{settled}'"
+    )
+
+    assert label == f"v{clock.now}"
+    assert ttl == changes.ADS_SETTLED_CACHE_TTL
+    assert tracker.query_version("SELECT x FROM campaign WHERE campaign.id = 6")[1] is None
+
+
+def test_stale_state_disables_versioning(tracker, clock):
+    poll(tracker, clock, [])
+    assert tracker.version() != ''
+
+    clock.now += tracker.interval * changes.STALE_INTERVALS + 1
+
+    assert tracker.version() == ''
+    assert tracker.query_version("SELECT x FROM campaign") == ('', None)
+    assert tracker.stats()['active'] is False
+
+
+def test_workers_share_one_poll_per_interval(tracker, clock):
+    state = tracker._refresh()
+    other = ChangeTracker(tracker.tenant, interval=60)
+
+    assert other._refresh() == state
+    assert (tracker.polls, other.polls) == (1, 0)
+
+    # Due again, but the first worker's lease hasn't expired
+    clock.now += 120
+    assert other._refresh() == state
+    assert other.polls == 0
@@ -0,0 +1,159 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.analytics import circuit, google_ads
+from app.analytics.circuit import CircuitBreaker, order_backends
+from app.analytics.google_ads import AdsRequestError
+from loadtest.fake_google import FakeGoogleAdsAnalytics
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(circuit, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_breaker_opens_on_error_rate_and_recovers_through_one_probe(clock):
+    breaker = CircuitBreaker('grpc', min_calls=3, error_threshold=0.5, open_seconds=60)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.is_open()
+    assert not breaker.allow_request()
+
+    clock.now += 61
+    assert not breaker.is_open()
+    assert breaker.allow_request()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow_request()
+
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['times_opened'] == 1
+
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker('grpc', min_calls=1, open_seconds=60)
+    breaker.record_failure(0.1)
+    clock.now += 61
+    assert breaker.allow_request()
+
+    breaker.record_failure(0.1)
+    assert breaker.is_open()
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_lost_probe_is_retried_after_open_seconds(clock):
+    breaker = CircuitBreaker('grpc', min_calls=1, open_seconds=60)
+    breaker.record_failure(0.1)
+    clock.now += 61
+    assert breaker.allow_request()
+
+    clock.now += 61
+    assert breaker.allow_request()
+
+
+def test_order_backends_prefers_healthy_then_fast_backends():
+    breakers = {name: CircuitBreaker(name) for name in ('grpc', 'rest')}
+    assert order_backends(breakers, ['grpc', 'rest']) == ['grpc', 'rest']
+
+    breakers['grpc'].record_success(2.0)
+    breakers['rest'].record_success(0.5)
+    assert order_backends(breakers, ['grpc', 'rest']) == ['rest', 'grpc']
+
+    for _ in range(3):
+        breakers['rest'].record_failure(0.1)
+    assert order_backends(breakers, ['grpc', 'rest']) == ['grpc', 'rest']
+
+
+@pytest.fixture
+def ads(app, make_credentials):
+    client = FakeGoogleAdsAnalytics(make_credentials(), '1234567890', 'token')
+    client._available_backends = lambda: ['grpc', 'rest']
+    return client
+
+
+def test_transport_failures_fall_back_and_count_against_the_backend(ads):
+    def call(backend):
+        if backend == 'grpc':
+            raise ConnectionError('unavailable')
+        return backend
+
+    assert ads._run_with_breakers(call) == 'rest'
+    assert google_ads._breakers['grpc'].stats()['failures'] == 1
+    assert google_ads._breakers['rest'].stats()['calls'] == 1
+
+
+def test_rejected_requests_are_not_retried_or_counted_against_the_backend(ads):
+    used = []
+
+    def call(backend):
+        used.append(backend)
+        raise AdsRequestError('USER_PERMISSION_DENIED')
+
+    with pytest.raises(AdsRequestError):
+        ads._run_with_breakers(call)
+    assert used == ['grpc']
+    assert google_ads._breakers['grpc'].stats()['failures'] == 0
+    assert google_ads._breakers['rest'].stats()['failures'] == 0
+
+
+def test_rejected_streams_are_not_retried(ads, monkeypatch):
+    used = []
+
+    def reject(backend):
+        def stream(query, fields):
+            used.append(backend)
+            raise AdsRequestError('QUERY_ERROR')
+            yield
+        return stream
+
+    monkeypatch.setattr(ads, '_stream_grpc', reject('grpc'), raising=False)
+    monkeypatch.setattr(ads, '_stream_rest', reject('rest'), raising=False)
+
+    with pytest.raises(AdsRequestError):
+        list(ads.iter_search('SELECT campaign.id FROM campaign'))
+    assert used == ['grpc']
+
+
+def test_search_stream_has_a_deadline(make_credentials):
+    calls = []
+    service = SimpleNamespace(search_stream=lambda **kwargs: calls.append(kwargs) or [])
+    ads = FakeGoogleAdsAnalytics.__bases__[0].__new__(FakeGoogleAdsAnalytics.__bases__[0])
+    ads.customer_id = '1234567890'
+    ads.client = SimpleNamespace(get_service=lambda name: service)
+
+    assert list(ads._stream_grpc('SELECT campaign.id FROM campaign', ['campaign.id'])) == []
+    assert calls[0]['timeout'] == google_ads.GRPC_STREAM_TIMEOUT
+
+
+def test_open_backends_are_skipped(ads):
+    for _ in range(3):
+        google_ads._breakers['grpc'].record_failure(0.1)
+    used = []
+
+    assert ads._run_with_breakers(lambda backend: used.append(backend) or backend) == 'rest'
+    assert used == ['rest']
+
+
+def test_metrics_endpoint_is_disabled_without_admin_token(client):
+    response = client.get('/api/analytics/metrics')
+
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
+
+
+def test_metrics_endpoint_requires_the_admin_token(app, client):
+    app.config['ADMIN_TOKEN'] = 'admin-secret'
+
+    assert client.get('/api/analytics/metrics').status_code == 403
+    assert client.get('/api/analytics/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+    response = client.get('/api/analytics/metrics', headers={'Authorization': 'Bearer admin-secret'})
+    assert response.status_code == 200
+    assert set(response.get_json()['data']['ads_backends']) == {'grpc', 'rest'}
@@ -0,0 +1,67 @@
+import pytest
+
+from app.analytics.cursors import InvalidCursorError, decode_cursor, encode_cursor
+
+POSITION = {'page_token': 'abc', 'offset': 50}
+
+
+def test_cursor_roundtrip():
+    cursor = encode_cursor('secret', 'scope', POSITION)
+
+    assert '=' not in cursor
+    assert decode_cursor('secret', 'scope', cursor) == POSITION
+
+
+@pytest.mark.parametrize('secret, scope', [('secret', 'other scope'), ('other secret', 'scope')])
+def test_cursor_is_bound_to_its_scope_and_secret(secret, scope):
+    cursor = encode_cursor('secret', 'scope', POSITION)
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(secret, scope, cursor)
+
+
+def test_tampered_and_malformed_cursors_are_rejected():
+    cursor = encode_cursor('secret', 'scope', POSITION)
+    tampered = cursor[:-2] + ('AA' if cursor[-2:] != 'AA' else 'BB')
+
+    for bad in (tampered, 'short', '***'):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor('secret', 'scope', bad)
+
+
+def page_through(client, path):
+    rows, cursor, pages = [], None, 0
+    while True:
+        response = client.get(path + (f"&cursor={cursor}" if cursor else ''))
+        assert response.status_code == 200
+        body = response.get_json()
+        rows.extend(body['data'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return rows, pages
+
+
+def test_drilldown_pages_across_google_ads_pages(client):
+    # 1500 keywords come in Google Ads pages of 1000; a page never spans two
+    rows, pages = page_through(client, '/api/analytics/ads/ad-groups/1000/keywords?days=7&limit=400')
+
+    assert pages == 5
+    assert len(rows) == 1500
+    assert len({row['keyword_id'] for row in rows}) == 1500
+
+
+def test_drilldown_rejects_cursors_for_another_query(client):
+    cursor = client.get('/api/analytics/ads/campaigns/1000/ad-groups?days=7&limit=10').get_json()['next_cursor']
+
+    assert client.get(f'/api/analytics/ads/campaigns/1000/ad-groups?days=7&limit=10&cursor={cursor}').status_code == 200
+    response = client.get(f'/api/analytics/ads/campaigns/1001/ad-groups?days=7&limit=10&cursor={cursor}')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'Invalid cursor for this request'}
+
+
+def test_drilldown_rejects_unknown_fields(client):
+    response = client.get('/api/analytics/ads/campaigns/1000/ad-groups?fields=bogus')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,22 @@
+def test_index_loads_the_data_layer_before_the_dashboard(anonymous):
+    page = anonymous.get('/').get_data(as_text=True)
+
+    assert page.index('js/data.js') < page.index('js/dashboard.js')
+    for script in ('data.js', 'dashboard.js'):
+        response = anonymous.get(f'/static/js/{script}')
+        assert response.status_code == 200
+        response.close()
+
+
+def test_shorter_windows_are_a_suffix_of_longer_ones(client):
+    # The data layer derives a 7 day range from a cached 30 day series
+    week = client.get('/api/analytics/active-users?days=7').get_json()['data']
+    month = client.get('/api/analytics/active-users?days=30').get_json()['data']
+
+    assert len(month) == 31
+    assert month[-len(week):] == week
+
+
+def test_auth_status_reports_the_login_url(anonymous, client):
+    assert anonymous.get('/api/auth/status').get_json() == {'authenticated': False, 'auth_url': '/auth/login'}
+    assert client.get('/api/auth/status').get_json() == {'authenticated': True}
@@ -0,0 +1,71 @@
+import numpy as np
+
+from app.analytics.downsample import OTHER_KEY, downsample, lttb, top_n
+
+CAMPAIGNS = [
+    {'campaign_id': str(index), 'campaign_name': f"Campaign {index}", 'clicks': float(index),
+     'impressions': 10.0 * index, 'ctr': 10.0, 'status': 'ENABLED'}
+    for index in range(1, 6)
+]
+
+
+def test_top_n_sums_the_rest_into_other():
+    rows = top_n(CAMPAIGNS, 'clicks', 2, 'campaign_id', 'campaign_name')
+
+    assert [row['campaign_id'] for row in rows] == ['5', '4', OTHER_KEY]
+    other = rows[-1]
+    assert other['campaign_name'] == 'Other (3)'
+    assert other['clicks'] == 6.0 and other['impressions'] == 60.0
+    assert other['ctr'] == 10.0
+    assert 'status' not in other
+
+
+def test_top_n_keeps_a_single_leftover_row():
+    rows = top_n(CAMPAIGNS, 'clicks', 4, 'campaign_id')
+
+    assert len(rows) == 5 and OTHER_KEY not in [row['campaign_id'] for row in rows]
+
+
+def test_lttb_keeps_the_ends_and_a_spike():
+    values = np.zeros(1000)
+    values[437] = 50.0
+
+    kept = lttb(values, 20)
+
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert 437 in kept
+    assert (np.diff(kept) > 0).all()
+    assert len(lttb(values, 2000)) == 1000
+
+
+def test_downsample_sorts_and_bounds_rows():
+    rows = [{'date': f"2025{day:04d}", 'users': float(day % 7)} for day in range(300, 0, -1)]
+
+    sampled = downsample(rows, 'date', ['users'], 50)
+
+    assert len(sampled) == 50
+    assert sampled == sorted(sampled, key=lambda row: row['date'])
+    assert downsample(rows, 'date', ['users'], None)[0]['date'] == '20250001'
+
+
+def test_active_users_endpoint_downsamples_to_points(client):
+    data = client.get('/api/analytics/active-users?days=90&points=30').get_json()['data']
+
+    assert len(data) == 30
+    assert data[0]['date'] < data[-1]['date']
+
+
+def test_traffic_sources_endpoint_returns_top_sources(client):
+    data = client.get('/api/analytics/traffic-sources?days=7&top=5').get_json()['data']
+
+    assert len(data) == 6
+    assert data[-1]['sessionSource'] == OTHER_KEY
+    assert [row['sessions'] for row in data[:5]] == sorted((row['sessions'] for row in data[:5]), reverse=True)
+
+
+def test_campaigns_endpoint_rejects_top_by_an_unrequested_field(client):
+    response = client.get('/api/analytics/ads/campaigns?fields=campaign_name,clicks&top=5&sort=cost')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
@@ -0,0 +1,72 @@
+import csv
+import io
+
+import pyarrow.parquet as pq
+import pytest
+
+from app.analytics import export
+
+
+def test_rebatch_regroups_rows_into_chunks():
+    chunks = list(export.rebatch([[1, 2], [3], [4, 5, 6], [7]], size=3))
+
+    assert chunks == [[1, 2, 3], [4, 5, 6], [7]]
+
+
+def test_iter_csv_yields_the_header_then_one_chunk_per_batch():
+    chunks = list(export.iter_csv([[{'date': '20250101', 'sessions': 3.0, 'extra': 'x'}], []], ['date', 'sessions']))
+
+    assert chunks == [b'date,sessions\r\n', b'20250101,3.0\r\n', b'']
+
+
+def test_write_parquet_keeps_one_schema_across_row_groups(tmp_path):
+    path = tmp_path / 'export.parquet'
+    batches = [[{'campaign_id': 1, 'clicks': 2.0}], [{'campaign_id': '2', 'clicks': None}]]
+
+    assert export.write_parquet(batches, ['campaign_id', 'clicks'], {'clicks'}, str(path)) == 2
+    table = pq.read_table(path)
+    assert table.num_rows == 2
+    assert table.column('campaign_id').to_pylist() == ['1', '2']
+    assert table.column('clicks').to_pylist() == [2.0, None]
+
+
+@pytest.mark.parametrize('names', [[], ['date', 'bad name']])
+def test_invalid_ga4_names_are_rejected(names):
+    with pytest.raises(ValueError):
+        export.validate_ga4_names(names, 'dimension')
+
+
+def test_ga4_export_streams_csv(client):
+    response = client.get('/api/analytics/export/ga4?days=2&dimensions=date&metrics=sessions')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'attachment; filename="ga4-' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 3
+    assert set(rows[0]) == {'date', 'sessions'}
+
+
+def test_ads_export_writes_parquet(client):
+    response = client.get('/api/analytics/export/ads?days=1&resource=ad_group&fields=ad_group_name,clicks&format=parquet')
+
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.num_rows == 300
+    assert table.column_names == ['campaign_id', 'ad_group_id', 'ad_group_name', 'clicks']
+
+
+@pytest.mark.parametrize('url', [
+    '/api/analytics/export/ga4?format=xlsx',
+    '/api/analytics/export/ga4?dimensions=bad-name',
+    '/api/analytics/export/ads?resource=campaign_budget'
+])
+def test_export_rejects_invalid_parameters(client, url):
+    response = client.get(url)
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_export_requires_login(anonymous):
+    assert anonymous.get('/api/analytics/export/ads').status_code == 401
@@ -0,0 +1,150 @@
+from datetime import date
+
+import pytest
+
+from app.analytics import google_ads
+from app.analytics.cache import ResultCache
+from app.analytics.google_ads import GaqlQuery, decode_row, resolve_fields
+from loadtest.fake_google import FakeGoogleAdsAnalytics
+
+
+def test_query_builds_normalized_gaql():
+    query = GaqlQuery('campaign', ['metrics.clicks', 'campaign.name'])
+    query.where('campaign.status', '=', 'ENABLED').during(date(2025, 1, 1), date(2025, 1, 31))
+    query.order_by('metrics.clicks').limit(10)
+
+    assert query.build() == (
+        "SELECT campaign.id, campaign.name, metrics.clicks FROM campaign "
+        "WHERE campaign.status = 'ENABLED' AND segments.date BETWEEN '2025-01-01' AND '2025-01-31' "
+        "ORDER BY metrics.clicks DESC LIMIT 10"
+    )
+
+
+def test_query_escapes_literals_and_formats_lists():
+    query = GaqlQuery('campaign', ['campaign.name'])
+    query.where('campaign.name', 'like', "O'Brien%").where('campaign.id', 'in', [1, 2])
+
+    assert "campaign.name LIKE 'O\\'Brien%'" in query.build()
+    assert 'campaign.id IN (1, 2)' in query.build()
+
+
+@pytest.mark.parametrize('build', [
+    lambda: GaqlQuery('campaign_budget'),
+    lambda: GaqlQuery('campaign', ['campaign.name; DROP']),
+    lambda: GaqlQuery('campaign').where('campaign.id', 'BETWEEN', 1),
+    lambda: GaqlQuery('campaign', ['campaign.name']).order_by('metrics.clicks')
+])
+def test_query_rejects_invalid_input(build):
+    with pytest.raises(ValueError):
+        build()
+
+
+def test_resolve_fields_maps_columns_and_passes_gaql_fields():
+    assert resolve_fields('campaign', ['campaign_name', 'cost', 'conversion_value', ' ', 'metrics.ctr']) == [
+        'campaign.name', 'metrics.cost_micros', 'metrics.conversions_value', 'metrics.ctr'
+    ]
+    assert resolve_fields('keyword_view', ['keyword_id', 'keyword_text']) == [
+        'ad_group_criterion.criterion_id', 'ad_group_criterion.keyword.text'
+    ]
+
+
+@pytest.mark.parametrize('resource, names, message', [
+    ('campaign', ['conversions_value'], "Unknown field 'conversions_value'"),
+    ('campaign', ['metrics.Clicks'], 'Invalid GAQL field'),
+    ('campaign_budget', ['clicks'], 'Unsupported GAQL resource')
+])
+def test_resolve_fields_rejects_unknown_fields(resource, names, message):
+    with pytest.raises(ValueError, match=message):
+        resolve_fields(resource, names)
+
+
+def test_decode_row_converts_rest_values():
+    row = {
+        'campaign': {'id': '42', 'name': 'Brand', 'status': 'ENABLED'},
+        'metrics': {'costMicros': '2500000', 'averageCpc': '500000', 'ctr': 0.125, 'clicks': '7'}
+    }
+    fields = ['campaign.id', 'campaign.name', 'campaign.status', 'metrics.cost_micros',
+              'metrics.average_cpc', 'metrics.ctr', 'metrics.clicks', 'metrics.conversions']
+
+    assert decode_row(row, fields) == {
+        'campaign_id': '42',
+        'campaign_name': 'Brand',
+        'campaign_status': 'ENABLED',
+        'cost': 2.5,
+        'average_cpc': 0.5,
+        'ctr': 12.5,
+        'clicks': 7.0,
+        'conversions': 0.0
+    }
+
+
+def test_result_cache_expires_and_evicts_least_recently_used():
+    cache = ResultCache(ttl=60, max_entries=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    cache.set('d', 4, ttl=-1)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is None
+    assert cache.get('c') == 3
+    assert cache.get('d') is None
+    assert cache.stats()['entries'] == 1
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def test_rest_backend_follows_page_tokens(monkeypatch, make_credentials):
+    pages = {
+        None: {'results': [{'campaign': {'id': '1'}}], 'nextPageToken': 'p2'},
+        'p2': {'results': [{'campaign': {'id': '2'}}]}
+    }
+    monkeypatch.setattr(google_ads.requests, 'post', lambda url, headers, json, timeout: FakeResponse(pages[json.get('pageToken')]))
+    client = FakeGoogleAdsAnalytics(make_credentials(), '1234567890', 'token')
+
+    assert client._search_rest('SELECT campaign.id FROM campaign', ['campaign.id']) == [
+        {'campaign_id': '1'}, {'campaign_id': '2'}
+    ]
+
+
+def test_search_caches_by_normalized_query(app, make_credentials):
+    client = FakeGoogleAdsAnalytics(make_credentials(), '1234567890', 'token', query_cache=ResultCache(ttl=60))
+    calls = []
+    client._search_grpc = lambda query, fields: calls.append(query) or [{'campaign_id': '1'}]
+
+    client.search('SELECT campaign.id\n FROM campaign')
+    client.search('SELECT  campaign.id FROM campaign')
+
+    assert calls == ['SELECT campaign.id FROM campaign']
+
+
+def test_campaigns_endpoint_projects_requested_fields(client):
+    response = client.get('/api/analytics/ads/campaigns?days=7&fields=campaign_name,clicks')
+
+    assert response.status_code == 200
+    rows = response.get_json()['data']
+    assert len(rows) == 60
+    assert set(rows[0]) == {'campaign_id', 'campaign_name', 'clicks'}
+
+
+def test_campaigns_endpoint_rejects_unknown_fields(client):
+    response = client.get('/api/analytics/ads/campaigns?fields=campaign_name,bogus')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': "Unknown field 'bogus' for campaign"}
+
+
+def test_campaigns_endpoint_requires_login(anonymous):
+    response = anonymous.get('/api/analytics/ads/campaigns')
+
+    assert response.status_code == 401
+    assert response.get_json()['success'] is False
@@ -0,0 +1,150 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.analytics import jobs
+from app.analytics.jobs import JobRunner, JobStore
+from app.analytics.tenants import get_tenant
+from app.auth.vault import get_credential_vault
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'))
+
+
+def test_store_keeps_params_and_results_as_json(store):
+    job_id = store.create('ga4_report', {'days': 7}, 'owner')
+    store.update(job_id, status='succeeded', result={'data': [1]})
+
+    job = store.get(job_id)
+    assert job['params'] == {'days': 7}
+    assert job['result'] == {'data': [1]}
+    assert job['partial'] is None
+    assert store.get('missing') is None
+
+
+def test_jobs_without_heartbeat_are_marked_failed(store):
+    job_id = store.create('ga4_report', {}, 'owner')
+    store._connect().execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (time.time() - jobs.HEARTBEAT_TIMEOUT - 1, job_id))
+
+    job = store.get(job_id)
+    assert job['status'] == 'failed'
+    assert 'worker restart' in job['error']
+
+
+def test_runner_records_results_progress_and_failures(store):
+    def report(job, params, context):
+        job.progress(0.5, 'halfway', partial={'data': [params['n']]})
+        if params['n'] < 0:
+            raise ValueError('negative')
+        return {'data': [params['n'], context]}
+
+    runner = JobRunner(store, {'report': report}, max_workers=1)
+    done = runner.submit('report', {'n': 1}, 'owner', 'context')
+    failed = runner.submit('report', {'n': -1}, 'owner', None)
+
+    job = runner.wait(done, 5)
+    assert job['status'] == 'succeeded'
+    assert job['result'] == {'data': [1, 'context']}
+    assert job['message'] == 'halfway' and job['progress'] == 1.0
+
+    job = runner.wait(failed, 5)
+    assert job['status'] == 'failed' and job['error'] == 'negative'
+    assert job['partial'] == {'data': [-1]}
+
+    with pytest.raises(ValueError):
+        runner.submit('unknown', {}, 'owner', None)
+
+
+class RecordingJob:
+    def __init__(self):
+        self.partials = []
+
+    def progress(self, fraction, message=None, partial=None):
+        if partial is not None:
+            self.partials.append(partial)
+
+
+def test_ga4_job_partials_hold_a_row_count_and_a_bounded_preview(monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_PARTIAL_ROWS', 3)
+    pages = [[{'n': n} for n in range(page * 10, page * 10 + 10)] for page in range(3)]
+    ga4 = SimpleNamespace(iter_report=lambda *args: iter(pages))
+    job = RecordingJob()
+
+    result = jobs.run_ga4_report(job, {'days': 3}, {'tenant': SimpleNamespace(ga4=lambda credentials: ga4), 'credentials': None})
+
+    assert len(result['data']) == 30
+    assert [partial['rows'] for partial in job.partials] == [10, 20, 30]
+    assert all(partial['data'] == [{'n': 0}, {'n': 1}, {'n': 2}] for partial in job.partials)
+
+
+def test_ads_job_reports_each_client_account(app, make_credentials, monkeypatch):
+    monkeypatch.setattr(jobs, 'JOB_PARTIAL_ROWS', 10)
+    job = RecordingJob()
+    context = get_tenant(app).context(make_credentials())
+
+    result = jobs.run_ads_query(job, {'resource': 'campaign', 'days': 1, 'include_children': True}, context)
+
+    # 5 client accounts of 60 campaigns each
+    assert len(result['data']) == 300
+    assert [partial['rows'] for partial in job.partials] == [60, 120, 180, 240, 300]
+    assert len(job.partials[-1]['data']) == 10
+    assert job.partials[-1]['customers'] == result['customers']
+    assert len(result['customers']) == 5
+
+
+def test_ga4_job_runs_to_completion(client):
+    response = client.post('/api/analytics/jobs', json={'kind': 'ga4_report', 'params': {'days': 3, 'dimensions': ['date']}})
+
+    assert response.status_code == 202
+    status_url = response.get_json()['status_url']
+    job = client.get(f"{status_url}?wait=10").get_json()['data']
+    while job['status'] not in ('succeeded', 'failed'):
+        job = client.get(f"{status_url}?wait=10&since={job['updated_at']}").get_json()['data']
+
+    assert job['status'] == 'succeeded'
+    assert len(job['result']['data']) == 4
+
+
+def test_unknown_job_kind_is_rejected(client):
+    response = client.post('/api/analytics/jobs', json={'kind': 'export_everything'})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'Unknown job kind: export_everything'}
+
+
+@pytest.mark.parametrize('kind, params, error', [
+    ('ads_query', {'fields': ['clicks', 'bogus']}, "Unknown field 'bogus' for campaign"),
+    ('ads_query', {'resource': 'billing_setup'}, 'Unsupported GAQL resource: billing_setup'),
+    ('ads_query', {'segments': ['date; DROP']}, 'Invalid GAQL field: segments.date; DROP'),
+    ('ga4_report', {'metrics': ['active users']}, 'Invalid GA4 metric: active users'),
+    ('ga4_report', {'days': 0}, 'days must be at least 1'),
+    ('ga4_report', {'days': 'week'}, 'Invalid days: week'),
+    ('ga4_report', ['days'], 'Job params must be an object')
+])
+def test_invalid_params_are_rejected_before_queueing(client, kind, params, error):
+    queued = jobs.get_job_runner().store._connect().execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    response = client.post('/api/analytics/jobs', json={'kind': kind, 'params': params})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': error}
+    assert jobs.get_job_runner().store._connect().execute('SELECT COUNT(*) FROM jobs').fetchone()[0] == queued
+
+
+def test_jobs_are_private_to_their_session(app, client, make_credentials):
+    job_id = client.post('/api/analytics/jobs', json={'kind': 'ga4_report'}).get_json()['job_id']
+
+    other = app.test_client()
+    with other.session_transaction() as flask_session:
+        flask_session['credential_id'] = get_credential_vault(app).store(make_credentials('other-user'))
+
+    assert other.get(f'/api/analytics/jobs/{job_id}').status_code == 404
+    assert client.get(f'/api/analytics/jobs/{job_id}').status_code == 200
+
+
+def test_jobs_require_login(anonymous):
+    assert anonymous.post('/api/analytics/jobs', json={'kind': 'ga4_report'}).status_code == 401
+    assert anonymous.get('/api/analytics/jobs/anything').status_code == 401
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+from app.lazy import lazy_attributes
+from app.preload import HEAVY_MODULES
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def package(monkeypatch):
+    module = types.ModuleType('lazy_test_package')
+    monkeypatch.setitem(sys.modules, module.__name__, module)
+    module.__getattr__ = lazy_attributes(module.__name__, {'dumps': 'json'})
+    return module
+
+
+def test_lazy_attribute_is_imported_once_and_stored(package):
+    assert package.dumps is json.dumps
+    assert package.__dict__['dumps'] is json.dumps
+
+
+def test_unknown_lazy_attribute_raises_attribute_error(package):
+    with pytest.raises(AttributeError, match="no attribute 'loads'"):
+        package.loads
+
+
+def test_app_factory_does_not_import_google_sdks(tmp_path):
+    script = (
+        "import json, sys\n"
+        "from app import create_app\n"
+        "status = create_app().test_client().get('/health').status_code\n"
+        f"print(json.dumps([status, sorted(set({HEAVY_MODULES!r}) & set(sys.modules))]))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=ROOT, RESULT_CACHE_DIR=str(tmp_path / 'analytics_cache'))
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, capture_output=True, text=True, check=True)
+
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == [200, []]
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from app.analytics import jobs, live
+from app.analytics.live import LiveHub, RequestSlots, diff_rows
+from app.analytics.tenants import get_tenant
+
+
+def test_diff_rows_reports_changed_added_and_removed_rows():
+    old = {'a': {'k': 'a', 'v': 1}, 'b': {'k': 'b', 'v': 2}}
+    new = {'a': {'k': 'a', 'v': 1}, 'b': {'k': 'b', 'v': 3}, 'c': {'k': 'c', 'v': 4}}
+
+    assert diff_rows(old, new) == ([{'k': 'b', 'v': 3}, {'k': 'c', 'v': 4}], [])
+    assert diff_rows(new, old) == ([{'k': 'b', 'v': 2}], ['c'])
+
+
+def test_hub_pushes_a_snapshot_then_only_changes(app, make_credentials, monkeypatch):
+    rows = [{'sessionSource': 'google', 'sessions': 1.0}, {'sessionSource': 'bing', 'sessions': 2.0}]
+    monkeypatch.setattr(live, 'fetch_topic', lambda kind, days, context: [dict(row) for row in rows])
+    tenant = get_tenant(app)
+    hub = LiveHub()
+    # Refresh by hand rather than from the background thread
+    monkeypatch.setattr(hub, '_ensure_started', lambda: None)
+
+    subscription = hub.subscribe(['traffic-sources'], 7, tenant.context(make_credentials()))
+    topic = subscription.topics[0]
+    hub.refresh(topic)
+    assert subscription.get(0)['snapshot'] == rows
+
+    rows[0]['sessions'] = 5.0
+    rows.pop()
+    tenant.cache.invalidate('live:')
+    hub.refresh(topic)
+    assert subscription.get(0) == {
+        'topic': 'traffic-sources', 'days': 7, 'upsert': [{'sessionSource': 'google', 'sessions': 5.0}], 'remove': ['bing']
+    }
+
+    hub.unsubscribe(subscription)
+    assert hub.stats() == {'topics': [], 'subscribers': 0}
+
+
+def test_request_slots_are_capped():
+    slots = RequestSlots(1)
+
+    assert slots.acquire()
+    assert not slots.acquire()
+    slots.release()
+    assert slots.acquire()
+    assert slots.stats() == {'in_use': 1, 'limit': 1, 'rejected': 1}
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    slots = RequestSlots(1)
+    monkeypatch.setattr(live, '_slots', slots)
+    return slots
+
+
+def test_stream_sends_events_and_frees_its_slot(client, slots):
+    response = client.get('/api/analytics/stream?days=7&topics=active-users', buffered=False)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert next(response.response) == b'retry: 5000\n\n'
+    assert slots.in_use == 1
+
+    response.close()
+    assert slots.in_use == 0
+
+
+def test_stream_is_turned_away_when_slots_are_taken(client, slots):
+    slots.acquire()
+
+    response = client.get('/api/analytics/stream?days=7')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+    assert response.get_json()['success'] is False
+    assert slots.in_use == 1
+
+
+def test_stream_rejects_unknown_topics(client, slots):
+    response = client.get('/api/analytics/stream?topics=active-users,bogus')
+
+    assert response.status_code == 400
+    assert slots.in_use == 0
+
+
+def test_long_polls_answer_at_once_when_slots_are_taken(client, slots, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setitem(jobs.JOB_HANDLERS, 'ga4_report', lambda job, params, context: release.wait(10) and {'data': []})
+    job_id = client.post('/api/analytics/jobs', json={'kind': 'ga4_report'}).get_json()['job_id']
+    slots.acquire()
+
+    started = time.monotonic()
+    response = client.get(f'/api/analytics/jobs/{job_id}?wait=20')
+
+    assert time.monotonic() - started < 5
+    assert response.get_json()['data']['status'] in ('queued', 'running')
+    release.set()
@@ -0,0 +1,92 @@
+import pytest
+
+from app.analytics import cache
+from app.analytics.cache import NamespacedCache, ResultCache, SharedResultCache
+from app.analytics.memory import MemoryAccountant, estimate_size
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedResultCache(str(tmp_path / 'results.sqlite3'), ttl=60)
+
+
+def report(rows):
+    return {'success': True, 'data': [{'date': f"2025-01-{index % 28 + 1:02d}", 'clicks': float(index)} for index in range(rows)]}
+
+
+def test_estimate_size_scales_with_rows():
+    small, large = estimate_size(report(100)), estimate_size(report(10000))
+
+    assert 50 < large / small < 200
+
+
+@pytest.fixture
+def accountant():
+    accountant = MemoryAccountant(100)
+    accountant.dropped = []
+
+    def discard(key):
+        accountant.dropped.append(key)
+        accountant.release('pool', key)
+
+    accountant.register('pool', discard)
+    return accountant
+
+
+def test_accountant_evicts_the_least_valuable_entries(accountant):
+    accountant.admit('pool', 'cheap', 60, cost=0.1)
+    accountant.admit('pool', 'expensive', 60, cost=10.0)
+    accountant.enforce()
+
+    assert accountant.dropped == ['cheap']
+    assert accountant.stats()['cached_bytes'] == 60
+    assert accountant.evictions == 1
+
+
+def test_in_flight_payloads_count_against_the_budget(accountant):
+    accountant.admit('pool', 'entry', 50)
+
+    with accountant.in_flight(report(50)):
+        assert accountant.dropped == ['entry']
+        assert accountant.stats()['in_flight'] == 1
+    assert accountant.over_budget == 1
+    assert accountant.stats()['in_flight_bytes'] == 0
+
+
+def test_large_values_are_only_kept_in_the_shared_tier(shared, monkeypatch):
+    monkeypatch.setattr(cache, 'MEMORY_SPILL_BYTES', 1000)
+    results = ResultCache(shared=shared, pool='spill-test')
+    spills = results.accountant.spills
+
+    results.set('large', report(1000))
+    results.set('small', {'data': []})
+
+    assert 'large' not in results._entries and 'small' in results._entries
+    assert results.accountant.spills == spills + 1
+    assert results.get('large') == report(1000)
+
+
+def test_spilling_is_off_at_zero_and_without_a_pool(shared, monkeypatch):
+    monkeypatch.setattr(cache, 'MEMORY_SPILL_BYTES', 0)
+
+    pooled = ResultCache(shared=shared, pool='no-spill-test')
+    pooled.set('large', report(1000))
+    unpooled = ResultCache(shared=shared)
+    unpooled.set('large', report(1000))
+
+    assert 'large' in pooled._entries and 'large' in unpooled._entries
+    assert unpooled.accountant is None
+
+
+def test_trim_drops_entries_expiring_soonest_but_keeps_leases(shared):
+    namespace = NamespacedCache(shared, 'tenant:a', 10 ** 6)
+    assert namespace.add('poll:lease', 123, ttl=1)
+    namespace.set_bytes('soon', b'x' * 400, ttl=10)
+    namespace.set_bytes('late', b'x' * 400, ttl=100)
+
+    removed = shared.trim('tenant:a:', 500)
+
+    assert removed == 1
+    assert namespace.get_bytes('soon') is None
+    assert namespace.get_bytes('late') is not None
+    assert not namespace.add('poll:lease', 456, ttl=1)
@@ -0,0 +1,76 @@
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from app.auth.vault import get_credential_vault
+from loadtest.__main__ import Recorder, percentile
+from loadtest.fake_oauth import FakeOAuthServer
+
+
+@pytest.fixture
+def oauth(app, monkeypatch):
+    server = FakeOAuthServer(token_lifetime=3600).start()
+    app.config['GOOGLE_AUTH_URI'] = server.auth_uri
+    app.config['GOOGLE_TOKEN_URI'] = server.token_uri
+    # The stand-in speaks plain HTTP
+    monkeypatch.setenv('OAUTHLIB_INSECURE_TRANSPORT', '1')
+    yield server
+    server.stop()
+
+
+def log_in(app, oauth):
+    client = app.test_client()
+    consent = client.get('/auth/login').headers['Location']
+    assert consent.startswith(oauth.auth_uri)
+
+    callback = requests.get(consent, allow_redirects=False).headers['Location']
+    query = urlparse(callback).query
+    response = client.get(f"/auth/callback?{query}")
+    assert response.status_code == 302
+    return client
+
+
+def test_login_stores_credentials_in_the_vault(app, oauth):
+    client = log_in(app, oauth)
+
+    assert client.get('/api/auth/status').get_json() == {'authenticated': True}
+    with client.session_transaction() as flask_session:
+        credentials = get_credential_vault(app).get(flask_session['credential_id'])
+    assert credentials.refresh_token and not credentials.expired
+    assert oauth.stats() == {'authorizations': 1, 'code_exchanges': 1, 'refreshes': 0, 'rejected': 0, 'refresh_tokens': 1}
+
+
+def test_callback_rejects_a_forged_state(app, oauth):
+    client = app.test_client()
+    consent = client.get('/auth/login').headers['Location']
+    code = parse_qs(urlparse(requests.get(consent, allow_redirects=False).headers['Location']).query)['code'][0]
+
+    client.get(f"/auth/callback?code={code}&state=forged")
+
+    assert client.get('/api/auth/status').get_json()['authenticated'] is False
+    assert oauth.stats()['code_exchanges'] == 0
+
+
+def test_expired_tokens_are_refreshed_at_the_token_endpoint(app, oauth):
+    oauth.token_lifetime = 1
+    client = log_in(app, oauth)
+
+    # The token expires within the refresh margin, so it is refreshed at once
+    assert oauth.stats()['refreshes'] >= 1
+    assert client.get('/api/analytics/active-users?days=7').status_code == 200
+
+
+def test_unknown_refresh_tokens_are_rejected(oauth):
+    assert oauth.grant({'grant_type': 'refresh_token', 'refresh_token': 'nope'})[0] == 400
+    assert oauth.stats()['rejected'] == 1
+
+
+def test_recorder_reports_percentiles():
+    recorder = Recorder()
+    for millis in range(1, 101):
+        recorder.record('login', millis / 1000, '302')
+
+    assert percentile(sorted(recorder.latencies['login']), 50) == pytest.approx(50)
+    assert percentile(sorted(recorder.latencies['login']), 99) == pytest.approx(99)
+    assert 'login' in recorder.report(10.0) and '302: 100' in recorder.report(10.0)
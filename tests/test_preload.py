@@ -0,0 +1,30 @@
+import sys
+
+from app.preload import preload_modules, resolve_descriptors, warm_start
+
+
+def test_preload_modules_times_imports_and_skips_missing_ones():
+    timings = preload_modules(['json', 'no_such_module_for_preload', 'app.analytics.topk'])
+
+    assert [name for name, _ in timings] == ['json', 'app.analytics.topk']
+    assert all(seconds >= 0 for _, seconds in timings)
+    assert 'app.analytics.topk' in sys.modules
+
+
+def test_resolve_descriptors_loads_ga4_and_google_ads_messages():
+    steps = [name for name, _ in resolve_descriptors()]
+
+    assert steps[0] == 'ga4 descriptors'
+    assert steps[1].startswith('google ads ') and steps[1].endswith(' descriptors')
+
+
+def test_warm_start_logs_a_breakdown(monkeypatch):
+    monkeypatch.setattr('app.preload.HEAVY_MODULES', ['json', 'csv'])
+    lines = []
+
+    timings, total = warm_start(log=lines.append)
+
+    assert [name for name, _ in timings][:2] == ['json', 'csv']
+    assert total >= sum(seconds for _, seconds in timings)
+    assert lines[0].startswith('Preloaded json in ')
+    assert lines[-1].startswith('Warm start finished in ')
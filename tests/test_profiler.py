@@ -0,0 +1,101 @@
+import sys
+
+import pytest
+
+from app import profiler as profiling
+from app.profiler import ProfileStore, fold_stack, folded_text, get_profiler, hot_functions
+from loadtest import fake_google
+
+ADMIN = {'Authorization': 'Bearer admin-secret'}
+
+
+def test_fold_stack_lists_frames_from_the_root():
+    def leaf():
+        return fold_stack(sys._getframe())
+
+    stack = leaf()
+
+    assert stack.endswith('test_profiler.py:test_fold_stack_lists_frames_from_the_root;tests/test_profiler.py:leaf')
+    assert stack.count(';') < profiling.MAX_STACK_DEPTH
+
+
+def test_folded_text_and_hot_functions():
+    stacks = {'main;a;b': 3, 'main;a': 1, 'main;c;b': 2}
+
+    assert folded_text(stacks) == 'main;a 1\nmain;a;b 3\nmain;c;b 2\n'
+    assert hot_functions(stacks) == [
+        {'function': 'b', 'samples': 5, 'share': 0.8333},
+        {'function': 'a', 'samples': 1, 'share': 0.1667}
+    ]
+
+
+def test_store_keeps_a_ring_of_the_newest_profiles(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_RING_SIZE', 3)
+    store = ProfileStore(str(tmp_path / 'profiles.sqlite3'))
+    for index in range(5):
+        store.add({
+            'id': str(index), 'created_at': float(index), 'pid': 1, 'method': 'GET', 'path': '/', 'endpoint': 'main.index',
+            'status': 200, 'duration': 1.0, 'sampled': 0, 'samples': 1, 'stacks': {'main': 1}
+        })
+
+    assert [profile['id'] for profile in store.list()] == ['4', '3', '2']
+    assert store.get('4')['stacks'] == {'main': 1}
+    assert store.get('0') is None
+
+    assert store.settings() is None
+    store.enable(10, 2, 1)
+    assert store.settings()['sample_percent'] == 10
+    store.disable()
+    assert store.settings() is None
+
+
+@pytest.fixture
+def admin(app):
+    app.config['ADMIN_TOKEN'] = 'admin-secret'
+    yield app.test_client()
+    get_profiler().store.disable()
+    get_profiler().refresh()
+
+
+def test_admin_api_requires_the_token(app, anonymous):
+    assert anonymous.get('/api/admin/profiler').status_code == 404
+    app.config['ADMIN_TOKEN'] = 'admin-secret'
+    assert anonymous.get('/api/admin/profiler', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+
+
+def test_enable_rejects_bad_settings(admin):
+    for body in ({'sample_percent': 'all'}, {'sample_percent': 150}, {'minutes': 0}):
+        response = admin.post('/api/admin/profiler', json=body, headers=ADMIN)
+        assert response.status_code == 400
+        assert response.get_json()['success'] is False
+
+
+def test_slow_requests_are_captured_while_enabled(admin, client, monkeypatch):
+    monkeypatch.setattr(fake_google, 'UPSTREAM_LATENCY', 0.1)
+    response = admin.post('/api/admin/profiler', json={'sample_percent': 100, 'slow_seconds': 0.05, 'minutes': 1}, headers=ADMIN)
+    assert response.get_json()['settings']['slow_seconds'] == 0.05
+
+    assert client.get('/api/analytics/traffic-sources?days=7').status_code == 200
+
+    profiles = [
+        profile for profile in admin.get('/api/admin/profiles', headers=ADMIN).get_json()['data']
+        if profile['path'] == '/api/analytics/traffic-sources?days=7'
+    ]
+    assert len(profiles) == 1
+    assert profiles[0]['status'] == 200 and profiles[0]['samples'] > 0
+
+    profile = admin.get(f"/api/admin/profiles/{profiles[0]['id']}", headers=ADMIN).get_json()['data']
+    assert profile['hot_functions'][0]['samples'] > 0
+    folded = admin.get(f"/api/admin/profiles/{profiles[0]['id']}?format=folded", headers=ADMIN)
+    assert folded.mimetype == 'text/plain'
+    assert 'traffic_sources' in folded.get_data(as_text=True)
+
+    assert admin.delete('/api/admin/profiler', headers=ADMIN).get_json() == {'success': True}
+    assert admin.get('/api/admin/profiler', headers=ADMIN).get_json()['settings'] is None
+
+
+def test_unknown_profiles_are_not_found(admin):
+    response = admin.get('/api/admin/profiles/missing', headers=ADMIN)
+
+    assert response.status_code == 404
+    assert response.get_json() == {'success': False, 'error': 'Profile not found'}
@@ -0,0 +1,38 @@
+from app.analytics.realtime import RealtimePoller
+from app.analytics.tenants import get_tenant
+
+
+def test_pollers_share_one_upstream_call_per_interval(app, make_credentials):
+    tenant = get_tenant(app)
+    # One poller per worker, reading the same tenant cache
+    pollers = [RealtimePoller(tenant, interval=60), RealtimePoller(tenant, interval=60)]
+
+    snapshots = [poller.read(make_credentials(), wait=5) for poller in pollers]
+
+    assert snapshots[0] == snapshots[1]
+    assert snapshots[0]['data'][0]['activeUsers'] >= 0
+    assert sum(poller.polls for poller in pollers) == 1
+    assert pollers[0].history(since=snapshots[0]['fetched_at']) == []
+    assert pollers[0].stats()['running']
+
+
+def test_failed_polls_are_counted_and_read_returns_none(app, make_credentials, monkeypatch):
+    tenant = get_tenant(app)
+    poller = RealtimePoller(tenant, interval=0.2)
+    monkeypatch.setattr(poller, '_fetch', lambda: 1 / 0)
+
+    assert poller.read(make_credentials(), wait=0.5) is None
+    assert poller.errors >= 1
+
+
+def test_realtime_endpoint_returns_the_latest_snapshot_and_history(client):
+    response = client.get('/api/analytics/realtime?history=1')
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True
+    assert body['history'][-1] == {'fetched_at': body['fetched_at'], 'data': body['data']}
+
+
+def test_realtime_endpoint_requires_login(anonymous):
+    assert anonymous.get('/api/analytics/realtime').status_code == 401
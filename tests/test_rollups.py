@@ -0,0 +1,105 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.analytics import rollups
+from app.analytics.rollups import RollupStore, choose_tier, daily_since, hourly_since
+from loadtest.fake_google import FakeDataClient
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RollupStore(str(tmp_path / 'rollups.sqlite3'))
+
+
+def hours(day, value=1.0):
+    return {f"{day.isoformat()} {hour:02d}": {'clicks': value} for hour in range(24)}
+
+
+def test_choose_tier_picks_the_finest_tier_within_the_points():
+    today = date.today()
+
+    assert choose_tier(today - timedelta(days=2)) == 'hour'
+    assert choose_tier(today - timedelta(days=29)) == 'day'
+    assert choose_tier(today - timedelta(days=29), max_points=10) == 'week'
+    assert choose_tier(daily_since() - timedelta(days=1)) == 'week'
+
+
+def test_choose_tier_coarsens_granularities_the_window_has_aged_out_of():
+    assert choose_tier(hourly_since(), 'hour') == 'hour'
+    assert choose_tier(hourly_since() - timedelta(days=1), 'hour') == 'day'
+    assert choose_tier(daily_since() - timedelta(days=1), 'day') == 'week'
+    with pytest.raises(ValueError):
+        choose_tier(date.today(), 'minute')
+
+
+def test_read_sums_finer_tiers(store):
+    day = date.today() - timedelta(days=1)
+    store.store('s', 'hour', [day], hours(day))
+
+    assert store.read('s', 'hour', day, day)[f"{day.isoformat()} 05"] == {'clicks': 1.0}
+    assert store.read('s', 'day', day, day) == {day.isoformat(): {'clicks': 24.0}}
+    assert store.coverage('s', day, day)[day.isoformat()][0] == 'hour'
+
+
+def test_storing_a_day_in_another_tier_replaces_it(store):
+    day = date.today() - timedelta(days=1)
+    store.store('s', 'hour', [day], hours(day))
+
+    store.store('s', 'day', [day], {day.isoformat(): {'clicks': 5.0}})
+
+    assert store.read('s', 'day', day, day) == {day.isoformat(): {'clicks': 5.0}}
+    assert store.stats() == {'day': 1}
+
+
+def test_compact_rolls_old_hours_into_days_and_whole_weeks_into_weeks(store):
+    old_day = hourly_since() - timedelta(days=1)
+    store.store('s', 'hour', [old_day], hours(old_day))
+
+    week = daily_since() - timedelta(days=7)
+    full_week = [week + timedelta(days=offset) for offset in range(7)]
+    partial_week = [week - timedelta(days=3), week - timedelta(days=2)]
+    for day in full_week + partial_week:
+        store.store('s', 'day', [day], {day.isoformat(): {'clicks': 2.0}})
+
+    store.compact('s')
+
+    assert store.read('s', 'day', old_day, old_day) == {old_day.isoformat(): {'clicks': 24.0}}
+    assert store.coverage('s', old_day, old_day)[old_day.isoformat()][0] == 'day'
+    assert store.read('s', 'week', week, week) == {week.isoformat(): {'clicks': 14.0}}
+    coverage = store.coverage('s', partial_week[0], full_week[-1])
+    assert coverage == {week.isoformat(): ('week', coverage[week.isoformat()][1])}
+
+
+def test_series_endpoint_fetches_missing_days_once(client, monkeypatch):
+    calls = []
+    run_report = FakeDataClient.run_report
+    monkeypatch.setattr(FakeDataClient, 'run_report', lambda self, request: calls.append(request) or run_report(self, request))
+
+    first = client.get('/api/analytics/series/ga4-traffic?days=3&granularity=hour')
+    reports = len(calls)
+    # Past the response cache, the days come from the rollup store
+    client.application.extensions['tenants']['default'].cache.invalidate('series:')
+    second = client.get('/api/analytics/series/ga4-traffic?days=3&granularity=hour')
+
+    assert first.status_code == second.status_code == 200
+    body = first.get_json()
+    assert body['granularity'] == 'hour'
+    assert len(body['data']) == 72
+    assert set(body['data'][0]) == {'bucket', 'sessions', 'newUsers', 'screenPageViews'}
+    assert second.get_json()['data'] == body['data']
+    assert len(calls) == reports
+
+
+def test_series_endpoint_serves_ads_series_per_week(client):
+    response = client.get(f'/api/analytics/series/ads-traffic?days={rollups.ROLLUP_DAILY_DAYS + 30}')
+
+    assert response.status_code == 200
+    assert response.get_json()['granularity'] == 'week'
+
+
+def test_series_endpoint_rejects_unknown_series_and_granularity(client):
+    assert client.get('/api/analytics/series/facebook').status_code == 404
+    response = client.get('/api/analytics/series/ga4-traffic?granularity=minute')
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'error': 'Unknown granularity: minute'}
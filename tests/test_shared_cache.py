@@ -0,0 +1,74 @@
+import pytest
+
+from app.analytics.cache import ResultCache, SharedResultCache
+from loadtest.fake_google import FakeDataClient
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SharedResultCache(str(tmp_path / 'results.sqlite3'), ttl=60)
+
+
+def test_payloads_are_visible_to_other_handles_on_the_same_file(shared):
+    shared.set_bytes('report', b'{"success": true}')
+    shared.set('decoded', {'rows': [1, 2]})
+    other = SharedResultCache(shared.path)
+
+    assert other.get_bytes('report') == b'{"success": true}'
+    assert other.get('decoded') == {'rows': [1, 2]}
+    assert other.get('missing') is None
+    assert other.stats()['hits'] == 2 and other.stats()['misses'] == 1
+
+
+def test_expired_entries_are_not_served_and_get_purged(shared):
+    shared.set('old', 1, ttl=-1)
+    shared.set('new', 2)
+
+    assert shared.get('old') is None
+    assert shared.purge_expired() == 1
+    assert shared.stats()['entries'] == 1
+
+
+def test_invalidate_matches_prefixes_literally(shared):
+    shared.set('ads:1_2:a', 1)
+    shared.set('ads:1x2:b', 2)
+    shared.set('ga4:c', 3)
+
+    assert shared.invalidate('ads:1_2:') == 1
+    assert shared.get('ads:1x2:b') == 2
+    assert shared.invalidate() == 2
+
+
+def test_result_cache_uses_the_shared_tier(shared):
+    writer = ResultCache(ttl=60, shared=shared)
+    reader = ResultCache(ttl=60, shared=shared)
+    writer.set('rows', [{'id': 1}])
+
+    assert reader.get('rows') == [{'id': 1}]
+    assert reader.stats()['entries'] == 1
+
+    writer.invalidate('ro')
+    reader.discard('rows')
+    assert reader.get('rows') is None
+
+
+def test_cached_reports_are_fetched_once(client, monkeypatch):
+    calls = []
+    run_report = FakeDataClient.run_report
+    monkeypatch.setattr(FakeDataClient, 'run_report', lambda self, request: calls.append(request) or run_report(self, request))
+
+    first = client.get('/api/analytics/active-users?days=7')
+    second = client.get('/api/analytics/active-users?days=7')
+
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data
+    assert len(first.get_json()['data']) == 8
+    # The other call is the one-row check of the user's access to the property
+    assert len([request for request in calls if request.dimensions]) == 1
+
+
+def test_report_endpoints_require_login(anonymous):
+    response = anonymous.get('/api/analytics/traffic-sources')
+
+    assert response.status_code == 401
+    assert response.get_json() == {'success': False, 'error': 'Not authenticated'}
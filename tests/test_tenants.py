@@ -0,0 +1,136 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from google.api_core.exceptions import PermissionDenied
+
+from app.analytics import circuit, google_ads
+from app.analytics.circuit import CircuitBreaker
+from app.analytics.google_ads import AdsRequestError
+from app.analytics.tenants import QuotaExceededError, Tenant, init_tenants, load_tenants
+from loadtest.fake_google import FakeDataClient, FakeGoogleAdsAnalytics
+
+
+def test_quota_is_charged_until_used_up():
+    tenant = Tenant('quota-test', '1', '2', 'token', quota_per_minute=2)
+
+    tenant.charge()
+    tenant.charge()
+    with pytest.raises(QuotaExceededError):
+        tenant.charge()
+    assert tenant.quota_rejections == 1
+
+
+def test_clients_are_pooled_per_user(make_credentials):
+    tenant = Tenant('pool-test', '1', '2', 'token')
+    credentials = make_credentials()
+
+    assert tenant.ga4(credentials) is tenant.ga4(make_credentials())
+    assert tenant.ga4(credentials) is not tenant.ga4(make_credentials('other-user'))
+    assert tenant.stats()['clients'] == 2
+
+
+def test_load_tenants_applies_aliases_and_defaults():
+    tenants = load_tenants({
+        'GA4_PROPERTY_ID': '1',
+        'GOOGLE_ADS_CUSTOMER_ID': '111',
+        'GOOGLE_ADS_DEVELOPER_TOKEN': 'token',
+        'GOOGLE_ADS_CUSTOMER_ID_ALIASES': '{"111": "222-333-4444"}'
+    })
+
+    assert list(tenants) == ['default']
+    assert tenants['default'].ads_customer_id == '2223334444'
+    assert tenants['default'].ads_developer_token == 'token'
+
+
+def test_unknown_tenant_is_not_found(client):
+    response = client.get('/api/analytics/active-users?tenant=nobody')
+
+    assert response.status_code == 404
+    assert response.get_json() == {'success': False, 'error': 'Unknown tenant: nobody'}
+
+
+@pytest.fixture
+def upstream_calls(app, monkeypatch):
+    """Two tenants; the test user's Google account can only read 'main'"""
+    app.config['TENANTS'] = json.dumps({
+        'main': {'ga4_property_id': '123456789', 'ads_customer_id': '1234567890'},
+        'other': {'ga4_property_id': '999', 'ads_customer_id': '999'}
+    })
+    app.config['DEFAULT_TENANT'] = 'main'
+    init_tenants(app)
+
+    calls = []
+    run_report = FakeDataClient.run_report
+    search_grpc = FakeGoogleAdsAnalytics._search_grpc
+
+    def fake_run_report(self, request):
+        calls.append(request.property)
+        if request.property == 'properties/999':
+            raise PermissionDenied('User does not have sufficient permissions for this property.')
+        return run_report(self, request)
+
+    def fake_search_grpc(self, query, fields):
+        calls.append(self.customer_id)
+        if self.customer_id == '999':
+            raise AdsRequestError('USER_PERMISSION_DENIED')
+        return search_grpc(self, query, fields)
+
+    monkeypatch.setattr(FakeDataClient, 'run_report', fake_run_report)
+    monkeypatch.setattr(FakeGoogleAdsAnalytics, '_search_grpc', fake_search_grpc)
+    return calls
+
+
+@pytest.mark.parametrize('path', [
+    '/api/analytics/active-users',
+    '/api/analytics/ads/campaigns',
+    '/api/analytics/attribution',
+    '/api/analytics/series/ads-traffic',
+    '/api/analytics/realtime',
+    '/api/analytics/stream?topics=campaigns'
+])
+def test_other_tenants_data_is_refused(client, upstream_calls, path):
+    separator = '&' if '?' in path else '?'
+    response = client.get(f"{path}{separator}tenant=other")
+
+    assert response.status_code == 403
+    assert response.get_json()['success'] is False
+    assert 'other' in response.get_json()['error']
+
+
+def test_cached_payloads_are_not_served_without_access(app, client, upstream_calls):
+    # Another user with access to 'other' filled its cache
+    tenant = app.extensions['tenants']['other']
+    tenant.cache.set_bytes('ga4:999:traffic-sources:x', b'{"success": true}')
+
+    assert client.get('/api/analytics/traffic-sources?tenant=other').status_code == 403
+    assert client.post('/api/analytics/jobs?tenant=other', json={'kind': 'ads_query'}).status_code == 403
+
+
+def test_access_checks_are_cached(client, upstream_calls):
+    assert client.get('/api/analytics/active-users?tenant=other').status_code == 403
+    assert client.get('/api/analytics/traffic-sources?tenant=other').status_code == 403
+    assert upstream_calls == ['properties/999']
+
+    assert client.get('/api/analytics/active-users?tenant=main&days=7').status_code == 200
+    assert client.get('/api/analytics/active-users?tenant=main&days=7').status_code == 200
+    # One access check and one report
+    assert upstream_calls[1:] == ['properties/123456789', 'properties/123456789']
+
+
+def test_pooled_ads_client_builds_grpc_once_the_circuit_can_be_probed(app, make_credentials, monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(circuit, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    breaker = CircuitBreaker('grpc', min_calls=1, open_seconds=60)
+    breaker.record_failure(0.1)
+    monkeypatch.setitem(google_ads._breakers, 'grpc', breaker)
+    monkeypatch.setattr(google_ads, 'GoogleAdsClient', SimpleNamespace(load_from_storage=lambda path: 'grpc-client'))
+
+    # The real client class; the tenants build the synthetic subclass
+    analytics = FakeGoogleAdsAnalytics.__bases__[0](make_credentials(), '1234567890', 'token')
+    assert analytics.client is None
+    assert analytics._available_backends() == ['rest']
+
+    clock.now += 61
+    assert analytics._available_backends() == ['grpc', 'rest']
+    assert analytics.client == 'grpc-client'
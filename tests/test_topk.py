@@ -0,0 +1,60 @@
+import pytest
+
+from app.analytics.downsample import OTHER_KEY
+from app.analytics.topk import MIN_CAPACITY, TopK, capacity_for
+
+
+def rows(counts):
+    return [{'term': term, 'cost': 1.0, 'clicks': 2.0} for term, count in counts.items() for _ in range(count)]
+
+
+def test_top_is_exact_while_keys_fit():
+    summary = TopK('cost', ['cost', 'clicks'], 10)
+    summary.update(rows({'a': 5, 'b': 3, 'c': 1}), 'term')
+
+    top = summary.top(2, 'term')
+
+    assert top == [
+        {'term': 'a', 'cost': 5.0, 'clicks': 10.0, 'error': 0.0},
+        {'term': 'b', 'cost': 3.0, 'clicks': 6.0, 'error': 0.0},
+        {'term': OTHER_KEY, 'cost': 1.0, 'clicks': 2.0, 'error': 0.0}
+    ]
+    assert summary.stats() == {'rows': 9, 'counters': 3, 'capacity': 10, 'evictions': 0}
+
+
+def test_heavy_hitters_survive_evictions_with_bounded_error():
+    summary = TopK('cost', ['cost'], 5)
+    # Many one-off terms stream in between batches of the heavy ones
+    for batch in range(50):
+        summary.update(rows({'heavy': 10, 'medium': 4}), 'term')
+        summary.update(rows({f"rare-{batch}-{index}": 1 for index in range(10)}), 'term')
+
+    top = summary.top(2, 'term')
+
+    assert [row['term'] for row in top[:2]] == ['heavy', 'medium']
+    assert top[0]['cost'] <= 500.0 <= top[0]['cost'] + top[0]['error']
+    assert summary.stats()['counters'] == 5 and summary.evictions > 0
+    assert sum(row['cost'] for row in top) == pytest.approx(summary.totals['cost'])
+
+
+def test_capacity_scales_with_k():
+    assert capacity_for(5) == MIN_CAPACITY
+    assert capacity_for(5000) == 100000
+
+
+def test_search_terms_endpoint_returns_the_top_terms_and_other(client):
+    response = client.get('/api/analytics/ads/search-terms?days=3&top=5&sort=clicks')
+
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert len(data) == 6 and data[-1]['search_term'] == OTHER_KEY
+    assert [row['clicks'] for row in data[:5]] == sorted((row['clicks'] for row in data[:5]), reverse=True)
+    assert all(row['error'] == 0.0 for row in data)
+
+
+def test_search_terms_endpoint_rejects_unknown_sorts(client, anonymous):
+    response = client.get('/api/analytics/ads/search-terms?sort=ctr')
+
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert anonymous.get('/api/analytics/ads/search-terms').status_code == 401
@@ -0,0 +1,167 @@
+from datetime import datetime, timedelta
+
+import pytest
+from cryptography.fernet import Fernet
+
+from app import auth
+from app.auth.vault import (
+    CredentialRefreshError, CredentialVault, get_credential_vault, refresh_credentials, user_id_for, vault_keys
+)
+from loadtest.fake_google import FakeGoogleAdsAnalytics
+from loadtest.fake_oauth import FakeOAuthServer
+
+
+@pytest.fixture
+def oauth():
+    server = FakeOAuthServer().start()
+    server.refresh_tokens['valid-refresh-token'] = 'https://www.googleapis.com/auth/adwords'
+    yield server
+    server.stop()
+
+
+def credentials_for(oauth, refresh_token='valid-refresh-token', expires_in=-60):
+    return auth.Credentials(
+        token='old-token',
+        refresh_token=refresh_token,
+        token_uri=oauth.token_uri,
+        client_id='test-client',
+        client_secret='test-secret',
+        scopes=['https://www.googleapis.com/auth/adwords'],
+        expiry=datetime.utcnow() + timedelta(seconds=expires_in)
+    )
+
+
+def test_keys_are_derived_from_the_secret_unless_configured():
+    assert vault_keys(None, 'secret') == vault_keys('', 'secret') != vault_keys(None, 'other')
+    assert vault_keys(' a, b ,', 'secret') == [b'a', b'b']
+
+
+def test_entries_are_encrypted_and_decrypted_once(tmp_path, make_credentials):
+    vault = CredentialVault(str(tmp_path / 'vault.sqlite3'), [Fernet.generate_key()])
+    user_id = vault.store(make_credentials())
+
+    assert user_id == user_id_for(make_credentials())
+    data = vault._connect().execute('SELECT data FROM credentials').fetchone()[0]
+    assert b'test-refresh-token' not in data
+
+    assert vault.get(user_id).refresh_token == 'test-refresh-token'
+    assert vault.get(user_id) is vault.get(user_id)
+    assert vault.decrypts == 1
+    assert vault.get('unknown') is None
+
+
+def test_key_rotation_keeps_old_entries_readable(tmp_path, make_credentials):
+    old_key, new_key = Fernet.generate_key(), Fernet.generate_key()
+    path = str(tmp_path / 'vault.sqlite3')
+    user_id = CredentialVault(path, [old_key]).store(make_credentials())
+
+    rotated = CredentialVault(path, [new_key, old_key])
+    assert rotated.get(user_id).refresh_token == 'test-refresh-token'
+    rotated.store(make_credentials())
+
+    assert CredentialVault(path, [new_key]).get(user_id).refresh_token == 'test-refresh-token'
+    assert CredentialVault(path, [Fernet.generate_key()]).get(user_id) is None
+
+
+def test_workers_share_one_refresh(tmp_path, oauth):
+    path = str(tmp_path / 'vault.sqlite3')
+    keys = [Fernet.generate_key()]
+    first, second = CredentialVault(path, keys), CredentialVault(path, keys)
+    user_id = first.store(credentials_for(oauth))
+
+    token = first.get(user_id).token
+
+    assert token != 'old-token'
+    assert second.get(user_id).token == token
+    assert (first.refreshes, second.refreshes) == (1, 0)
+    assert oauth.stats()['refreshes'] == 1
+
+
+def test_failed_refresh_raises_and_releases_the_lease(tmp_path, oauth):
+    vault = CredentialVault(str(tmp_path / 'vault.sqlite3'), [Fernet.generate_key()])
+    user_id = vault.store(credentials_for(oauth, refresh_token='revoked'))
+
+    with pytest.raises(CredentialRefreshError, match='OAuth token refresh failed'):
+        vault.get(user_id)
+    assert vault._connect().execute('SELECT refreshing_until FROM credentials').fetchone()[0] == 0
+
+
+def version_of(vault, user_id):
+    return vault._load(user_id)[0]
+
+
+def test_background_refreshes_go_through_the_vault(tmp_path, oauth):
+    path = str(tmp_path / 'vault.sqlite3')
+    keys = [Fernet.generate_key()]
+    vault, other_worker = CredentialVault(path, keys), CredentialVault(path, keys)
+    user_id = vault.store(credentials_for(oauth, expires_in=3600))
+    credentials = vault.get(user_id)
+    # A pooled Ads client outlives the token
+    ads = FakeGoogleAdsAnalytics.__bases__[0].__new__(FakeGoogleAdsAnalytics.__bases__[0])
+    ads.credentials, ads.developer_token, ads.login_customer_id = credentials, 'token', '1234567890'
+    credentials.expiry = datetime.utcnow() - timedelta(seconds=60)
+
+    headers = ads._rest_headers()
+
+    assert headers['Authorization'] == f"Bearer {credentials.token}"
+    assert version_of(vault, user_id) == 2
+    assert vault.refreshes == 1
+    assert other_worker.get(user_id).token == credentials.token
+    assert oauth.stats()['refreshes'] == 1
+
+
+def test_refresh_credentials_follows_a_new_login(tmp_path, oauth):
+    vault = CredentialVault(str(tmp_path / 'vault.sqlite3'), [Fernet.generate_key()])
+    user_id = vault.store(credentials_for(oauth, expires_in=3600))
+    credentials = vault.get(user_id)
+    vault.store(credentials_for(oauth, expires_in=3600))
+    credentials.expiry = datetime.utcnow() - timedelta(seconds=60)
+
+    refresh_credentials(credentials)
+
+    assert not credentials.expired
+    assert oauth.stats()['refreshes'] == 0
+
+    vault.delete(user_id)
+    credentials.expiry = datetime.utcnow() - timedelta(seconds=60)
+    with pytest.raises(CredentialRefreshError, match='logged out'):
+        refresh_credentials(credentials)
+
+
+@pytest.mark.parametrize('path', [
+    '/api/analytics/active-users',
+    '/api/analytics/ads/search-terms',
+    '/api/analytics/ads/campaigns/1000/ad-groups',
+    '/api/analytics/anomalies',
+    '/api/analytics/attribution',
+    '/api/analytics/series/ga4-traffic',
+    '/api/analytics/realtime',
+    '/api/analytics/export/ga4',
+    '/api/analytics/stream'
+])
+def test_failed_refresh_is_answered_with_401_json(app, oauth, path):
+    client = app.test_client()
+    credential_id = get_credential_vault(app).store(credentials_for(oauth, refresh_token='revoked'))
+    with client.session_transaction() as flask_session:
+        flask_session['credential_id'] = credential_id
+
+    response = client.get(path)
+
+    assert response.status_code == 401
+    body = response.get_json()
+    assert body['success'] is False
+    assert 'log in again' in body['error']
+    assert body['login_url'] == '/auth/logout'
+    assert client.post('/api/analytics/jobs', json={'kind': 'ga4_report'}).status_code == 401
+
+
+def test_logout_deletes_the_vault_entry(app, client):
+    with client.session_transaction() as flask_session:
+        credential_id = flask_session['credential_id']
+
+    response = client.get('/auth/logout')
+
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/auth/login')
+    assert get_credential_vault(app).get(credential_id) is None
+    assert client.get('/api/analytics/active-users').status_code == 401